@@ -4,9 +4,13 @@ Integrated Web Interface for PyMUD3
 Works with the unified Player and ConnectionHandler architecture
 """
 
+import gzip
+import hashlib
+import re
 import threading
 import secrets
-from flask import Flask, render_template_string, request
+import traceback
+from flask import Flask, Response, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 
 # This will be set by mud-multi.py when it imports this module
@@ -22,28 +26,11 @@ web_app = None
 web_socketio = None
 web_player_sessions = {}  # session_id -> player_name
 
-def create_web_interface():
-    """Create the integrated web interface"""
-    global web_app, web_socketio, web_player_sessions
-    
-    if mud_multi is None:
-        raise RuntimeError("mud_multi module not set. Call set_mud_module() first.")
-    
-    # Make sure rooms are loaded
-    if not hasattr(mud_multi, 'rooms') or not mud_multi.rooms:
-        print("Rooms not loaded yet, initializing...")
-        mud_multi.parse_area_file('area.txt')
-        mud_multi.load_objects_from_file('objects.json')
-        mud_multi.process_resets()
-        mud_multi.load_spells_from_file('spells.json')
-        mud_multi.load_npcs_from_file('npcs.json')
-    
-    web_app = Flask(__name__)
-    web_app.secret_key = secrets.token_hex(16)
-    web_socketio = SocketIO(web_app, cors_allowed_origins="*")
-    
-    # HTML template for the web interface
-    HTML_TEMPLATE = '''
+# A letter then up to 19 letters, digits or underscores; names become profile file names too
+_valid_name = re.compile(r'[A-Za-z][A-Za-z0-9_]{0,19}').fullmatch
+
+# HTML template for the web interface
+HTML_TEMPLATE = '''
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -132,6 +119,7 @@ def create_web_interface():
         const socket = io();
         console.log('DEBUG CLIENT: Socket.IO initialized');
         let connected = false;
+        const MAX_OUTPUT_NODES = 500;  // Older messages are dropped so the log stays bounded
 
         socket.on('connect', function() {
             console.log('DEBUG CLIENT: Socket connected successfully');
@@ -151,8 +139,16 @@ def create_web_interface():
             console.log('DEBUG CLIENT: Output element found:', !!output);
             if (output) {
                 console.log('DEBUG CLIENT: Adding content:', data.content);
-                output.textContent += data.content + '\n';
-                output.scrollTop = output.scrollHeight;
+                // Append a text node rather than rewriting the whole log, keep at most
+                // MAX_OUTPUT_NODES messages, and only follow new output when already at the bottom
+                const atBottom = output.scrollTop + output.clientHeight >= output.scrollHeight - 5;
+                output.appendChild(document.createTextNode(data.content + '\\n'));
+                while (output.childNodes.length > MAX_OUTPUT_NODES) {
+                    output.removeChild(output.firstChild);
+                }
+                if (atBottom) {
+                    output.scrollTop = output.scrollHeight;
+                }
                 console.log('DEBUG CLIENT: Message added successfully');
             } else {
                 console.error('DEBUG CLIENT: gameOutput element not found!');
@@ -197,25 +193,72 @@ def create_web_interface():
             }
         }
 
-        document.getElementById('commandInput').addEventListener('keypress', function(e) {
+        document.getElementById('commandInput').addEventListener('keydown', function(e) {
             if (e.key === 'Enter') {
                 sendCommand();
             }
-        });
+        }, {passive: true});
 
-        document.getElementById('playerName').addEventListener('keypress', function(e) {
+        document.getElementById('playerName').addEventListener('keydown', function(e) {
             if (e.key === 'Enter') {
                 login();
             }
-        });
+        }, {passive: true});
     </script>
 </body>
 </html>
     '''
+
+# The page has no template variables, so it is served as these bytes without Jinja;
+# the gzip copy and the ETag are computed once here, not per request or per app
+INDEX_BODY = HTML_TEMPLATE.encode('utf-8')
+INDEX_ETAG = hashlib.sha1(INDEX_BODY).hexdigest()
+INDEX_BODY_GZIP = gzip.compress(INDEX_BODY, 9)
+
+def create_web_interface():
+    """Create the integrated web interface"""
+    global web_app, web_socketio, web_player_sessions
+    
+    if mud_multi is None:
+        raise RuntimeError("mud_multi module not set. Call set_mud_module() first.")
+
+    # Build the app only once; calling again hands back the existing one
+    if web_app is not None:
+        return web_app, web_socketio
+    
+    # Make sure rooms are loaded
+    if not hasattr(mud_multi, 'rooms') or not mud_multi.rooms:
+        print("Rooms not loaded yet, initializing...")
+        mud_multi.parse_area_file('area.txt')
+        mud_multi.load_objects_from_file('objects.json')
+        mud_multi.process_resets()
+        mud_multi.load_spells_from_file('spells.json')
+        mud_multi.load_npcs_from_file('npcs.json')
+    
+    web_app = Flask(__name__)
+    web_app.secret_key = secrets.token_hex(16)
+    # The game emits from its own OS threads (combat, events, per-connection handlers),
+    # which only the threading mode supports; pin it so an installed eventlet or gevent
+    # isn't picked up automatically without the monkey patching it would need
+    # Game output frames are small and already coalesced per session, so compressing each
+    # polling response separately for every client would cost more CPU than it saves bandwidth
+    web_socketio = SocketIO(web_app, cors_allowed_origins="*", async_mode='threading',
+                            http_compression=False)
     
+    # Returning browsers revalidate with the ETag and get a 304 instead of the page again
     @web_app.route('/')
     def index():
-        return render_template_string(HTML_TEMPLATE)
+        if 'gzip' in request.accept_encodings:
+            response = Response(INDEX_BODY_GZIP, mimetype='text/html')
+            response.headers['Content-Encoding'] = 'gzip'
+            # Each encoding is a different representation, so it needs its own ETag
+            response.set_etag(INDEX_ETAG + '-gzip')
+        else:
+            response = Response(INDEX_BODY, mimetype='text/html')
+            response.set_etag(INDEX_ETAG)
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response.make_conditional(request)
     
     @web_socketio.on('connect')
     def handle_connect():
@@ -226,51 +269,55 @@ def create_web_interface():
         print(f"DEBUG WEB: Login attempt from session {request.sid} with data: {data}")
         player_name = data.get('name', '').strip()
         print(f"DEBUG WEB: Player name extracted: '{player_name}'")
-        if not player_name or len(player_name) > 20:
+        if not _valid_name(player_name):
             print(f"DEBUG WEB: Invalid name, emitting error")
             emit('error', {'message': 'Invalid name'})
             return
         
         # Check name availability and create player atomically - thread-safe
-        player_name_lower = player_name.lower()
         try:
-            with mud_multi.players_lock:
-                existing_players_lower = [name.lower() for name in mud_multi.players.keys()]
-                if player_name_lower in existing_players_lower:
-                    emit('error', {'message': 'Name already in use'})
-                    return
+            # Shared with telnet logins: the name stays reserved until complete_login
+            if not mud_multi.reserve_login_name(player_name):
+                emit('error', {'message': 'Name already in use'})
+                return
                 
-                # Create web connection handler and player while holding the lock
+            try:
+                # Create web connection handler
                 session_id = request.sid
                 web_handler = mud_multi.WebConnectionHandler(session_id, web_socketio)
-                
+            
                 # Create player with web connection handler
                 start_room = 2201
                 new_player = mud_multi.Player(player_name, start_room, web_handler)
                 mud_multi.load_player_profile(new_player)
-                
-                # Add to players dictionary (already holding lock)
-                mud_multi.players[player_name] = new_player
+            except Exception:
+                mud_multi.release_login_name(player_name)
+                raise
+            
+            mud_multi.complete_login(new_player)
             
             # Operations that don't need the lock
             web_player_sessions[session_id] = player_name
             
             # Add default spells
-            for spell_name in ['fireball', 'magic missile', 'heal', 'chain lightning']:
-                if spell_name in mud_multi.spells and spell_name not in new_player.spellbook:
-                    new_player.spellbook[spell_name] = mud_multi.spells[spell_name]
+            new_player.spellbook.update(mud_multi.starter_spellbook)
             
             # Join socket room
             join_room(session_id)
             
             # Send welcome message
             emit('login_success', {'name': player_name})
-            mud_multi.send_to_player(new_player, f"Welcome, {new_player.name}! You appear in {new_player.current_room.name}.")
-            new_player.describe_current_room()
+            # Welcome line and room description go out as one frame
+            batching = new_player.begin_batch()
+            try:
+                mud_multi.send_to_player(new_player, f"Welcome, {new_player.name}! You appear in {new_player.current_room.name}.")
+                new_player.describe_current_room()
+            finally:
+                if batching:
+                    new_player.end_batch()
             
         except Exception as e:
             print(f"Error creating web player {player_name}: {e}")
-            import traceback
             traceback.print_exc()
             emit('error', {'message': 'Failed to create player'})
     
@@ -290,7 +337,7 @@ def create_web_interface():
             return
         
         player = mud_multi.players[player_name]
-        command = data.get('command', '').strip().lower()
+        command = data.get('command', '').strip()
         
         if command:
             try:
@@ -300,7 +347,6 @@ def create_web_interface():
                     handle_web_disconnect()
             except Exception as e:
                 print(f"Error processing command '{command}' for {player_name}: {e}")
-                import traceback
                 traceback.print_exc()
                 emit('error', {'message': f'Command error: {str(e)}'})
     
@@ -309,15 +355,15 @@ def create_web_interface():
         session_id = request.sid
         if session_id in web_player_sessions:
             player_name = web_player_sessions[session_id]
-            with mud_multi.players_lock:
-                if player_name in mud_multi.players:
-                    player = mud_multi.players[player_name]
-                    mud_multi.save_player_profile(player)
-                    # Remove from room players list
-                    if hasattr(player, 'current_room') and hasattr(player.current_room, 'players'):
-                        if player in player.current_room.players:
-                            player.current_room.players.remove(player)
-                    del mud_multi.players[player_name]
+            player = mud_multi.players.get(player_name)
+            if player is not None:
+                # Save while the name is still taken, so a quick re-login reads the new profile;
+                # neither the disk write nor leaving the room (a set discard) needs players_lock
+                mud_multi.save_player_profile(player)
+                player.leave_room()
+                player.stop_resting()
+                with mud_multi.players_lock:
+                    mud_multi.remove_online_player(player_name)
             del web_player_sessions[session_id]
     
     return web_app, web_socketio
@@ -341,6 +387,5 @@ def start_web_interface():
         
     except Exception as e:
         print(f"Failed to start integrated web interface: {e}")
-        import traceback
         traceback.print_exc()
         return None
\ No newline at end of file
@@ -1,8 +1,10 @@
 import argparse
+import bisect
 import copy
+import functools
 import json
+import math
 import os
-import pickle
 import queue
 import random
 import re
@@ -15,20 +17,36 @@ import traceback
 import textwrap
 import socket
 from abc import ABC, abstractmethod
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 # Global debug flag
 DEBUG = False
 
+# Dedicated generator for the combat, spell and chat rolls, with its methods
+# bound once so the hot paths skip the module and attribute lookups
+_rng = random.Random()
+_random = _rng.random
+_randint = _rng.randint
+_choice = _rng.choice
+_sample = _rng.sample
+
 def debug_print(*args, **kwargs):
     """Print debug message only if DEBUG flag is enabled"""
     if DEBUG:
         print("DEBUG:", *args, **kwargs)
 
+def read_config_file():
+    """Parse config.json; raises OSError or JSONDecodeError if it can't be read"""
+    with open('config.json', 'r') as f:
+        return json.load(f)
+
 # Load configuration
 def load_config():
+    """Startup configuration: config.json, or built-in defaults if it can't be read"""
     try:
-        with open('config.json', 'r') as f:
-            return json.load(f)
+        return read_config_file()
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Warning: Could not load config.json ({e}), using defaults")
         return {
@@ -41,19 +59,52 @@ def load_config():
             }
         }
 
+def config_mtime():
+    """Modification time of config.json, or None if it can't be read"""
+    try:
+        return os.path.getmtime('config.json')
+    except OSError:
+        return None
+
 config = load_config()
+config_loaded_mtime = config_mtime()
+
+def reload_config(force=False):
+    """Re-read config.json into the shared config dict; skipped if the file hasn't changed.
+
+    Unlike startup, a file that can't be read (say, caught half-written) keeps the
+    running config rather than falling back to the defaults.
+    """
+    global config_loaded_mtime
+    mtime = config_mtime()
+    if not force and mtime is not None and mtime == config_loaded_mtime:
+        return False
+    try:
+        fresh = read_config_file()
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not reload config.json ({e}), keeping the current configuration")
+        return False
+    # Overwrite in place rather than clear() first: other threads read config at any time,
+    # and must never see it without its 'llm' or 'game' section
+    config.update(fresh)
+    for key in config.keys() - fresh.keys():
+        config.pop(key, None)
+    config_loaded_mtime = mtime
+    return True
 
 # LLM Chat Function
 def llm_chat(conversation_history):
-    print(f"DEBUG CHAT: Starting LLM chat request...")
-    print(f"DEBUG CHAT: Conversation history length: {len(conversation_history)}")
+    if DEBUG:
+        print(f"DEBUG CHAT: Starting LLM chat request...")
+        print(f"DEBUG CHAT: Conversation history length: {len(conversation_history)}")
     
     llm_config = config['llm']
     llm_url = f"http://{llm_config['server_ip']}:{llm_config['server_port']}/v1/chat/completions"
     
-    print(f"DEBUG CHAT: Using LLM server: {llm_url}")
-    print(f"DEBUG CHAT: Model: {llm_config['model']}")
-    print(f"DEBUG CHAT: Max tokens: {llm_config['max_tokens']}")
+    if DEBUG:
+        print(f"DEBUG CHAT: Using LLM server: {llm_url}")
+        print(f"DEBUG CHAT: Model: {llm_config['model']}")
+        print(f"DEBUG CHAT: Max tokens: {llm_config['max_tokens']}")
     
     data = {
         "model": llm_config['model'],
@@ -66,61 +117,140 @@ def llm_chat(conversation_history):
     }
     headers = {'Content-Type': 'application/json'}
     
-    print(f"DEBUG CHAT: Request data: {data}")
-    print(f"DEBUG CHAT: Request headers: {headers}")
+    if DEBUG:
+        print(f"DEBUG CHAT: Request data: {data}")
+        print(f"DEBUG CHAT: Request headers: {headers}")
     
     try:
-        print(f"DEBUG CHAT: Sending POST request to {llm_url}")
+        if DEBUG:
+            print(f"DEBUG CHAT: Sending POST request to {llm_url}")
         response = requests.post(llm_url, json=data, headers=headers, timeout=30)
         
-        print(f"DEBUG CHAT: Response status code: {response.status_code}")
-        print(f"DEBUG CHAT: Response headers: {dict(response.headers)}")
+        if DEBUG:
+            print(f"DEBUG CHAT: Response status code: {response.status_code}")
+            print(f"DEBUG CHAT: Response headers: {dict(response.headers)}")
         
-        if response.status_code != 200:
+        if DEBUG and response.status_code != 200:
             print(f"DEBUG CHAT: Error response content: {response.text}")
         
         response.raise_for_status()
         result = response.json()
         
-        print(f"DEBUG CHAT: Response JSON keys: {list(result.keys())}")
-        print(f"DEBUG CHAT: Full response: {result}")
+        if DEBUG:
+            print(f"DEBUG CHAT: Response JSON keys: {list(result.keys())}")
+            print(f"DEBUG CHAT: Full response: {result}")
         
         ai_reply = result.get('choices', [{}])[0].get('message', {}).get('content', '').strip()
         
-        print(f"DEBUG CHAT: Extracted AI reply: '{ai_reply}'")
+        if DEBUG:
+            print(f"DEBUG CHAT: Extracted AI reply: '{ai_reply}'")
         
         if not ai_reply:
             ai_reply = "I'm sorry, I don't have anything to say right now."
-            print(f"DEBUG CHAT: Using fallback message")
+            if DEBUG:
+                print(f"DEBUG CHAT: Using fallback message")
         
-        print(f"DEBUG CHAT: Returning successful response")
+        if DEBUG:
+            print(f"DEBUG CHAT: Returning successful response")
         return ai_reply
         
     except requests.exceptions.ConnectionError as e:
-        print(f"DEBUG CHAT: Connection error - server likely not running: {e}")
-        print(f"DEBUG CHAT: Make sure LLM server is running on {llm_url}")
+        if DEBUG:
+            print(f"DEBUG CHAT: Connection error - server likely not running: {e}")
+            print(f"DEBUG CHAT: Make sure LLM server is running on {llm_url}")
         return "I'm sorry, the AI service is not available right now."
         
     except requests.exceptions.Timeout as e:
-        print(f"DEBUG CHAT: Request timeout: {e}")
+        if DEBUG:
+            print(f"DEBUG CHAT: Request timeout: {e}")
         return "I'm sorry, the AI service is taking too long to respond."
         
     except requests.exceptions.HTTPError as e:
-        print(f"DEBUG CHAT: HTTP error: {e}")
-        print(f"DEBUG CHAT: Response content: {response.text if 'response' in locals() else 'No response'}")
+        if DEBUG:
+            print(f"DEBUG CHAT: HTTP error: {e}")
+            print(f"DEBUG CHAT: Response content: {response.text if 'response' in locals() else 'No response'}")
         return "I'm sorry, there was an error with the AI service."
         
     except (ValueError, KeyError) as e:
-        print(f"DEBUG CHAT: JSON parsing or key error: {e}")
-        print(f"DEBUG CHAT: Response content: {response.text if 'response' in locals() else 'No response'}")
+        if DEBUG:
+            print(f"DEBUG CHAT: JSON parsing or key error: {e}")
+            print(f"DEBUG CHAT: Response content: {response.text if 'response' in locals() else 'No response'}")
         return "I'm sorry, the AI service returned an invalid response."
         
     except Exception as e:
-        print(f"DEBUG CHAT: Unexpected error: {type(e).__name__}: {e}")
-        import traceback
+        if DEBUG:
+            print(f"DEBUG CHAT: Unexpected error: {type(e).__name__}: {e}")
         traceback.print_exc()
         return "I'm sorry, there was an unexpected error with the AI service."
 
+def new_conversation():
+    """Rolling message window for a chat session; old turns fall off so prompts stay bounded"""
+    return deque(maxlen=config.get('llm', {}).get('history_length', CHAT_HISTORY_LEN))
+
+def add_chat_turn(chat_data, role, content):
+    """Append a turn to a chat session, dropping the oldest turns once the history is over its
+    size budget; the caller holds chat_data['lock']"""
+    conversation = chat_data['conversation']
+    conversation.append({"role": role, "content": content})
+    # Prompt cost follows length, not message count, and replies vary a lot in size
+    budget = config.get('llm', {}).get('history_chars', CHAT_HISTORY_CHARS)
+    total = sum(len(m['content']) for m in conversation)
+    while total > budget and len(conversation) > 1:
+        total -= len(conversation.popleft()['content'])
+
+def chat_messages(chat_data):
+    """Return a chat session's system prompt followed by its rolling conversation window"""
+    with chat_data['lock']:
+        return [chat_data['system'], *chat_data['conversation']]
+
+# LLM requests run here so a slow reply never blocks the player's command thread
+llm_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='llm')
+
+def deliver_npc_reply(room_vnum, chat_data, npc, ai_reply, tag_speaker=False):
+    """Broadcast an NPC's reply to the room and add it to the chat session's history"""
+    content = f"[{npc.short_desc}] {ai_reply}" if tag_speaker else ai_reply
+    # Several replies for one room can land at once; keep broadcast and history in the same order
+    with chat_data['lock']:
+        # The conversation may have been stopped while we waited
+        if chat_sessions.get(room_vnum) is not chat_data:
+            return
+        broadcast_room(rooms[room_vnum], NPC_SAY_FORMAT.format(npc.short_desc, ai_reply), exclude=None)
+        add_chat_turn(chat_data, "assistant", content)
+
+def request_npc_reply(room_vnum, chat_data, npc, messages, tag_speaker=False, on_reply=None):
+    """Ask the LLM for an NPC's reply in the background and broadcast it when it arrives"""
+    def deliver(future):
+        ai_reply = future.result()
+        if on_reply:
+            on_reply(ai_reply)
+        deliver_npc_reply(room_vnum, chat_data, npc, ai_reply, tag_speaker)
+
+    llm_pool.submit(llm_chat, messages).add_done_callback(deliver)
+
+# Conversation openers only depend on who is speaking, so a few per NPC are kept and
+# replayed for a while instead of asking the LLM every cycle
+OPENER_CACHE_SIZE = 4
+OPENER_CACHE_TTL = 600  # seconds; afterwards the NPC gets fresh lines
+npc_opener_cache = {}  # Key: npc short_desc, Value: (created timestamp, [replies])
+
+def cached_opener(npc):
+    """Return a random cached opener for this NPC, or None if the cache is not full or has expired"""
+    entry = npc_opener_cache.get(npc.short_desc)
+    if entry and len(entry[1]) >= OPENER_CACHE_SIZE and time.time() - entry[0] < OPENER_CACHE_TTL:
+        return _choice(entry[1])
+    return None
+
+def remember_opener(npc, ai_reply):
+    """Add a freshly generated opener to the NPC's cache"""
+    # llm_chat's fallbacks for a missing or broken server all start like this
+    if ai_reply.startswith("I'm sorry"):
+        return
+    entry = npc_opener_cache.get(npc.short_desc)
+    if entry is None or time.time() - entry[0] >= OPENER_CACHE_TTL:
+        entry = npc_opener_cache[npc.short_desc] = (time.time(), [])
+    if len(entry[1]) < OPENER_CACHE_SIZE:
+        entry[1].append(ai_reply)
+
 # Connection Handler Architecture
 class ConnectionHandler(ABC):
     """Abstract base class for handling different connection types"""
@@ -145,14 +275,28 @@ class ConnectionHandler(ABC):
         """Check if the connection is still active"""
         pass
 
+MAX_INPUT_LINE = 4096  # Longer input lines are handed over in pieces
+CLIENT_SEND_BUFFER = 64 * 1024  # Room for a full screen of batched output per client
+
 class TelnetConnectionHandler(ConnectionHandler):
     """Handles telnet socket connections"""
     
     def __init__(self, client_socket):
         self.client_socket = client_socket
+        # Buffered reader so input is split on newlines, not on whatever each recv() returned
+        self._reader = client_socket.makefile('rb') if client_socket else None
         # Set socket timeout to prevent hanging connections
         if client_socket:
             client_socket.settimeout(30.0)  # 30 second timeout for operations
+            # Output is already coalesced into one write per command, so Nagle would only add delay
+            try:
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError:
+                pass  # Not a TCP socket
+            # Tick threads flush every player's batch in turn; a roomy send buffer keeps one
+            # slow reader from stalling sendall() and holding up everyone after it
+            if client_socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) < CLIENT_SEND_BUFFER:
+                client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, CLIENT_SEND_BUFFER)
     
     def send_message(self, message):
         """Send message to telnet client"""
@@ -167,7 +311,7 @@ class TelnetConnectionHandler(ConnectionHandler):
         if not self.client_socket or not self.is_connected():
             return None  # Signal connection loss
         try:
-            raw_data = self.client_socket.recv(1024)
+            raw_data = self._reader.readline(MAX_INPUT_LINE)
             if not raw_data:  # Connection closed
                 return None
             # Handle telnet control codes and invalid UTF-8 gracefully
@@ -187,6 +331,8 @@ class TelnetConnectionHandler(ConnectionHandler):
         """Close telnet connection"""
         if self.client_socket:
             try:
+                # The socket only really closes once its reader is closed too
+                self._reader.close()
                 self.client_socket.close()
             except:
                 pass
@@ -196,6 +342,9 @@ class TelnetConnectionHandler(ConnectionHandler):
         """Check if telnet connection is active"""
         return self.client_socket is not None
 
+WEB_PENDING_MAX = 256  # Messages held for a stalled web client before the oldest are dropped
+WEB_TRUNCATED_NOTICE = "[... output truncated ...]\n"
+
 class WebConnectionHandler(ConnectionHandler):
     """Handles web socket connections"""
     
@@ -204,30 +353,59 @@ class WebConnectionHandler(ConnectionHandler):
         self.socketio = socketio_instance
         self.pending_input = queue.Queue()
         self.connected = True
+        # Messages waiting for the emitter thread; whatever piles up while it is
+        # busy goes out together as one Socket.IO frame. Bounded, so a stalled client
+        # loses its oldest output instead of growing memory without limit
+        self._pending = deque(maxlen=WEB_PENDING_MAX)
+        self._pending_lock = threading.Lock()
+        self._emitting = False
+        self._dropped = False  # Set when the bound discarded output; flagged on the next frame
     
     def send_message(self, message):
         """Send message to web client"""
         if self.is_connected():
             try:
-                print(f"DEBUG WEB SEND: Sending to {self.session_id}: {message.strip()}")
-                # Use threading to ensure Socket.IO emission doesn't block
-                import threading
-                def emit_message():
-                    try:
-                        self.socketio.emit('message', {'content': message}, room=self.session_id)
-                        print(f"DEBUG WEB SEND: Successfully emitted to {self.session_id}")
-                    except Exception as e:
-                        print(f"DEBUG WEB SEND: Emission failed for {self.session_id}: {e}")
-                        self.connected = False
-
-                # Run emission in a separate thread to avoid blocking
-                threading.Thread(target=emit_message, daemon=True).start()
+                if DEBUG:
+                    print(f"DEBUG WEB SEND: Sending to {self.session_id}: {message.strip()}")
+                with self._pending_lock:
+                    if len(self._pending) == WEB_PENDING_MAX:
+                        self._dropped = True
+                    self._pending.append(message)
+                    if self._emitting:
+                        return  # The running emitter will pick it up
+                    self._emitting = True
+                # Emit from a separate task so a slow client never blocks the game; the
+                # Socket.IO server starts it in whatever form its async mode uses
+                self.socketio.start_background_task(self._emit_pending)
 
             except Exception as e:
                 print(f"Error sending to web client {self.session_id}: {e}")
                 self.connected = False
         else:
-            print(f"DEBUG WEB SEND: Cannot send, session {self.session_id} not connected")
+            if DEBUG:
+                print(f"DEBUG WEB SEND: Cannot send, session {self.session_id} not connected")
+
+    def _emit_pending(self):
+        """Emit queued messages, joined into one frame per pass, until the queue is empty"""
+        while True:
+            with self._pending_lock:
+                if not self._pending or not self.connected:
+                    self._pending.clear()
+                    self._emitting = False
+                    return
+                content = ''.join(self._pending)
+                self._pending.clear()
+                if self._dropped:
+                    content = WEB_TRUNCATED_NOTICE + content
+                    self._dropped = False
+            try:
+                self.socketio.emit('message', {'content': content}, room=self.session_id)
+                if DEBUG:
+                    print(f"DEBUG WEB SEND: Successfully emitted to {self.session_id}")
+            except Exception as e:
+                if DEBUG:
+                    print(f"DEBUG WEB SEND: Emission failed for {self.session_id}: {e}")
+                self.connected = False
     
     def receive_line(self):
         """Receive line from web client (blocking)"""
@@ -253,10 +431,19 @@ class WebConnectionHandler(ConnectionHandler):
 # Global variables for game state
 rooms = {}
 mobiles = {}
+mob_template_index = {}  # Key: lowercase keyword or short_desc word, Value: list of template vnums
+room_name_index = {}  # Key: lowercase room name, Value: first room with that name
+room_names_lower = []  # (lowercase name, room) in file order, for partial-name teleports
+all_room_vnums = ()  # Immutable copy of rooms' keys for random picks, rebuilt when an area file is loaded
+world_doors = []  # (door_id, exit) for every exit that is a door; all save_game has to write
+save_lock = threading.Lock()  # One save file write (world or profile) at a time
 objects = {}
 resets = {}
 spells = {}
+STARTER_SPELLS = ('fireball', 'magic missile', 'heal', 'chain lightning')
+starter_spellbook = {}  # The STARTER_SPELLS that were loaded; rebuilt by load_spells_from_file
 all_npcs = []
+npc_schedule_by_hour = {}  # Key: hour of day, Value: list of (npc, room_vnum) moves due then
 achievements = {}
 current_weather = 'clear'
 weather_conditions = ['clear', 'rainy', 'foggy', 'stormy']
@@ -265,14 +452,26 @@ current_time_of_day = 'day'  # 'day' or 'night'
 
 players = {}  # Key: player name, Value: Player object
 players_lock = threading.Lock()
+players_snapshot = ()  # Immutable copy of players.values() for broadcasts, rebuilt on join/leave
+players_by_name_lower = {}  # Key: lowercase player name, Value: Player object; kept with players
+pending_logins = set()  # Lowercase names reserved by logins still in progress; guarded by players_lock
+resting_players = set()  # Players the rest ticker heals each second; see Player.rest and rest_loop
+rest_wakeup = threading.Event()  # Set when someone starts resting, so an idle rest_loop can sleep
 active_events = {}  # room_vnum -> event data
 active_events_lock = threading.Lock()
+world_events_wakeup = threading.Event()  # Set when an event with an end_time is added
 combatants = {}  # Combat pairs tracking
+opponents = {}  # Key: combatant name, Value: dict of opponent names (insertion-ordered set)
+mob_index = {}  # Key: lowercased short_desc, Value: list of live mobs in rooms
+mob_keyword_index = {}  # Key: lowercased keyword, Value: list of live mobs in rooms
 combatants_lock = threading.Lock()
-chat_sessions = {}  # Key: room_vnum, Value: {'npc': NPC object, 'player': Player object, 'conversation': [...]}  
+chat_sessions = {}  # Key: room_vnum, Value: {'npcs': [...], 'players': [...], 'system': {...}, 'conversation': deque, 'lock': Lock, 'next_speaker': int}
+CHAT_HISTORY_LEN = 5  # Messages kept after the system prompt, unless config sets llm.history_length
+CHAT_HISTORY_CHARS = 4000  # Rough size cap (~1000 tokens) on those messages, unless config sets llm.history_chars
 chat_sessions_lock = threading.Lock()
 portal_connections = {}  # Key: room_vnum, Value: destination_room_vnum
-merchant_items = [
+# Traveling merchant wares; turned into the read-only merchant_items Objects below the Object class
+merchant_item_data = [
     {"vnum": 9001, "keywords": ["healing", "potion"], "short_desc": "a healing potion",
      "long_desc": "A healing potion glows softly here.", "description": "This potion restores health.",
      "item_type": "potion", "effects": {"heal": 50}},
@@ -312,6 +511,40 @@ merchant_items = [
      "item_type": "ring", "effects": {"attack": 3, "defense": 3}}
 ]
 
+def contains_any(needle, strings):
+    """True if needle is a substring of any of strings (both already lowercased)"""
+    return any(needle in s for s in strings)
+
+def item_name_matches(item, needle):
+    """True if needle (already lowercased) is part of one of the item's keywords or its short description"""
+    # short_desc first: one substring test before walking the keywords
+    return needle in item.short_desc_lower or contains_any(needle, item.keywords_lower)
+
+@functools.lru_cache(maxsize=None)
+def _shared_keywords(words):
+    return tuple(sys.intern(word) for word in words)
+
+def keyword_tuple(keywords):
+    """Shared tuple of interned keywords for a keyword string or list; items with the same keywords get the same tuple"""
+    if isinstance(keywords, str):
+        keywords = keywords.split()
+    return _shared_keywords(tuple(keywords))
+
+def build_keyword_index(items):
+    """Map each lowercased item keyword to the first item carrying it"""
+    index = {}
+    for item in items:
+        for kw in item.keywords_lower:
+            index.setdefault(kw, item)
+    return index
+
+def match_item(keyword_index, items, name_lower):
+    """Find an item by exact keyword, falling back to a substring of its short description"""
+    item = keyword_index.get(name_lower)
+    if item is None:
+        item = next((i for i in items if name_lower in i.short_desc_lower), None)
+    return item
+
 # Colors for text formatting (Players see plain text as Telnet usually doesn't support these easily)
 class Colors:
     RESET = ''
@@ -324,19 +557,107 @@ class Colors:
     BOLD = ''
     WHITE = ''
 
+# Message templates for the chat paths, built once from the color codes
+SAY_FORMAT = Colors.GREEN + "{}: {}" + Colors.RESET + "\n"
+NPC_SAY_FORMAT = Colors.BLUE + "{}: {}" + Colors.RESET + "\n"
+CHAT_HINT = Colors.YELLOW + "[Use 'say <message>' to continue talking]" + Colors.RESET + "\n"
+CHAT_END_MESSAGE = Colors.YELLOW + "You end the conversation. NPCs return to their normal activities." + Colors.RESET + "\n"
+CHAT_LEFT_FORMAT = Colors.YELLOW + "{} ends the conversation." + Colors.RESET + "\n"
+
+# Reward announcements for lucky finds and the daily bonus
+REWARD_FORMAT = "\n" + Colors.YELLOW + "{}" + Colors.RESET + "\n"
+DAILY_BONUS_FORMAT = Colors.GREEN + "Daily Bonus: +{} XP and {} gold!" + Colors.RESET + "\n"
+BONUS_FIND_FORMAT = Colors.YELLOW + "✨ BONUS SURPRISE: You also found a {}!" + Colors.RESET + "\n"
+
 # Data classes for game entities
+class Exit:
+    __slots__ = ('description', 'keywords', 'door_flags', 'key_vnum', 'to_room_vnum',
+                 'is_door', 'is_open', 'is_locked', 'secret_code')
+
+    def __init__(self, description, keywords, door_flags, key_vnum, to_room_vnum):
+        self.description = description
+        self.keywords = keywords
+        self.door_flags = door_flags  # 1 and 3 are doors; 2 and 3 start locked
+        self.key_vnum = key_vnum
+        self.to_room_vnum = to_room_vnum
+        self.is_door = door_flags in (1, 3)  # Checked on every move and look, so decided once here
+        self.is_open = door_flags in (0, 2)
+        self.is_locked = door_flags in (2, 3)
+        self.secret_code = None
+
 class Room:
+    __slots__ = ('vnum', 'name', 'description', 'exits', 'mobs', 'objects', 'npcs',
+                 'players', 'extra_descriptions', 'keyword_index', 'exits_text')
+
     def __init__(self, vnum, name, description, exits):
         self.vnum = vnum
         self.name = name
         self.description = description
         self.exits = exits  # Dictionary of exits
-        self.mobs = []
+        self.mobs = {}  # Insertion-ordered set of mobs: O(1) membership and removal
         self.objects = []
-        self.npcs = []  # Add npcs list
+        self.npcs = {}  # The is_npc subset of mobs, same ordered-set shape; kept in sync by add_mob/remove_mob
+        self.players = set()  # Players currently in this room, kept in sync by Player.move_to
         self.extra_descriptions = []
+        self.keyword_index = None  # Built from objects on first lookup; reset when objects change
+        self.exits_text = None  # Exits line for look, built on first use; reset by set_door_open
+
+    def add_mob(self, mob):
+        """Put a mob in this room, keeping the NPC list and the mob's current_room in step"""
+        self.mobs[mob] = None
+        mob.current_room = self
+        if mob.is_npc:
+            self.npcs[mob] = None
+
+    def exits_line(self):
+        """Return the 'Exits:' line shown by look, building it only after a door changed"""
+        if self.exits_text is None:
+            exits = []
+            for dir_num, exit_data in self.exits.items():
+                direction = direction_map[dir_num]
+                if exit_data.is_door and not exit_data.is_open:
+                    exits.append(f"{direction} (closed door)")
+                else:
+                    exits.append(direction)
+            self.exits_text = f"Exits: {', '.join(exits)}\n" if exits else "No obvious exits.\n"
+        return self.exits_text
+
+    def set_door_open(self, exit_data, is_open):
+        """Open or close one of this room's doors; the only way door state should change, so exits_line stays current"""
+        if exit_data.is_open != is_open:
+            exit_data.is_open = is_open
+            self.exits_text = None
+
+    def vendors(self):
+        """NPCs here with something to sell; most rooms have no NPCs, so this is usually free"""
+        if not self.npcs:
+            return ()
+        return [npc for npc in self.npcs if npc.inventory]
+
+    def remove_mob(self, mob):
+        """Take a mob out of this room, keeping the NPC list in step; returns False if it wasn't here"""
+        try:
+            del self.mobs[mob]
+        except KeyError:
+            return False
+        if mob.is_npc:
+            del self.npcs[mob]
+        return True
+
+    def object_index(self):
+        """Keyword index over the room's objects, rebuilt lazily after invalidation"""
+        if self.keyword_index is None:
+            self.keyword_index = build_keyword_index(self.objects)
+        return self.keyword_index
 
 class Mobile:
+    _kind = 'mob'  # Cheap type tag for combat dispatch
+    __slots__ = ('vnum', 'keywords', 'short_desc', 'long_desc', 'description', 'level',
+                 'is_npc', 'personality', 'background', 'secrets', 'schedule', 'inventory',
+                 'special_ability', 'current_room', 'conversation_history', 'has_given_items',
+                 'quest', 'hp', 'max_hp', 'defense', 'attack_power', 'tameable',
+                 'status_effects', 'keyword_index', 'keywords_lower', 'short_desc_lower')
+
     def __init__(self, vnum, keywords, short_desc, long_desc,
                  description, level, is_npc=False, personality='',
                  background='', secrets='', schedule=None, inventory=None,
@@ -344,6 +665,8 @@ class Mobile:
         self.vnum = vnum
         self.keywords = keywords
         self.short_desc = short_desc
+        self.keywords_lower = keyword_tuple(kw.lower() for kw in keywords)  # For name matching; shared between mobs
+        self.short_desc_lower = short_desc.lower()
         self.long_desc = long_desc
         self.description = description
         self.level = level
@@ -367,32 +690,99 @@ class Mobile:
         self.attack_power = self.level * 2
         self.tameable = tameable
         self.status_effects = []
+        self.keyword_index = None  # Built from inventory on first purchase lookup
+
+    def inventory_index(self):
+        """Return the keyword index of this mob's inventory, building it if needed"""
+        if self.keyword_index is None:
+            self.keyword_index = build_keyword_index(self.inventory)
+        return self.keyword_index
+
+    def clone(self):
+        """Spawn a new mob from this template, sharing its read-only data and copying per-mob state"""
+        # keywords, descriptions, personality and schedule stay shared with the template: never modify them in place
+        new = Mobile.__new__(Mobile)
+        for slot in Mobile.__slots__:
+            setattr(new, slot, getattr(self, slot))
+        new.inventory = [item.clone() for item in self.inventory]
+        new.current_room = None
+        new.conversation_history = []
+        new.quest = self.quest.clone() if self.quest else None
+        new.status_effects = []
+        new.keyword_index = None
+        return new
+
+    @property
+    def current_hp(self):
+        """Alias for hp, so every combatant exposes its hit points the same way"""
+        return self.hp
+
+    @current_hp.setter
+    def current_hp(self, value):
+        self.hp = value
+
+    @property
+    def display_name(self):
+        """Name shown in combat messages and used as the combat tracking key"""
+        return self.short_desc
 
 class Object:
+    __slots__ = ('vnum', 'keywords', 'short_desc', 'keywords_lower', 'short_desc_lower',
+                 'long_desc', 'description', 'item_type', 'effects')
+    # Constructor arguments; keywords_lower and short_desc_lower are derived from them
+    FIELDS = ('vnum', 'keywords', 'short_desc', 'long_desc', 'description', 'item_type', 'effects')
+
     def __init__(self, vnum, keywords, short_desc, long_desc,
                  description, item_type, effects):
         self.vnum = vnum
-        self.keywords = keywords
+        self.keywords = keyword_tuple(keywords)
         self.short_desc = short_desc
+        self.keywords_lower = keyword_tuple(kw.lower() for kw in self.keywords)  # For name matching
+        self.short_desc_lower = short_desc.lower()
         self.long_desc = long_desc
         self.description = description
         self.item_type = item_type
         self.effects = effects
 
-class Spell:
-    def __init__(self, name, description, effect_func, mana_cost):
-        self.name = name
-        self.description = description
-        self.effect_func = effect_func
-        self.mana_cost = mana_cost
+    def clone(self):
+        """Place a new copy of this template in the world; fields are shared since items are never modified in place"""
+        new = Object.__new__(Object)
+        for slot in Object.__slots__:
+            setattr(new, slot, getattr(self, slot))
+        return new
+
+    def to_dict(self):
+        """Constructor fields as a plain dict, for player profiles"""
+        return {field: getattr(self, field) for field in Object.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an item saved by to_dict; derived fields in older saves are ignored"""
+        return cls(
+            vnum=data.get('vnum', 0),
+            keywords=data.get('keywords', []),
+            short_desc=data.get('short_desc', 'an item'),
+            long_desc=data.get('long_desc', 'Nothing special about it.'),
+            description=data.get('description', 'A generic item.'),
+            item_type=data.get('item_type', 'misc'),
+            effects=data.get('effects', {})
+        )
+
+# Read-only item templates: buyers get the template itself, so never modify these in place
+merchant_items = [Object(**data) for data in merchant_item_data]
+merchant_keyword_index = build_keyword_index(merchant_items)
 
 class Achievement:
+    __slots__ = ('name', 'description', 'is_unlocked')
+
     def __init__(self, name, description, is_unlocked=False):
         self.name = name
         self.description = description
         self.is_unlocked = is_unlocked
 
 class Objective:
+    __slots__ = ('description', 'is_completed')
+
     def __init__(self, description):
         self.description = description
         self.is_completed = False
@@ -400,7 +790,13 @@ class Objective:
     def update(self):
         pass
 
+    def clone(self):
+        """Copy with its own progress; the fields are all scalars"""
+        return copy.copy(self)
+
 class KillObjective(Objective):
+    __slots__ = ('mob_name', 'required_kills', 'current_kills')
+
     def __init__(self, mob_name, required_kills):
         super().__init__(f"Defeat {required_kills} {mob_name}(s)")
         self.mob_name = mob_name
@@ -412,19 +808,24 @@ class KillObjective(Objective):
             self.is_completed = True
 
 class CollectObjective(Objective):
+    __slots__ = ('item_name', 'item_name_lower', 'required_amount', 'current_amount')
+
     def __init__(self, item_name, required_amount):
         super().__init__(f"Collect {required_amount} {item_name}(s)")
         self.item_name = item_name
+        self.item_name_lower = item_name.lower()  # Compared against items' keywords_lower
         self.required_amount = required_amount
         self.current_amount = 0
 
     def update(self, player):
-        count = sum(1 for item in player.inventory if self.item_name in item.keywords)
-        self.current_amount = count
+        needle = self.item_name_lower
+        self.current_amount = sum(1 for item in player.inventory if needle in item.keywords_lower)
         if self.current_amount >= self.required_amount:
             self.is_completed = True
 
 class Quest:
+    __slots__ = ('name', 'description', 'objectives', 'rewards', 'is_completed')
+
     def __init__(self, name, description, objectives, rewards):
         self.name = name
         self.description = description
@@ -432,62 +833,49 @@ class Quest:
         self.rewards = rewards
         self.is_completed = False
 
+    def clone(self):
+        """Copy for a newly spawned quest giver: fresh objective progress, rewards shared as they're read-only"""
+        new = Quest(self.name, self.description, [obj.clone() for obj in self.objectives], self.rewards)
+        new.is_completed = self.is_completed
+        return new
+
     def check_completion(self):
+        # Objectives never un-complete, so once the quest is done there is nothing to re-check
+        if self.is_completed:
+            return True
         if all(obj.is_completed for obj in self.objectives):
             self.is_completed = True
             return True
         return False
 
-# Spell effect functions
-def fireball_effect(caster, target):
-    if target:
-        damage = caster.intelligence * 2 + random.randint(5, 15)
-        target.hp -= damage
-        send_to_player(caster, f"You hurl a fireball at {target.short_desc}, dealing {damage} damage!\n")
-        if target.hp <= 0:
-            send_to_player(caster, f"{target.short_desc} has been defeated by your spell!\n")
-    else:
-        send_to_player(caster, "There is no target to cast fireball on.\n")
-
-def magic_missile_effect(caster, target):
-    if target:
-        damage = caster.intelligence + random.randint(3, 10)
-        target.hp -= damage
-        send_to_player(caster, f"Magic missiles strike {target.short_desc}, dealing {damage} damage!\n")
-        if target.hp <= 0:
-            send_to_player(caster, f"{target.short_desc} has been defeated by your spell!\n")
-    else:
-        send_to_player(caster, "There is no target to cast magic missile on.\n")
-
-def heal_effect(caster, target=None):
-    heal_amount = caster.intelligence * 2 + random.randint(5, 15)
-    caster.hp = min(caster.max_hp, caster.hp + heal_amount)
-    send_to_player(caster, f"You cast heal on yourself, restoring {heal_amount} HP.\n")
+# Section headers of an area file, by their first word
+AREA_SECTIONS = {
+    '#MOBOLD': 'MOBOLD',
+    '#OBJOLD': 'OBJOLD',
+    '#ROOMS': 'ROOMS',
+    '#RESETS': 'RESETS',
+    '#SPECIALS': 'SPECIALS',
+}
 
 def parse_area_file(file_path):
+    global all_room_vnums
+    find_room_by_name.cache_clear()
+    # One read and one split; lines come without their newline so the '~' terminators strip cleanly
     with open(file_path, 'r') as f:
-        lines = f.readlines()
+        lines = f.read().splitlines()
+    # Line numbers of every 'S' terminator, so room and reset parsers can jump to theirs
+    s_lines = [i for i, line in enumerate(lines) if line.startswith('S')]
 
     idx = 0
     section = None
     while idx < len(lines):
         line = lines[idx].strip()
-        if line.startswith('#MOBOLD'):
-            section = 'MOBOLD'
-            idx += 1
-        elif line.startswith('#OBJOLD'):
-            section = 'OBJOLD'
-            idx += 1
-        elif line.startswith('#ROOMS'):
-            section = 'ROOMS'
-            idx += 1
-        elif line.startswith('#RESETS'):
-            section = 'RESETS'
+        # Only '#' lines can open a section, so other lines skip the split
+        head = line.split(None, 1)[0] if line[:1] == '#' else ''
+        if head in AREA_SECTIONS:
+            section = AREA_SECTIONS[head]
             idx += 1
-        elif line.startswith('#SPECIALS'):
-            section = 'SPECIALS'
-            idx += 1
-        elif line.startswith('#0') or line.strip() == 'S' or line.startswith('#$'):
+        elif line == 'S' or line.startswith(('#0', '#$')):
             section = None
             idx += 1
         else:
@@ -496,58 +884,72 @@ def parse_area_file(file_path):
             elif section == 'OBJOLD':
                 idx = parse_object(lines, idx)
             elif section == 'ROOMS':
-                idx = parse_room(lines, idx)
+                idx = parse_room(lines, idx, s_lines)
             elif section == 'RESETS':
-                idx = parse_reset(lines, idx)
+                idx = parse_reset(lines, idx, s_lines)
             else:
                 idx += 1
+    # The world is only written here; event threads pick from this tuple without copying or locking
+    all_room_vnums = tuple(rooms)
+
+def read_tilde_text(lines, idx, sep='\n'):
+    """Read a '~'-terminated field starting at lines[idx]; returns the text and the index after the terminator"""
+    start = idx
+    while not lines[idx].strip().endswith('~'):
+        idx += 1
+    # Collect the lines and join once instead of growing a string line by line
+    parts = lines[start:idx]
+    parts.append(lines[idx].strip().strip('~').strip())
+    return sep.join(parts), idx + 1
+
+def next_s_line(s_lines, idx, line_count):
+    """Index of the first 'S' line at or after idx, or line_count if there is none"""
+    i = bisect.bisect_left(s_lines, idx)
+    return s_lines[i] if i < len(s_lines) else line_count
+
+# The "level hitroll armor" line that ends a mob's header block
+MOB_STATS_RE = re.compile(r'^\d+\s+\d+\s+\d+')
 
 def parse_mob(lines, idx):
     if not lines[idx].startswith('#'):
         return idx + 1
     vnum = int(lines[idx][1:].strip())
     idx += 1
-    keywords = lines[idx].strip('~').strip()
+    keywords = lines[idx].strip().strip('~').split()
     idx += 1
-    short_desc = lines[idx].strip('~').strip()
+    short_desc = lines[idx].strip().strip('~').strip()
     idx += 1
-    long_desc = lines[idx].strip('~').strip()
-    idx += 1
-    description = ''
-    while not lines[idx].strip().endswith('~'):
-        description += lines[idx] + ' '
-        idx += 1
-    description += lines[idx].strip('~').strip()
+    long_desc = lines[idx].strip().strip('~').strip()
     idx += 1
+    description, idx = read_tilde_text(lines, idx)
     level = 1
     while idx < len(lines) and not lines[idx].startswith('#') and lines[idx].strip() != '':
         line = lines[idx].strip()
-        if re.match(r'^\d+\s+\d+\s+\d+', line):
+        # Most lines in a mob block are flags or text; only try the regex on ones starting with a digit
+        if line[:1].isdigit() and MOB_STATS_RE.match(line):
             level = int(line.split()[0])
             idx += 1
             break
         idx += 1
-    mobiles[vnum] = Mobile(vnum, keywords, short_desc, long_desc,
-                           description, level)
+    mob = mobiles[vnum] = Mobile(vnum, keywords, short_desc, long_desc,
+                                 description, level)
+    # Let summon find templates by whole word without scanning every template
+    for word in dict.fromkeys(mob.keywords_lower + tuple(mob.short_desc_lower.replace('~', '').split())):
+        mob_template_index.setdefault(word, []).append(vnum)
     return idx
 
 def parse_object(lines, idx):
     # Objects are loaded from JSON, skip here
     return idx + 1
 
-def parse_room(lines, idx):
+def parse_room(lines, idx, s_lines):
     if not lines[idx].startswith('#'):
         return idx + 1
     vnum = int(lines[idx][1:].strip())
     idx += 1
-    name = lines[idx].strip('~').strip()
-    idx += 1
-    description = ''
-    while not lines[idx].strip().endswith('~'):
-        description += lines[idx] + ' '
-        idx += 1
-    description += lines[idx].strip('~').strip()
+    name = lines[idx].strip().strip('~').strip()
     idx += 1
+    description, idx = read_tilde_text(lines, idx)
     room_flags_line = lines[idx].strip()
     room_flags_parts = room_flags_line.split()
     if len(room_flags_parts) >= 3:
@@ -557,23 +959,13 @@ def parse_room(lines, idx):
     idx += 1
     exits = {}
     extra_descriptions = []
-    while idx < len(lines) and lines[idx][0] in ('D', 'E'):
+    while idx < len(lines) and lines[idx][:1] in ('D', 'E'):
         line = lines[idx]
         if line.startswith('D'):
             direction = int(line[1])
             idx += 1
-            exit_description = ''
-            while not lines[idx].strip().endswith('~'):
-                exit_description += lines[idx] + ' '
-                idx += 1
-            exit_description += lines[idx].strip('~').strip()
-            idx += 1
-            exit_keywords = ''
-            while not lines[idx].strip().endswith('~'):
-                exit_keywords += lines[idx] + ' '
-                idx += 1
-            exit_keywords += lines[idx].strip('~').strip()
-            idx += 1
+            exit_description, idx = read_tilde_text(lines, idx)
+            exit_keywords, idx = read_tilde_text(lines, idx, ' ')
             door_data = lines[idx].strip().split()
             if len(door_data) >= 3:
                 door_flags = int(door_data[0])
@@ -584,64 +976,62 @@ def parse_room(lines, idx):
                 key_vnum = 0
                 to_room_vnum = 0
             idx += 1
-            exit_data = {
-                'description': exit_description,
-                'keywords': exit_keywords,
-                'door_flags': door_flags,
-                'key_vnum': key_vnum,
-                'to_room_vnum': to_room_vnum,
-                'is_open': door_flags in (0, 2),
-                'is_locked': door_flags in (2, 3),
-                'secret_code': None
-            }
+            exit_data = Exit(exit_description, exit_keywords, door_flags, key_vnum, to_room_vnum)
             if idx < len(lines) and lines[idx].startswith('SECRET_CODE'):
                 secret_code_line = lines[idx].strip()
                 secret_code_parts = secret_code_line.split(' ', 1)
                 if len(secret_code_parts) == 2:
-                    exit_data['secret_code'] = secret_code_parts[1]
-                    exit_data['is_locked'] = True
+                    exit_data.secret_code = secret_code_parts[1]
+                    exit_data.is_locked = True
                 idx += 1
             exits[direction] = exit_data
         elif line.startswith('E'):
             idx += 1
-            ed_keywords = ''
-            while not lines[idx].strip().endswith('~'):
-                ed_keywords += lines[idx] + ' '
-                idx += 1
-            ed_keywords += lines[idx].strip('~').strip()
-            idx += 1
-            ed_description = ''
-            while not lines[idx].strip().endswith('~'):
-                ed_description += lines[idx] + ' '
-                idx += 1
-            ed_description += lines[idx].strip('~').strip()
-            idx += 1
+            ed_keywords, idx = read_tilde_text(lines, idx, ' ')
+            ed_description, idx = read_tilde_text(lines, idx)
             extra_descriptions.append({
                 'keywords': ed_keywords,
                 'description': ed_description
             })
         else:
             idx += 1
-    while idx < len(lines) and not lines[idx].startswith('S'):
-        idx += 1
-    idx += 1
+    idx = next_s_line(s_lines, idx, len(lines)) + 1
     room = Room(vnum, name, description, exits)
     room.extra_descriptions = extra_descriptions
     rooms[vnum] = room
+    # Let teleport find rooms by name without lowercasing every room name per call
+    name_lower = name.replace('~', '').lower()
+    room_name_index.setdefault(name_lower, room)
+    room_names_lower.append((name_lower, room))
+    for dir_num, exit_data in exits.items():
+        if exit_data.is_door:
+            world_doors.append((f"{vnum}-{dir_num}", exit_data))
     return idx
 
-def parse_reset(lines, idx):
-    while idx < len(lines) and not lines[idx].startswith('S'):
-        line = lines[idx].strip()
+@functools.lru_cache(maxsize=512)
+def find_room_by_name(needle):
+    """Room whose lowercased name is needle, else the first one containing it; rooms don't change after boot"""
+    room = room_name_index.get(needle)
+    if room is None:
+        room = next((r for name, r in room_names_lower if needle in name), None)
+    return room
+
+def parse_reset(lines, idx, s_lines):
+    end = next_s_line(s_lines, idx, len(lines))
+    for line in lines[idx:end]:
+        line = line.strip()
         if line:
             resets[line] = line
-        idx += 1
-    return idx + 1
+    return end + 1
 
 def process_resets():
     for room in rooms.values():
         room.objects = []
-        room.mobs = []
+        room.keyword_index = None
+        room.mobs = {}
+        room.npcs = {}
+    mob_index.clear()
+    mob_keyword_index.clear()
     for reset in resets.values():
         parts = reset.split()
         if len(parts) < 4:
@@ -653,15 +1043,16 @@ def process_resets():
             room_vnum = int(room_vnum)
             if room_vnum in rooms and mob_vnum in mobiles:
                 mob_template = mobiles[mob_vnum]
-                mob = copy.deepcopy(mob_template)
-                rooms[room_vnum].mobs.append(mob)
+                mob = mob_template.clone()
+                rooms[room_vnum].add_mob(mob)
+                index_mob(mob)
         elif command == 'O':
             _, _, obj_vnum, _, room_vnum = parts[:5]
             obj_vnum = int(obj_vnum)
             room_vnum = int(room_vnum)
             if room_vnum in rooms and obj_vnum in objects:
                 obj_template = objects[obj_vnum]
-                obj = copy.deepcopy(obj_template)
+                obj = obj_template.clone()
                 rooms[room_vnum].objects.append(obj)
         elif command == 'G':
             continue
@@ -670,25 +1061,23 @@ def process_resets():
     for room_vnum in goblin_rooms:
         if room_vnum in rooms and 2300 in mobiles:
             goblin_template = mobiles[2300]
-            goblin = copy.deepcopy(goblin_template)
-            rooms[room_vnum].mobs.append(goblin)
+            goblin = goblin_template.clone()
+            rooms[room_vnum].add_mob(goblin)
+            index_mob(goblin)
     herb_rooms = [2205, 2206]
     for room_vnum in herb_rooms:
         if room_vnum in rooms and 6000 in objects:
             herb_template = objects[6000]
-            herb = copy.deepcopy(herb_template)
+            herb = herb_template.clone()
             rooms[room_vnum].objects.append(herb)
 
 def load_objects_from_file(file_path):
     with open(file_path, 'r') as f:
         object_data_list = json.load(f)
     for obj_data in object_data_list:
-        keywords = obj_data['keywords']
-        if isinstance(keywords, str):
-            keywords = keywords.split()
         obj = Object(
             vnum=obj_data['vnum'],
-            keywords=keywords,
+            keywords=obj_data['keywords'],
             short_desc=obj_data['short_desc'],
             long_desc=obj_data['long_desc'],
             description=obj_data['description'],
@@ -698,11 +1087,13 @@ def load_objects_from_file(file_path):
         objects[obj.vnum] = obj
 
 def place_random_treasures():
-    treasure_items = [copy.deepcopy(obj) for obj in objects.values() if obj.vnum >= 5000]
-    room_list = list(rooms.values())
-    for treasure in treasure_items:
-        room = random.choice(room_list)
+    treasure_items = [obj.clone() for obj in objects.values() if obj.vnum >= 5000]
+    if not treasure_items or not rooms:
+        return
+    # Draw every destination room in one call rather than one choice() per treasure
+    for treasure, room in zip(treasure_items, random.choices(list(rooms.values()), k=len(treasure_items))):
         room.objects.append(treasure)
+        room.keyword_index = None
 
 def load_spells_from_file(file_path):
     with open(file_path, 'r') as f:
@@ -710,6 +1101,10 @@ def load_spells_from_file(file_path):
     for spell_data in spell_data_list:
         # Create a spell object with all the JSON properties
         class SpellObject:
+            __slots__ = ('name', 'description', 'mana_cost', 'spell_type', 'requires_target',
+                         'damage_multiplier', 'base_damage', 'heal_multiplier', 'base_heal',
+                         'damage_lo', 'damage_hi', 'heal_lo', 'heal_hi')
+
             def __init__(self, data):
                 self.name = data['name']
                 self.description = data['description']
@@ -721,9 +1116,16 @@ def load_spells_from_file(file_path):
                 # For healing spells
                 self.heal_multiplier = data.get('heal_multiplier', 1)
                 self.base_heal = data.get('base_heal', [5, 15])
+                # Unpacked once so casting doesn't index the ranges every time
+                self.damage_lo, self.damage_hi = self.base_damage
+                self.heal_lo, self.heal_hi = self.base_heal
         
         spell = SpellObject(spell_data)
         spells[spell.name.lower()] = spell
+
+    # Every login copies this in with one update instead of looking each spell up
+    starter_spellbook.clear()
+    starter_spellbook.update((name, spells[name]) for name in STARTER_SPELLS if name in spells)
     
     print(f"Loaded {len(spells)} spells from {file_path}")
     for spell_name in spells:
@@ -735,12 +1137,9 @@ def load_npcs_from_file(file_path):
     for npc_data in npc_data_list:
         inventory = []
         for item_data in npc_data.get('inventory', []):
-            obj_keywords = item_data['keywords']
-            if isinstance(obj_keywords, str):
-                obj_keywords = obj_keywords.split()
             obj = Object(
                 vnum=item_data['vnum'],
-                keywords=obj_keywords,
+                keywords=item_data['keywords'],
                 short_desc=item_data['short_desc'],
                 long_desc=item_data['long_desc'],
                 description=item_data['description'],
@@ -771,6 +1170,8 @@ def load_npcs_from_file(file_path):
             tameable=npc_data.get('tameable', False)
         )
         all_npcs.append(npc)
+        for hour, room_vnum in schedule:
+            npc_schedule_by_hour.setdefault(hour, []).append((npc, room_vnum))
         if 'quest' in npc_data:
             quest_data = npc_data['quest']
             objectives = []
@@ -812,19 +1213,19 @@ def load_npcs_from_file(file_path):
 
         room_vnum = npc_data['room_vnum']
         if room_vnum in rooms:
-            rooms[room_vnum].mobs.append(npc)
+            rooms[room_vnum].add_mob(npc)
             npc.current_room = rooms[room_vnum]
+            index_mob(npc)
 
-direction_map = {
-    0: 'north',
-    1: 'east',
-    2: 'south',
-    3: 'west',
-    4: 'up',
-    5: 'down'
-}
+# Exit numbers from the area file index straight into this tuple
+direction_map = ('north', 'east', 'south', 'west', 'up', 'down')
 
-reverse_direction_map = {v: k for k, v in direction_map.items()}
+reverse_direction_map = {name: dir_num for dir_num, name in enumerate(direction_map)}
+
+def parse_direction(direction):
+    """Return the exit number for a direction name or abbreviation, ignoring case and spacing"""
+    direction = direction.strip().lower()
+    return reverse_direction_map.get(command_abbreviations.get(direction, direction))
 
 command_abbreviations = {
     'n': 'north',
@@ -848,23 +1249,36 @@ def is_valid_text(text):
     return bool(text.strip())
 
 class Player:
+    _kind = 'player'  # Cheap type tag for combat dispatch
+    # last_login_date and magic_power are set lazily; hasattr() checks rely on that
+    __slots__ = ('name', 'name_lower', 'current_room', 'connection_handler', 'client_socket', '_send', '_send_buffer',
+                 '_batch_lock', '_outbox', '_writing',
+                 'strength', 'agility', 'intelligence', 'vitality', 'skill_points',
+                 'max_hp', 'hp', 'max_mana', 'mana', 'attack_power', 'defense', 'level',
+                 'experience', 'inventory', 'equipment', 'resting',
+                 'status_effects', 'spellbook', 'gold', 'achievements', 'active_quests',
+                 'completed_quests', 'companion', 'quests', 'reputation', 'karma', 'pets',
+                 'current_pet', 'rooms_visited', 'last_login_date', 'magic_power')
+
     def __init__(self, name, current_room_vnum, connection_handler):
         self.name = name
+        self.name_lower = name.lower()  # For case-insensitive lookups by name
+        # A player is always in some room from here on, so current_room is never None
         self.current_room = rooms[current_room_vnum]
-        self.connection_handler = connection_handler
-        # Keep client_socket for backward compatibility
-        self.client_socket = getattr(connection_handler, 'client_socket', None)
+        self.current_room.players.add(self)
+        self._send_buffer = None
+        # Output waiting for the socket, in the order it was produced; one thread at a time writes it
+        self._outbox = []
+        self._writing = False
+        # Guards _send_buffer, _outbox and _writing; never held while writing to the connection
+        self._batch_lock = threading.Lock()
+        self.attach_connection(connection_handler)
         self.strength = 5
         self.agility = 5
         self.intelligence = 5
         self.vitality = 5
         self.skill_points = 0
-        self.max_hp = self.calculate_max_hp()
-        self.hp = self.max_hp
-        self.max_mana = self.calculate_max_mana()
-        self.mana = self.max_mana
-        self.attack_power = self.calculate_attack_power()
-        self.defense = self.calculate_defense()
+        self.refresh_stats()
         self.level = 1
         self.experience = 0
         self.inventory = []
@@ -876,7 +1290,6 @@ class Player:
             'amulet': None
         }
         self.resting = False
-        self.rest_thread = None
         self.status_effects = []
         self.spellbook = {}
         self.gold = 100
@@ -892,6 +1305,88 @@ class Player:
         self.current_pet = None
         self.rooms_visited = set()
 
+    def attach_connection(self, connection_handler):
+        """Attach a connection handler and bind the send function used by send_to_player"""
+        self.connection_handler = connection_handler
+        # Keep client_socket for backward compatibility
+        self.client_socket = getattr(connection_handler, 'client_socket', None)
+        if connection_handler:
+            self._send = connection_handler.send_message
+        elif self.client_socket:
+            self._send = self._send_to_socket
+        else:
+            self._send = None
+
+    @property
+    def display_name(self):
+        """Name shown in combat messages and used as the combat tracking key"""
+        return self.name
+
+    def begin_batch(self):
+        """Start collecting send_to_player output; returns False if a batch is already open"""
+        with self._batch_lock:
+            if self._send_buffer is not None:
+                return False
+            self._send_buffer = []
+            return True
+
+    def end_batch(self):
+        """Flush everything collected since begin_batch as a single send"""
+        with self._batch_lock:
+            buffer, self._send_buffer = self._send_buffer, None
+            write = bool(buffer) and self._send is not None and self._queue_output(''.join(buffer))
+        if write:
+            self._write_output()
+
+    def _queue_output(self, message):
+        """Queue message behind earlier output; call with _batch_lock held.
+
+        Returns True if no thread is writing this player's output, in which case the
+        caller must call _write_output once it has released the lock.
+        """
+        self._outbox.append(message)
+        if self._writing:
+            return False
+        self._writing = True
+        return True
+
+    def _write_output(self):
+        """Write queued output until none is left, outside the lock, so a slow client
+        only holds up the thread writing to it and never a tick waiting on begin_batch"""
+        while True:
+            with self._batch_lock:
+                if not self._outbox:
+                    self._writing = False
+                    return
+                message = ''.join(self._outbox)
+                self._outbox.clear()
+                send = self._send
+            if send is None:
+                continue
+            try:
+                send(message)
+            except BaseException:
+                with self._batch_lock:
+                    self._writing = False
+                raise
+
+    def _send_to_socket(self, message):
+        # Fallback for backward compatibility
+        try:
+            self.client_socket.sendall(message.encode('utf-8'))
+        except (ConnectionResetError, BrokenPipeError, OSError):
+            print(f"Connection lost for player {self.name}")
+
+    def move_to(self, room):
+        """Move the player into a room, keeping the room's player index in sync"""
+        self.current_room.players.discard(self)
+        self.current_room = room
+        room.players.add(self)
+
+    def leave_room(self):
+        """Remove the player from its room's player index (used on disconnect)"""
+        self.current_room.players.discard(self)
+
     def calculate_attack_power(self):
         return self.strength * 20
 
@@ -904,50 +1399,51 @@ class Player:
     def calculate_max_mana(self):
         return self.intelligence * 15
 
-    def describe_current_room(self):
-        # Safety check: ensure inventory is always a list
-        if not isinstance(self.inventory, list):
-            self.inventory = list(self.inventory) if hasattr(self.inventory, '__iter__') else []
+    # Derived stats are stored as plain attributes and recomputed only when
+    # their inputs change, so combat reads them without any per-swing cost
+    def refresh_combat_stats(self):
+        """Recompute attack power and defense after skills or equipment change"""
+        self.attack_power = self.calculate_attack_power()
+        self.defense = self.calculate_defense()
+
+    def refresh_stats(self):
+        """Recompute every derived stat and refill hp and mana"""
+        self.max_hp = self.calculate_max_hp()
+        self.hp = self.max_hp
+        self.max_mana = self.calculate_max_mana()
+        self.mana = self.max_mana
+        self.refresh_combat_stats()
 
-        send_to_player(self, f"\n{self.current_room.name}\n")
-        send_to_player(self, f"Weather: {current_weather.capitalize()}\n")
-        send_to_player(self, f"Time: {current_time_of_day.capitalize()}\n")
+    def describe_current_room(self):
+        room = self.current_room
+        lines = [
+            f"\n{room.name}\n",
+            f"Weather: {current_weather.capitalize()}\n",
+            f"Time: {current_time_of_day.capitalize()}\n",
+        ]
         if current_time_of_day == 'night':
-            send_to_player(self, "It's dark. You might need a light source.\n")
-        send_to_player(self, f"{self.current_room.description}\n")
-        exits = []
-        for dir_num, exit_data in self.current_room.exits.items():
-            direction = direction_map[dir_num]
-            if exit_data['door_flags'] in (1, 3):
-                if exit_data.get('is_open', False):
-                    exits.append(direction)
-                else:
-                    exits.append(f"{direction} (closed door)")
-            else:
-                exits.append(direction)
-        if exits:
-            send_to_player(self, f"Exits: {', '.join(exits)}\n")
-        else:
-            send_to_player(self, "No obvious exits.\n")
+            lines.append("It's dark. You might need a light source.\n")
+        lines.append(f"{room.description}\n")
+        lines.append(room.exits_line())
         # Mobs
-        for mob in self.current_room.mobs:
-            send_to_player(self, f"You see {mob.short_desc} here.\n")
+        for mob in tuple(room.mobs):
+            lines.append(f"You see {mob.short_desc} here.\n")
         # Objects
-        for obj in self.current_room.objects:
-            send_to_player(self, f"You see {obj.short_desc} here.\n")
+        for obj in room.objects:
+            lines.append(f"You see {obj.short_desc} here.\n")
         # Companion
         if self.companion:
-            send_to_player(self, f"Your companion {self.companion.name} is here.\n")
+            lines.append(f"Your companion {self.companion.name} is here.\n")
         # Pet
         if self.current_pet:
-            send_to_player(self, f"Your pet {self.current_pet.name} is here.\n")
+            lines.append(f"Your pet {self.current_pet.name} is here.\n")
         
         # Active events (like traveling merchants)
-        if self.current_room.vnum in active_events:
-            event = active_events[self.current_room.vnum]
-            if event['type'] == 'merchant':
-                merchant_name = event['data']['name']
-                send_to_player(self, f"🚚 {merchant_name} has set up shop here with exotic wares! 🚚\n")
+        event = active_events.get(room.vnum)
+        if event is not None and event['type'] == 'merchant':
+            merchant_name = event['data']['name']
+            lines.append(f"🚚 {merchant_name} has set up shop here with exotic wares! 🚚\n")
+        send_to_player(self, ''.join(lines))
 
     def pick_up(self, obj):
         self.inventory.append(obj)
@@ -955,19 +1451,12 @@ class Player:
         # Check achievements, update quests, etc.
 
     def show_inventory(self):
-        send_to_player(self, "Inventory:\n")
         if self.inventory:
-            for item in self.inventory:
-                # Handle both dict and object items
-                if hasattr(item, 'short_desc'):
-                    item_name = item.short_desc
-                elif isinstance(item, dict) and 'short_desc' in item:
-                    item_name = item['short_desc']
-                else:
-                    item_name = str(item)
-                send_to_player(self, f"- {item_name}\n")
+            lines = ["Inventory:\n"]
+            lines.extend(f"- {item.short_desc}\n" for item in self.inventory)
+            send_to_player(self, ''.join(lines))
         else:
-            send_to_player(self, "Your inventory is empty.\n")
+            send_to_player(self, "Inventory:\nYour inventory is empty.\n")
 
     def allocate_skill_points(self, skill_name, points):
         if points > self.skill_points:
@@ -985,12 +1474,7 @@ class Player:
             send_to_player(self, "Invalid skill name.\n")
             return
         self.skill_points -= points
-        self.max_hp = self.calculate_max_hp()
-        self.hp = self.max_hp
-        self.max_mana = self.calculate_max_mana()
-        self.mana = self.max_mana
-        self.attack_power = self.calculate_attack_power()
-        self.defense = self.calculate_defense()
+        self.refresh_stats()
         send_to_player(self, f"You have increased your {skill_name} by {points} points.\n")
         send_to_player(self, f"Remaining skill points: {self.skill_points}\n")
 
@@ -1006,19 +1490,18 @@ class Player:
         if self.resting:
             send_to_player(self, "You need to stand up before you can move.\n")
             return
-        dir_num = reverse_direction_map.get(direction)
-        if dir_num is not None and dir_num in self.current_room.exits:
-            exit_data = self.current_room.exits[dir_num]
-            if exit_data['door_flags'] in (1, 3):
-                if not exit_data.get('is_open', False):
+        exit_data = self.current_room.exits.get(reverse_direction_map.get(direction))
+        if exit_data is not None:
+            if exit_data.is_door:
+                if not exit_data.is_open:
                     send_to_player(self, "The door is closed.\n")
                     return
-                if exit_data.get('is_locked', False):
+                if exit_data.is_locked:
                     send_to_player(self, "The door is locked.\n")
                     return
-            next_room_vnum = exit_data['to_room_vnum']
-            if next_room_vnum in rooms:
-                self.current_room = rooms[next_room_vnum]
+            next_room = rooms.get(exit_data.to_room_vnum)
+            if next_room is not None:
+                self.move_to(next_room)
                 send_to_player(self, f"\nYou move {direction} to {self.current_room.name}.\n")
                 self.describe_current_room()
                 if self.companion:
@@ -1034,29 +1517,31 @@ class Player:
             send_to_player(self, "You can't go that way.\n")
 
     def show_stats(self, brief=False):
-        send_to_player(self, "\nPlayer Stats:\n")
-        send_to_player(self, f"HP: {self.hp}/{self.max_hp}\n")
-        send_to_player(self, f"Mana: {self.mana}/{self.max_mana}\n")
-        send_to_player(self, f"Level: {self.level}\n")
-        send_to_player(self, f"Experience: {self.experience}\n")
-        send_to_player(self, f"Attack Power: {self.attack_power}\n")
-        send_to_player(self, f"Defense: {self.defense}\n")
-        send_to_player(self, f"Karma: {self.karma}\n")
+        lines = [
+            "\nPlayer Stats:\n",
+            f"HP: {self.hp}/{self.max_hp}\n",
+            f"Mana: {self.mana}/{self.max_mana}\n",
+            f"Level: {self.level}\n",
+            f"Experience: {self.experience}\n",
+            f"Attack Power: {self.attack_power}\n",
+            f"Defense: {self.defense}\n",
+            f"Karma: {self.karma}\n",
+        ]
         if self.status_effects:
-            send_to_player(self, f"Status Effects: {[effect.name for effect in self.status_effects]}\n")
+            lines.append(f"Status Effects: {[effect.name for effect in self.status_effects]}\n")
         else:
-            send_to_player(self, "Status Effects: None\n")
+            lines.append("Status Effects: None\n")
         if self.companion:
-            send_to_player(self, f"Companion: {self.companion.name}\n")
+            lines.append(f"Companion: {self.companion.name}\n")
         if self.current_pet:
-            send_to_player(self, f"Pet: {self.current_pet.name}\n")
-        send_to_player(self, "Equipped Items:\n")
+            lines.append(f"Pet: {self.current_pet.name}\n")
+        lines.append("Equipped Items:\n")
         for slot, item in self.equipment.items():
             if item:
-                item_name = item.get('short_desc', 'unknown item') if isinstance(item, dict) else getattr(item, 'short_desc', 'unknown item')
-                send_to_player(self, f"  {slot.capitalize()}: {item_name}\n")
+                lines.append(f"  {slot.capitalize()}: {item.short_desc}\n")
             else:
-                send_to_player(self, f"  {slot.capitalize()}: None\n")
+                lines.append(f"  {slot.capitalize()}: None\n")
+        send_to_player(self, ''.join(lines))
 
     def rest(self):
         if self.hp >= self.max_hp and self.mana >= self.max_mana:
@@ -1067,88 +1552,64 @@ class Player:
             return
         send_to_player(self, "You sit down and begin to rest.\n")
         self.resting = True
-        self.rest_thread = threading.Thread(target=self.heal_over_time)
-        self.rest_thread.start()
+        resting_players.add(self)
+        rest_wakeup.set()
 
     def stand(self):
         if not self.resting:
             send_to_player(self, "You are not resting.\n")
             return
-        self.resting = False
-        if self.rest_thread:
-            try:
-                self.rest_thread.join(timeout=5.0)
-                if self.rest_thread.is_alive():
-                    print(f"WARNING: Rest thread for {self.name} did not terminate within timeout")
-            except Exception as e:
-                print(f"ERROR: Exception while joining rest thread for {self.name}: {e}")
+        self.stop_resting()
         send_to_player(self, "You stand up, feeling refreshed.\n")
 
+    def stop_resting(self):
+        """Take the player off the rest ticker"""
+        self.resting = False
+        resting_players.discard(self)
+
     def heal_over_time(self):
-        while self.resting and (self.hp < self.max_hp or self.mana < self.max_mana):
-            time.sleep(1)
-            self.hp = min(self.max_hp, self.hp + 5)
-            self.mana = min(self.max_mana, self.mana + 5)
-            send_to_player(self, f"You rest and recover 5 HP and 5 Mana. Current HP: {self.hp}/{self.max_hp}, Mana: {self.mana}/{self.max_mana}\n")
-            if self.hp == self.max_hp and self.mana == self.max_mana:
-                send_to_player(self, "You are fully healed and your mana is restored.\n")
-                self.resting = False
-                break
+        """One rest tick, called every second by rest_loop while the player is resting"""
+        self.hp = min(self.max_hp, self.hp + 5)
+        self.mana = min(self.max_mana, self.mana + 5)
+        send_to_player(self, f"You rest and recover 5 HP and 5 Mana. Current HP: {self.hp}/{self.max_hp}, Mana: {self.mana}/{self.max_mana}\n")
+        if self.hp == self.max_hp and self.mana == self.max_mana:
+            send_to_player(self, "You are fully healed and your mana is restored.\n")
+            self.stop_resting()
 
     def teleport(self, room_identifier):
         if self.resting:
             send_to_player(self, "You need to stand up before you can teleport.\n")
             return
         if room_identifier.isdigit():
-            room_vnum = int(room_identifier)
-            if room_vnum in rooms:
-                self.current_room = rooms[room_vnum]
-                send_to_player(self, f"You teleport to {self.current_room.name}.\n")
-                self.describe_current_room()
-                if self.companion:
-                    self.companion.current_room = self.current_room
-                if self.current_pet:
-                    self.current_pet.current_room = self.current_room
-                self.rooms_visited.add(self.current_room.vnum)
-                return
-            else:
+            room = rooms.get(int(room_identifier))
+            if room is None:
                 send_to_player(self, "No room with that number exists.\n")
                 return
-        for room in rooms.values():
-            if room_identifier.lower() in room.name.lower():
-                self.current_room = room
-                send_to_player(self, f"You teleport to {self.current_room.name}.\n")
-                self.describe_current_room()
-                if self.companion:
-                    self.companion.current_room = self.current_room
-                if self.current_pet:
-                    self.current_pet.current_room = self.current_room
-                self.rooms_visited.add(self.current_room.vnum)
+        else:
+            room = find_room_by_name(room_identifier.lower())
+            if room is None:
+                send_to_player(self, "No room with that name exists.\n")
                 return
-        send_to_player(self, "No room with that name exists.\n")
+        self.move_to(room)
+        send_to_player(self, f"You teleport to {self.current_room.name}.\n")
+        self.describe_current_room()
+        if self.companion:
+            self.companion.current_room = self.current_room
+        if self.current_pet:
+            self.current_pet.current_room = self.current_room
+        self.rooms_visited.add(self.current_room.vnum)
 
     def show_map(self):
-        send_to_player(self, "Map:\n")
+        lines = ["Map:\n"]
         for dir_num, exit_data in self.current_room.exits.items():
             direction = direction_map[dir_num]
-            to_room_vnum = exit_data['to_room_vnum']
+            to_room_vnum = exit_data.to_room_vnum
             adjacent_room = rooms.get(to_room_vnum)
             if adjacent_room:
-                send_to_player(self, f"{direction.capitalize()}: {adjacent_room.name}\n")
+                lines.append(f"{direction.capitalize()}: {adjacent_room.name}\n")
             else:
-                send_to_player(self, f"{direction.capitalize()}: Unknown area\n")
-
-    def cast_spell(self, spell_name, target=None):
-        spell = self.spellbook.get(spell_name.lower())
-        if not spell:
-            send_to_player(self, "You don't know that spell.\n")
-            return
-        if self.mana < spell.mana_cost:
-            send_to_player(self, "You don't have enough mana.\n")
-            return
-        self.mana -= spell.mana_cost
-        send_to_player(self, f"You cast {spell.name}!\n")
-        spell.effect_func(self, target)
+                lines.append(f"{direction.capitalize()}: Unknown area\n")
+        send_to_player(self, ''.join(lines))
 
     def view_achievements(self):
         send_to_player(self, "Achievements:\n")
@@ -1168,11 +1629,12 @@ class Player:
                 return
             success_chance = 0.3 + (self.level * 0.02)
             success_chance = min(success_chance, 0.8)
-            if random.random() <= success_chance:
+            if _random() <= success_chance:
                 pet = Pet(mob.short_desc, self.current_room)
                 self.pets.append(pet)
                 self.current_pet = pet
-                self.current_room.mobs.remove(mob)
+                self.current_room.remove_mob(mob)
+                unindex_mob(mob)
                 send_to_player(self, f"You have successfully tamed {mob.short_desc} as your pet!\n")
                 unlock_achievement('Pet Tamer', self)
             else:
@@ -1196,16 +1658,18 @@ class Player:
             send_to_player(self, "You don't have an active pet to dismiss.\n")
 
     def craft_item(self, item1_name, item2_name):
-        item1 = next((item for item in self.inventory if item1_name in item.keywords), None)
-        item2 = next((item for item in self.inventory if item2_name in item.keywords), None)
+        item1_name, item2_name = item1_name.lower(), item2_name.lower()
+        item1 = next((item for item in self.inventory if item1_name in item.keywords_lower), None)
+        # The second ingredient has to be a different item, even if one item answers to both names
+        item2 = next((item for item in self.inventory if item is not item1 and item2_name in item.keywords_lower), None)
         if item1 and item2:
-            recipe = crafting_recipes.get((item1_name, item2_name))
+            recipe = crafting_recipes.get(recipe_key(item1_name, item2_name))
             if recipe:
                 self.inventory.remove(item1)
                 self.inventory.remove(item2)
                 new_item_template = objects.get(recipe['vnum'])
                 if new_item_template:
-                    new_item = copy.deepcopy(new_item_template)
+                    new_item = new_item_template.clone()
                     self.inventory.append(new_item)
                     send_to_player(self, f"You crafted {new_item.short_desc}!\n")
                     unlock_achievement('Master Crafter', self)
@@ -1228,7 +1692,7 @@ class Pet:
         self.experience = 0
 
     def attack(self, mob):
-        damage = random.randint(3, self.attack_power) - mob.defense
+        damage = _randint(3, self.attack_power) - mob.defense
         damage = max(1, damage)
         mob.hp -= damage
 
@@ -1244,7 +1708,7 @@ class Companion:
         self.experience = 0
 
     def attack(self, mob):
-        damage = random.randint(5, self.attack_power) - mob.defense
+        damage = _randint(5, self.attack_power) - mob.defense
         damage = max(1, damage)
         mob.hp -= damage
 
@@ -1267,7 +1731,7 @@ class WarriorCompanion(Companion):
         self.defense = 10
 
 def save_player_profile(player):
-    """Save player profile to disk"""
+    """Save player profile to disk; returns False if it could not be written"""
     try:
         # Create player_saves directory if it doesn't exist
         base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -1293,16 +1757,16 @@ def save_player_profile(player):
             'equipment': {},
             'spellbook': {},
             'gold': player.gold,
-            'achievements': list(player.achievements),
-            'active_quests': [quest.__dict__ for quest in player.active_quests],
+            'achievements': [achievement.name for achievement in player.achievements],
+            'active_quests': [{'name': quest.name, 'description': quest.description}
+                              for quest in player.active_quests],
             'completed_quests': list(player.completed_quests)
         }
         
         # Convert inventory items to saveable format
         for item in player.inventory:
-            if hasattr(item, '__dict__'):
-                # Object instance
-                profile_data['inventory'].append(item.__dict__)
+            if isinstance(item, Object):
+                profile_data['inventory'].append(item.to_dict())
             else:
                 # Dictionary item
                 profile_data['inventory'].append(item)
@@ -1310,8 +1774,8 @@ def save_player_profile(player):
         # Convert equipment to saveable format
         for slot, item in player.equipment.items():
             if item:
-                if hasattr(item, '__dict__'):
-                    profile_data['equipment'][slot] = item.__dict__
+                if isinstance(item, Object):
+                    profile_data['equipment'][slot] = item.to_dict()
                 else:
                     profile_data['equipment'][slot] = item
         
@@ -1325,22 +1789,27 @@ def save_player_profile(player):
         
         # Save to file using absolute path
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        filename = os.path.join(base_dir, 'player_saves', f'{player.name.lower()}.json')
-        with open(filename, 'w') as f:
-            json.dump(profile_data, f, indent=2)
+        filename = os.path.join(base_dir, 'player_saves', f'{player.name_lower}.json')
+        # Like save_game: write beside the old profile and swap it in, so a failed write keeps the last good one
+        with save_lock:
+            with open(filename + '.tmp', 'w') as f:
+                json.dump(profile_data, f, indent=2)
+            os.replace(filename + '.tmp', filename)
         
         print(f"Saved profile for {player.name}")
+        return True
         
     except Exception as e:
         print(f"Error saving player profile for {player.name}: {e}")
         traceback.print_exc()
+        return False
 
 def load_player_profile(player):
     """Load player profile from disk"""
     try:
         # Use absolute path to be safe
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        filename = os.path.join(base_dir, 'player_saves', f'{player.name.lower()}.json')
+        filename = os.path.join(base_dir, 'player_saves', f'{player.name_lower}.json')
         
         if not os.path.exists(filename):
             print(f"No saved profile found for {player.name}, using defaults")
@@ -1369,24 +1838,12 @@ def load_player_profile(player):
         player.agility = profile_data.get('agility', 5)
         player.intelligence = profile_data.get('intelligence', 5)
         player.vitality = profile_data.get('vitality', 5)
-        # Add gold attribute if it doesn't exist
-        if not hasattr(player, 'gold'):
-            player.gold = 100
+        player.refresh_combat_stats()
         player.gold = profile_data.get('gold', 100)
         
-        # Load achievements (handle potential nested structures)
-        achievements_data = profile_data.get('achievements', [])
-        if achievements_data:
-            try:
-                player.achievements = set(achievements_data)
-            except TypeError:
-                # Handle unhashable types in achievements
-                player.achievements = set()
-                for achievement in achievements_data:
-                    if isinstance(achievement, (str, int)):
-                        player.achievements.add(achievement)
-        else:
-            player.achievements = set()
+        # Load achievements: saved by name, looked up again in the achievements table
+        player.achievements = [achievements[name] for name in profile_data.get('achievements', [])
+                               if isinstance(name, str) and name in achievements]
         
         # Load completed quests
         player.completed_quests = set(profile_data.get('completed_quests', []))
@@ -1394,21 +1851,7 @@ def load_player_profile(player):
         # Load inventory
         player.inventory = []
         for item_data in profile_data.get('inventory', []):
-            # Create Object instance from saved data with required parameters
-            obj = Object(
-                vnum=item_data.get('vnum', 0),
-                keywords=item_data.get('keywords', []),
-                short_desc=item_data.get('short_desc', 'an item'),
-                long_desc=item_data.get('long_desc', 'Nothing special about it.'),
-                description=item_data.get('description', 'A generic item.'),
-                item_type=item_data.get('item_type', 'misc'),
-                effects=item_data.get('effects', {})
-            )
-            # Set any additional attributes
-            for key, value in item_data.items():
-                if hasattr(obj, key):
-                    setattr(obj, key, value)
-            player.inventory.append(obj)
+            player.inventory.append(Object.from_dict(item_data))
         
         # Load equipment
         player.equipment = {
@@ -1423,20 +1866,7 @@ def load_player_profile(player):
         }
         for slot, item_data in profile_data.get('equipment', {}).items():
             if item_data:
-                obj = Object(
-                    vnum=item_data.get('vnum', 0),
-                    keywords=item_data.get('keywords', []),
-                    short_desc=item_data.get('short_desc', 'an item'),
-                    long_desc=item_data.get('long_desc', 'Nothing special about it.'),
-                    description=item_data.get('description', 'A generic item.'),
-                    item_type=item_data.get('item_type', 'misc'),
-                    effects=item_data.get('effects', {})
-                )
-                # Set any additional attributes
-                for key, value in item_data.items():
-                    if hasattr(obj, key):
-                        setattr(obj, key, value)
-                player.equipment[slot] = obj
+                player.equipment[slot] = Object.from_dict(item_data)
         
         # Load spellbook
         player.spellbook = {}
@@ -1447,19 +1877,8 @@ def load_player_profile(player):
         # Load current room location
         saved_room_vnum = profile_data.get('current_room_vnum', 2201)
         if saved_room_vnum in rooms:
-            # Remove player from current room if they're in one
-            if player.current_room and hasattr(player.current_room, 'players'):
-                if player in player.current_room.players:
-                    player.current_room.players.remove(player)
-
             # Move player to saved room
-            player.current_room = rooms[saved_room_vnum]
-
-            # Add player to new room's player list
-            if not hasattr(player.current_room, 'players'):
-                player.current_room.players = []
-            if player not in player.current_room.players:
-                player.current_room.players.append(player)
+            player.move_to(rooms[saved_room_vnum])
 
             print(f"Player {player.name} restored to room {saved_room_vnum} ({player.current_room.name})")
         else:
@@ -1474,22 +1893,18 @@ def load_player_profile(player):
         print(f"Error loading player profile for {player.name}: {e}")
         traceback.print_exc()
 
-def npc_movement_loop():
-    while True:
-        current_time = time.localtime().tm_hour
-        for npc in all_npcs:
-            for schedule_entry in npc.schedule:
-                try:
-                    schedule_time, room_vnum = schedule_entry
-                    if schedule_time == current_time and npc.current_room and npc.current_room.vnum != room_vnum:
-                        if room_vnum in rooms:
-                            if npc.current_room and npc in npc.current_room.mobs:
-                                npc.current_room.mobs.remove(npc)
-                            npc.current_room = rooms[room_vnum]
-                            npc.current_room.mobs.append(npc)
-                except ValueError:
-                    pass
-        time.sleep(60)
+def move_scheduled_npcs(hour):
+    """Move NPCs to the rooms their schedules give for this hour"""
+    for npc, room_vnum in npc_schedule_by_hour.get(hour, ()):
+        room = rooms.get(room_vnum)
+        if room is not None and npc.current_room and npc.current_room is not room:
+            npc.current_room.remove_mob(npc)
+            room.add_mob(npc)
+
+def next_hour_start(now):
+    """Return the time just after the next local hour begins; NPC schedules change only then"""
+    local = time.localtime(now)
+    return now + 3600 - local.tm_min * 60 - local.tm_sec + 1
 
 def spawn_merchant_event(room_vnum):
     """Spawn a traveling merchant event in a specific room"""
@@ -1515,7 +1930,7 @@ def spawn_merchant_event(room_vnum):
     if room_vnum in rooms:
         room = rooms[room_vnum]
         # Find players currently in this room
-        players_in_room = [p for p in players.values() if p.current_room.vnum == room_vnum]
+        players_in_room = list(room.players)
         debug_print(f" Room has {len(players_in_room)} players")
         for player in players_in_room:
             send_to_player(player, f"🚚 {merchant_name} has set up shop here with exotic wares! 🚚\n")
@@ -1523,7 +1938,7 @@ def spawn_merchant_event(room_vnum):
 
 def create_portal_storm():
     """Create temporary portals linking distant rooms"""
-    room_vnums = list(rooms.keys())
+    room_vnums = all_room_vnums
     if len(room_vnums) < 2:
         return
     
@@ -1575,16 +1990,64 @@ def create_portal_storm():
         for room_vnum in [room1, room2]:
             if room_vnum in rooms:
                 room = rooms[room_vnum]
-                players_in_room = [p for p in players.values() if p.current_room.vnum == room_vnum]
+                players_in_room = list(room.players)
                 for player in players_in_room:
                     send_to_player(player, f"⚡ A {portal_data['color']} portal suddenly opens here! ⚡\n")
     
     if created_portals:
+        world_events_wakeup.set()
         print(f"Portal storm created {len(created_portals)} portal pairs: {created_portals}")
 
+@dataclass(slots=True, frozen=True)
+class InvasionSpec:
+    """Static stats for one kind of invading monster"""
+    keywords: tuple
+    short_desc: str
+    long_desc: str
+    description: str
+    level: int
+    hp: int
+    count_min: int
+    count_max: int
+    attack_power: int
+    defense: int
+
+def _invasion_spec(keywords, short_desc, long_desc, description, level, hp, count_min, count_max):
+    """Build an InvasionSpec, deriving combat stats from the level"""
+    return InvasionSpec(tuple(keywords), short_desc, long_desc, description, level, hp,
+                        count_min, count_max, attack_power=level * 3, defense=level * 2)
+
+INVASION_TYPES = {
+    "Shadow Wraiths": _invasion_spec(
+        ["shadow", "wraith", "wraiths"],
+        "a shadow wraith",
+        "A shadow wraith hovers here menacingly.",
+        "This ghostly figure seems to be made of pure darkness and malevolence.",
+        level=8, hp=60, count_min=2, count_max=4),
+    "Goblin Raiders": _invasion_spec(
+        ["goblin", "raider", "raiders"],
+        "a goblin raider",
+        "A fierce goblin raider stands here, weapons drawn.",
+        "This small but vicious creature carries crude but deadly weapons.",
+        level=5, hp=40, count_min=3, count_max=5),
+    "Orc Warband": _invasion_spec(
+        ["orc", "warrior", "warband"],
+        "an orc warrior",
+        "A brutal orc warrior stands ready for battle.",
+        "This massive green-skinned brute is covered in scars and armor.",
+        level=7, hp=80, count_min=2, count_max=3),
+    "Undead Horde": _invasion_spec(
+        ["undead", "zombie", "skeleton"],
+        "a shambling undead",
+        "A rotting undead creature stumbles about here.",
+        "This once-living being now serves as a mindless puppet of dark magic.",
+        level=6, hp=50, count_min=3, count_max=6),
+}
+INVASION_NAMES = tuple(INVASION_TYPES)
+
 def create_monster_invasion():
     """Create an invasion of monsters in a random room"""
-    room_vnums = list(rooms.keys())
+    room_vnums = all_room_vnums
     if not room_vnums:
         return
         
@@ -1594,47 +2057,8 @@ def create_monster_invasion():
     if target_room_vnum in active_events:
         return
     
-    invasion_types = {
-        "Shadow Wraiths": {
-            "keywords": ["shadow", "wraith", "wraiths"],
-            "short_desc": "a shadow wraith",
-            "long_desc": "A shadow wraith hovers here menacingly.",
-            "description": "This ghostly figure seems to be made of pure darkness and malevolence.",
-            "level": 8,
-            "hp": 60,
-            "count": random.randint(2, 4)
-        },
-        "Goblin Raiders": {
-            "keywords": ["goblin", "raider", "raiders"],
-            "short_desc": "a goblin raider",
-            "long_desc": "A fierce goblin raider stands here, weapons drawn.",
-            "description": "This small but vicious creature carries crude but deadly weapons.",
-            "level": 5,
-            "hp": 40,
-            "count": random.randint(3, 5)
-        },
-        "Orc Warband": {
-            "keywords": ["orc", "warrior", "warband"],
-            "short_desc": "an orc warrior",
-            "long_desc": "A brutal orc warrior stands ready for battle.",
-            "description": "This massive green-skinned brute is covered in scars and armor.",
-            "level": 7,
-            "hp": 80,
-            "count": random.randint(2, 3)
-        },
-        "Undead Horde": {
-            "keywords": ["undead", "zombie", "skeleton"],
-            "short_desc": "a shambling undead",
-            "long_desc": "A rotting undead creature stumbles about here.",
-            "description": "This once-living being now serves as a mindless puppet of dark magic.",
-            "level": 6,
-            "hp": 50,
-            "count": random.randint(3, 6)
-        }
-    }
-    
-    invasion_name = random.choice(list(invasion_types.keys()))
-    invasion_data = invasion_types[invasion_name]
+    invasion_name = random.choice(INVASION_NAMES)
+    invasion_data = INVASION_TYPES[invasion_name]
     intensity = random.randint(1, 3)
     
     # Create invasion event
@@ -1653,63 +2077,62 @@ def create_monster_invasion():
     if target_room_vnum in rooms:
         room = rooms[target_room_vnum]
         
+        # One prototype per invasion; the horde are clones sharing its keywords and text
+        prototype = Mobile(
+            vnum=0,
+            keywords=list(invasion_data.keywords),
+            short_desc=invasion_data.short_desc,
+            long_desc=invasion_data.long_desc,
+            description=invasion_data.description,
+            level=invasion_data.level,
+            is_npc=False  # Make them hostile/attackable
+        )
+        prototype.hp = invasion_data.hp
+        prototype.max_hp = invasion_data.hp
+        prototype.attack_power = invasion_data.attack_power
+        prototype.defense = invasion_data.defense
+
         # Spawn monsters based on intensity
-        monster_count = invasion_data['count'] * intensity
+        monster_count = random.randint(invasion_data.count_min, invasion_data.count_max) * intensity
         for i in range(monster_count):
+            monster = prototype.clone()
             # Create a unique vnum for each monster (using negative numbers to avoid conflicts)
-            monster_vnum = -(10000 + target_room_vnum * 100 + i)
-            
-            # Create the monster
-            monster = Mobile(
-                vnum=monster_vnum,
-                keywords=invasion_data['keywords'],
-                short_desc=invasion_data['short_desc'],
-                long_desc=invasion_data['long_desc'],
-                description=invasion_data['description'],
-                level=invasion_data['level'],
-                is_npc=False  # Make them hostile/attackable
-            )
-            
-            # Set monster stats
-            monster.hp = invasion_data['hp']
-            monster.max_hp = invasion_data['hp']
-            monster.current_hp = invasion_data['hp']
-            monster.attack_power = invasion_data['level'] * 3
-            monster.defense = invasion_data['level'] * 2
-            monster.current_room = room
+            monster.vnum = -(10000 + target_room_vnum * 100 + i)
             
             # Add monster to room
-            room.mobs.append(monster)
+            room.add_mob(monster)
+            index_mob(monster)
             
             # Track the monster in the invasion event
             active_events[target_room_vnum]['data']['monsters'].append(monster)
         
         # Notify players in the room
-        players_in_room = [p for p in players.values() if p.current_room.vnum == target_room_vnum]
+        players_in_room = list(room.players)
         for player in players_in_room:
             send_to_player(player, f"🗡️ This area is under attack by {invasion_name}! 🗡️\n")
             send_to_player(player, f"You see {monster_count} hostile creatures materializing!\n")
             # Update room description
             player.describe_current_room()
     
+    world_events_wakeup.set()
     print(f"Monster invasion created: {invasion_name} ({monster_count} monsters) in room {target_room_vnum}")
 
+def spawn_random_merchant():
+    """Spawn a traveling merchant in a random room"""
+    spawn_merchant_event(random.choice(all_room_vnums) if all_room_vnums else 2203)
+
+# World events with pre-cumulated selection thresholds (weights sum to 1.0)
+RANDOM_EVENTS = (
+    (0.3, create_portal_storm),      # 30% chance
+    (0.5, create_monster_invasion),  # 20% chance
+    (1.0, spawn_random_merchant),    # 50% chance
+)
+
 def trigger_random_event():
     """Randomly trigger one of the available world events"""
-    events = [
-        (0.3, create_portal_storm),    # 30% chance
-        (0.2, create_monster_invasion), # 20% chance
-        (0.5, lambda: spawn_merchant_event(random.choice(list(rooms.keys())) if rooms else 2203))  # 50% chance
-    ]
-    
-    # Weighted random selection
-    total_weight = sum(weight for weight, _ in events)
-    random_value = random.random() * total_weight
-    
-    current_weight = 0
-    for weight, event_func in events:
-        current_weight += weight
-        if random_value <= current_weight:
+    random_value = random.random()
+    for threshold, event_func in RANDOM_EVENTS:
+        if random_value <= threshold:
             try:
                 event_func()
             except Exception as e:
@@ -1722,20 +2145,17 @@ def cleanup_expired_events():
     expired_events = []
     
     for room_vnum, event_data in active_events.items():
-        if 'end_time' in event_data and current_time >= event_data['end_time']:
+        if current_time >= event_data.get('end_time', float('inf')):
             expired_events.append(room_vnum)
     
     for room_vnum in expired_events:
-        event = active_events[room_vnum]
-        del active_events[room_vnum]
+        event = active_events.pop(room_vnum)
         
         # Clean up portal connections
         if event['type'] == 'portal':
-            if room_vnum in portal_connections:
-                dest_room = portal_connections[room_vnum]
-                if dest_room in portal_connections:
-                    del portal_connections[dest_room]
-                del portal_connections[room_vnum]
+            dest_room = portal_connections.pop(room_vnum, None)
+            if dest_room is not None:
+                portal_connections.pop(dest_room, None)
         
         # Clean up invasion monsters
         elif event['type'] == 'invasion':
@@ -1745,15 +2165,15 @@ def cleanup_expired_events():
                 
                 # Remove all invasion monsters from the room
                 for monster in invasion_monsters:
-                    if monster in room.mobs:
-                        room.mobs.remove(monster)
-                        
+                    room.remove_mob(monster)
+                    unindex_mob(monster)
+
                 print(f"Cleaned up {len(invasion_monsters)} invasion monsters from room {room_vnum}")
         
         # Notify players in room that event ended
         if room_vnum in rooms:
             room = rooms[room_vnum]
-            players_in_room = [p for p in players.values() if p.current_room.vnum == room_vnum]
+            players_in_room = list(room.players)
             for player in players_in_room:
                 if event['type'] == 'portal':
                     send_to_player(player, "⚡ The portal shimmers and fades away. ⚡\n")
@@ -1765,24 +2185,60 @@ def cleanup_expired_events():
     if expired_events:
         print(f"Cleaned up {len(expired_events)} expired events: {expired_events}")
 
+WORLD_EVENT_INTERVAL = 30  # Seconds between random event rolls
+WORLD_EVENT_CHANCE = 0.1   # Chance per roll to trigger an event
+
+def next_world_event_time(start):
+    """Return when the next successful event roll happens, rolling every WORLD_EVENT_INTERVAL from start"""
+    # The number of failed rolls before a success is geometrically distributed,
+    # so draw it once instead of waking up for every roll
+    failed_rolls = math.floor(math.log(1.0 - random.random()) / math.log(1.0 - WORLD_EVENT_CHANCE))
+    return start + failed_rolls * WORLD_EVENT_INTERVAL
+
+def next_event_expiry():
+    """Return the earliest end_time of the active events, or None"""
+    return min((event['end_time'] for event in list(active_events.values()) if 'end_time' in event), default=None)
+
 def world_events_loop():
-    """Main loop for processing world events"""
-    while True:
+    """Main loop for processing world events and hourly NPC schedules"""
+    next_spawn = next_world_event_time(time.time())
+    next_npc_move = 0  # Due at once, so NPCs start out where this hour puts them
+    failures = 0
+    while not shutdown_event.is_set():
         try:
-            # Clean up expired events
-            cleanup_expired_events()
-            
-            # Randomly trigger new events
-            if random.random() < 0.1:  # 10% chance per cycle
-                trigger_random_event()
+            # One write per player for everything this tick announces
+            batched = begin_tick_output()
+            try:
+                # Clean up expired events
+                cleanup_expired_events()
+                
+                # Trigger a new event when its roll comes up
+                now = time.time()
+                if now >= next_spawn:
+                    trigger_random_event()
+                    next_spawn = next_world_event_time(now + WORLD_EVENT_INTERVAL)
+
+                if now >= next_npc_move:
+                    move_scheduled_npcs(time.localtime(now).tm_hour)
+                    next_npc_move = next_hour_start(now)
+            finally:
+                flush_player_buffers(batched)
             
-            time.sleep(30)  # Check every 30 seconds
+            # Sleep until whichever is due first: an event expiry, the next spawn or the next NPC move
+            next_wake = min(next_spawn, next_npc_move)
+            expiry = next_event_expiry()
+            if expiry is not None:
+                next_wake = min(next_wake, expiry)
+            failures = 0
+            # New events (e.g. the invasion command) wake us early to reschedule
+            world_events_wakeup.wait(max(0, next_wake - time.time()))
+            world_events_wakeup.clear()
             
         except Exception as e:
             print(f"World events loop error: {e}")
-            import traceback
             traceback.print_exc()
-            time.sleep(60)
+            failures += 1
+            shutdown_event.wait(min(60 * failures, 300))
 
 def random_events():
     global current_weather, current_time_of_day
@@ -1793,9 +2249,8 @@ def random_events():
     
     # Legacy merchant spawning (now handled by world_events_loop)
     if random.random() < 0.02:  # 2% chance
-        room_vnums = list(rooms.keys())
-        if room_vnums:
-            random_room = random.choice(room_vnums)
+        if all_room_vnums:
+            random_room = random.choice(all_room_vnums)
             if random_room not in active_events:  # Don't overlap events
                 spawn_merchant_event(random_room)
 
@@ -1811,7 +2266,8 @@ def spawn_wandering_trader(room):
         inventory=[],
         room_vnum=room.vnum
     )
-    room.mobs.append(trader)
+    room.add_mob(trader)
+    index_mob(trader)
 
 def spawn_ambush_mobs(room):
     mob = Mobile(
@@ -1825,7 +2281,8 @@ def spawn_ambush_mobs(room):
         inventory=[],
         room_vnum=room.vnum
     )
-    room.mobs.append(mob)
+    room.add_mob(mob)
+    index_mob(mob)
 
 def unlock_achievement(name, player):
     achievement = achievements.get(name)
@@ -1868,11 +2325,11 @@ lucky_find_treasures = [
 
 def trigger_lucky_find(player):
     """Handle lucky find events with configurable chance"""
-    config = load_config()
-    if not config.get('game', {}).get('surprise_events_enabled', True):
+    game_config = config.get('game', {})
+    if not game_config.get('surprise_events_enabled', True):
         return False
 
-    lucky_chance = config.get('game', {}).get('lucky_find_chance', 0.05)
+    lucky_chance = game_config.get('lucky_find_chance', 0.05)
 
     if random.random() < lucky_chance:
         treasure = random.choice(lucky_find_treasures)
@@ -1886,10 +2343,6 @@ def trigger_lucky_find(player):
             effects=treasure.effects
         )
 
-        # Ensure inventory is a list (safety check)
-        if not isinstance(player.inventory, list):
-            player.inventory = list(player.inventory) if hasattr(player.inventory, '__iter__') else []
-
         player.inventory.append(treasure_copy)
 
         # Exciting messages for different treasures
@@ -1903,7 +2356,7 @@ def trigger_lucky_find(player):
         }
 
         message = messages.get(treasure.short_desc, f"🎉 Lucky you! You found a {treasure.short_desc}!")
-        send_to_player(player, f"\n{Colors.YELLOW}{message}{Colors.RESET}\n")
+        send_to_player(player, REWARD_FORMAT.format(message))
 
         unlock_achievement('Lucky Find', player)
         unlock_achievement('Treasure Hunter', player)
@@ -1918,7 +2371,6 @@ def give_daily_bonus(player):
     """Give player daily login bonus - surprise feature"""
     import datetime
 
-    config = load_config()
     if not config.get('game', {}).get('daily_bonus_enabled', True):
         return
 
@@ -1963,8 +2415,8 @@ def give_daily_bonus(player):
         ]
 
         message = random.choice(day_messages)
-        send_to_player(player, f"\n{Colors.YELLOW}{message}{Colors.RESET}\n")
-        send_to_player(player, f"{Colors.GREEN}Daily Bonus: +{bonus_exp} XP and {bonus_gold} gold!{Colors.RESET}\n")
+        send_to_player(player, REWARD_FORMAT.format(message))
+        send_to_player(player, DAILY_BONUS_FORMAT.format(bonus_exp, bonus_gold))
 
         # Check for level up
         check_level_up(player)
@@ -1982,10 +2434,14 @@ def give_daily_bonus(player):
                 effects=extra_item.effects
             )
             player.inventory.append(extra_copy)
-            send_to_player(player, f"{Colors.YELLOW}✨ BONUS SURPRISE: You also found a {extra_item.short_desc}!{Colors.RESET}\n")
+            send_to_player(player, BONUS_FIND_FORMAT.format(extra_item.short_desc))
+
+def recipe_key(item1_name, item2_name):
+    """Order-independent key for a two-ingredient recipe; a sorted pair, so two of the same ingredient still works"""
+    return (item1_name, item2_name) if item1_name <= item2_name else (item2_name, item1_name)
 
 crafting_recipes = {
-    ('healing', 'herb'): {
+    recipe_key('healing', 'herb'): {
         'result': 'potion of healing',
         'vnum': 6001
     }
@@ -1993,64 +2449,70 @@ crafting_recipes = {
 
 def send_to_player(player, message):
     """Send a message to a player using their connection handler"""
-    # Only send messages to actual Player objects, not Mobile objects
-    if not isinstance(player, Player):
-        return
-
-    # Debug output for web players
-    if hasattr(player, 'connection_handler') and isinstance(player.connection_handler, WebConnectionHandler):
-        print(f"DEBUG SEND: Routing message to web player {player.name}: {message.strip()}")
-
-    if hasattr(player, 'connection_handler') and player.connection_handler:
-        player.connection_handler.send_message(message)
-    elif hasattr(player, 'client_socket') and player.client_socket:
-        # Fallback for backward compatibility
+    # Only Player objects get a bound _send (see Player.attach_connection);
+    # Mobiles, pets and companions simply have nothing to send to.
+    send = getattr(player, '_send', None)
+    if send is not None:
+        if DEBUG:
+            debug_print(f"SEND: Routing message to {player.name}: {message.strip()}")
+        # Queued under the lock, so a direct send can't overtake a batch being flushed
+        with player._batch_lock:
+            buffer = player._send_buffer
+            if buffer is not None:
+                buffer.append(message)
+                return
+            write = player._queue_output(message)
+        if write:
+            player._write_output()
+
+def batched_output(func):
+    """Decorator for multi-line displays: collect the player's output and send it in one write"""
+    @functools.wraps(func)
+    def wrapper(player, *args, **kwargs):
+        if not player.begin_batch():
+            return func(player, *args, **kwargs)
         try:
-            player.client_socket.sendall(message.encode('utf-8'))
-        except (ConnectionResetError, BrokenPipeError, OSError):
-            print(f"Connection lost for player {player.name}")
-
-def broadcast_room(room, message, exclude=None):
-    for p_name, p in players.items():
-        if p.current_room == room and p is not exclude:
-            send_to_player(p, message)
+            return func(player, *args, **kwargs)
+        finally:
+            player.end_batch()
+    return wrapper
 
 def find_mob_in_room(room, mob_name):
     mob_name = mob_name.lower()
-    for mob in room.mobs:
-        if mob_name in [kw.lower() for kw in mob.keywords]:
+    for mob in tuple(room.mobs):
+        if mob_name in mob.keywords_lower:
             return mob
     return None
 
 def find_target_in_room(room, target_name):
     target_name = target_name.lower()
     
-    # Check other players first
-    for p_name, pl in players.items():
-        if pl.current_room == room and pl.name.lower() == target_name:
-            return pl
+    # Check other players first: one lookup by name instead of walking the room's players
+    pl = players_by_name_lower.get(target_name)
+    if pl is not None and pl.current_room is room:
+        return pl
     
+    # One snapshot for all three passes
+    mobs = tuple(room.mobs)
+
     # Check mobs by keywords (exact match)
-    for mob in room.mobs:
-        if hasattr(mob, 'keywords') and mob.keywords:
-            if target_name in [kw.lower() for kw in mob.keywords]:
-                return mob
+    for mob in mobs:
+        if target_name in mob.keywords_lower:
+            return mob
     
     # Check mobs by keywords (partial match)
-    for mob in room.mobs:
-        if hasattr(mob, 'keywords') and mob.keywords:
-            for keyword in mob.keywords:
-                if target_name in keyword.lower() or keyword.lower() in target_name:
-                    return mob
-    
-    # Check mobs by short description (partial match)
-    for mob in room.mobs:
-        if hasattr(mob, 'short_desc') and mob.short_desc:
-            # Remove the ~ character and check
-            short_desc_clean = mob.short_desc.replace('~', '').lower()
-            if target_name in short_desc_clean or any(word in short_desc_clean for word in target_name.split()):
+    for mob in mobs:
+        for keyword in mob.keywords_lower:
+            if target_name in keyword or keyword in target_name:
                 return mob
     
+    # Check mobs by short description (partial match); short_desc_lower is lowercased at load
+    words = target_name.split()
+    for mob in mobs:
+        short_desc = mob.short_desc_lower
+        if short_desc and (target_name in short_desc or any(word in short_desc for word in words)):
+            return mob
+    
     return None
 
 
@@ -2061,550 +2523,650 @@ def check_level_up(player):
         player.skill_points += 5
         send_to_player(player, f"You have leveled up to level {player.level}!\n")
         send_to_player(player, "You have gained 5 skill points to allocate.\n")
-        player.max_hp = player.calculate_max_hp()
-        player.hp = player.max_hp
-        player.max_mana = player.calculate_max_mana()
-        player.mana = player.max_mana
-        player.attack_power = player.calculate_attack_power()
-        player.defense = player.calculate_defense()
+        player.refresh_stats()
         if player.level == 10:
             unlock_achievement('Level 10', player)
 
-def process_player_command(player, command):
-    parts = command.split()  # Always define parts first
-
-    # Safety check: ensure inventory is always a list
-    if not isinstance(player.inventory, list):
-        player.inventory = list(player.inventory) if hasattr(player.inventory, '__iter__') else []
-
-    if command in command_abbreviations:
-        command = command_abbreviations[command]
-    else:
-        if parts and parts[0] in command_abbreviations:
-            parts[0] = command_abbreviations[parts[0]]
-            command = ' '.join(parts)
-
-    if command in ['north', 'south', 'east', 'west', 'up', 'down']:
-        player.move(command)
-    elif command.startswith('attack'):
-        parts = command.split()
-        if len(parts) == 2:
-            target_name = parts[1]
-            target = find_target_in_room(player.current_room, target_name)
-            if target is None:
-                send_to_player(player, "No such target.\n")
-            else:
-                # Check if already in combat with this target
-                if in_combat(player):
-                    send_to_player(player, "You are already in combat!\n")
-                else:
-                    # Start combat - the combat loop will handle the attacks
-                    start_combat(player, target)
-                    send_to_player(player, f"You engage {get_target_name(target)} in combat!\n")
-                    broadcast_room(player.current_room, f"{player.name} attacks {get_target_name(target)}!\n", exclude=[player])
+def _cmd_attack(player, verb, rest):
+    """Start combat with a named target or the first hostile mob"""
+    args = rest.split()
+    if len(args) == 1:
+        target_name = args[0]
+        target = find_target_in_room(player.current_room, target_name)
+        if target is None:
+            send_to_player(player, "No such target.\n")
         else:
-            # Attack first hostile mob?
-            mobs = [m for m in player.current_room.mobs if not m.is_npc]
-            if mobs:
-                mob = mobs[0]
-                if in_combat(player):
-                    send_to_player(player, "You are already in combat!\n")
-                else:
-                    # Start combat - the combat loop will handle the attacks
-                    start_combat(player, mob)
-                    send_to_player(player, f"You engage {get_target_name(mob)} in combat!\n")
-                    broadcast_room(player.current_room, f"{player.name} attacks {get_target_name(mob)}!\n", exclude=[player])
+            # Check if already in combat with this target
+            if in_combat(player):
+                send_to_player(player, "You are already in combat!\n")
             else:
-                # Attack a player if present?
-                # There's no specified 'hostile' player by default.
-                send_to_player(player, "Attack who?\n")
-    elif command == 'special':
-        # simplified: use special as a stronger attack
-        mobs = [m for m in player.current_room.mobs if not m.is_npc]
-        other_players = [p for p_name,p in players.items() if p != player and p.current_room == player.current_room]
+                # Start combat - the combat loop will handle the attacks
+                start_combat(player, target)
+                send_to_player(player, f"You engage {get_target_name(target)} in combat!\n")
+                broadcast_room(player.current_room, f"{player.name} attacks {get_target_name(target)}!\n", exclude=[player])
+    else:
+        # Attack first hostile mob?
+        mobs = [m for m in tuple(player.current_room.mobs) if not m.is_npc]
         if mobs:
             mob = mobs[0]
-            damage = max(1, (player.attack_power + player.level * 2) - mob.defense)
-            mob.hp -= damage
-            send_to_player(player, f"You unleash a powerful strike dealing {damage} damage to {mob.short_desc}!\n")
-            if mob.hp <= 0:
-                handle_defeat(player, mob)
+            if in_combat(player):
+                send_to_player(player, "You are already in combat!\n")
             else:
-                player_attack(mob, player)
-        elif other_players:
-            target = other_players[0]
-            damage = max(1, (player.attack_power + player.level * 2) - target.defense)
-            target.hp -= damage
-            send_to_player(player, f"You unleash a powerful strike dealing {damage} damage to {target.name}!\n")
-            send_to_player(target, f"{player.name} strikes you with a special attack for {damage} damage!\n")
-            if target.hp <= 0:
-                handle_defeat(player, target)
+                # Start combat - the combat loop will handle the attacks
+                start_combat(player, mob)
+                send_to_player(player, f"You engage {get_target_name(mob)} in combat!\n")
+                broadcast_room(player.current_room, f"{player.name} attacks {get_target_name(mob)}!\n", exclude=[player])
+        else:
+            # Attack a player if present?
+            # There's no specified 'hostile' player by default.
+            send_to_player(player, "Attack who?\n")
+
+def _cmd_special(player, verb, rest):
+    """Use a stronger attack on the first enemy in the room"""
+    # simplified: use special as a stronger attack
+    mobs = [m for m in tuple(player.current_room.mobs) if not m.is_npc]
+    other_players = [p for p in tuple(player.current_room.players) if p is not player]
+    if mobs:
+        mob = mobs[0]
+        damage = max(1, (player.attack_power + player.level * 2) - mob.defense)
+        mob.hp -= damage
+        send_to_player(player, f"You unleash a powerful strike dealing {damage} damage to {mob.short_desc}!\n")
+        if mob.hp <= 0:
+            handle_defeat(player, mob)
         else:
-            send_to_player(player, "There is no enemy to use 'special' on.\n")
+            player_attack(mob, player)
+    elif other_players:
+        target = other_players[0]
+        damage = max(1, (player.attack_power + player.level * 2) - target.defense)
+        target.hp -= damage
+        send_to_player(player, f"You unleash a powerful strike dealing {damage} damage to {target.name}!\n")
+        send_to_player(target, f"{player.name} strikes you with a special attack for {damage} damage!\n")
+        if target.hp <= 0:
+            handle_defeat(player, target)
+    else:
+        send_to_player(player, "There is no enemy to use 'special' on.\n")
 
-    elif command == 'look':
-        player.describe_current_room()
-        # Chance for lucky find when exploring
-        trigger_lucky_find(player)
-    elif command.startswith('cast '):
-        parts = command.split()
-        if len(parts) < 2:
-            send_to_player(player, "Cast what spell?\n")
+def _cmd_look(player, verb, rest):
+    player.describe_current_room()
+    # Chance for lucky find when exploring
+    trigger_lucky_find(player)
+
+def _cmd_cast(player, verb, rest):
+    """Cast a known spell, optionally at a target"""
+    spell_name, _, target_name = rest.strip().partition(' ')
+    if not spell_name:
+        send_to_player(player, "Cast what spell?\n")
+        return
+
+    target = None
+
+    # Check if a target was specified
+    target_name = target_name.strip()
+    if target_name:
+        target = find_target_in_room(player.current_room, target_name)
+        if not target:
+            send_to_player(player, f"You don't see '{target_name}' here.\n")
             return
-        
-        spell_name = parts[1]
-        target = None
-        
-        # Check if a target was specified
-        if len(parts) >= 3:
-            target_name = ' '.join(parts[2:])
-            target = find_target_in_room(player.current_room, target_name)
-            if not target:
-                send_to_player(player, f"You don't see '{target_name}' here.\n")
-                return
-        
-        # Check if player knows the spell (allow partial matching)
-        spell = None
-        spell_key = None
-        spell_name_lower = spell_name.lower()
-        
-        # First try exact match
-        if spell_name_lower in player.spellbook:
-            spell = player.spellbook[spell_name_lower]
-            spell_key = spell_name_lower
-        else:
-            # Try partial matching
-            for known_spell_key in player.spellbook:
-                if spell_name_lower in known_spell_key or any(word.startswith(spell_name_lower) for word in known_spell_key.split()):
-                    spell = player.spellbook[known_spell_key]
-                    spell_key = known_spell_key
-                    break
-        
-        if not spell:
-            send_to_player(player, f"You don't know the spell '{spell_name}'.\n")
-            return
-        
-        # Check if player has enough mana
-        if player.mana < spell.mana_cost:
-            send_to_player(player, f"You don't have enough mana to cast {spell.name}. (Need {spell.mana_cost}, have {player.mana})\n")
-            return
-        
-        # Check if spell requires target and none was provided
-        if spell.requires_target and not target:
-            # Auto-target combat opponent if player is in combat
-            if in_combat(player):
-                combat_opponent = find_combat_opponent(player)
-                if combat_opponent:
-                    target = combat_opponent
-                    send_to_player(player, f"Auto-targeting {target.short_desc}.\n")
-                else:
-                    send_to_player(player, f"The spell '{spell.name}' requires a target, but no combat opponent found.\n")
-                    return
+
+    # Check if player knows the spell (allow partial matching)
+    spell = None
+    spell_key = None
+    spell_name_lower = spell_name.lower()
+
+    # First try exact match
+    if spell_name_lower in player.spellbook:
+        spell = player.spellbook[spell_name_lower]
+        spell_key = spell_name_lower
+    else:
+        # Try partial matching
+        for known_spell_key in player.spellbook:
+            if spell_name_lower in known_spell_key or any(word.startswith(spell_name_lower) for word in known_spell_key.split()):
+                spell = player.spellbook[known_spell_key]
+                spell_key = known_spell_key
+                break
+
+    if not spell:
+        send_to_player(player, f"You don't know the spell '{spell_name}'.\n")
+        return
+
+    # Check if player has enough mana
+    if player.mana < spell.mana_cost:
+        send_to_player(player, f"You don't have enough mana to cast {spell.name}. (Need {spell.mana_cost}, have {player.mana})\n")
+        return
+
+    # Check if spell requires target and none was provided
+    if spell.requires_target and not target:
+        # Auto-target combat opponent if player is in combat
+        if in_combat(player):
+            combat_opponent = find_combat_opponent(player)
+            if combat_opponent:
+                target = combat_opponent
+                send_to_player(player, f"Auto-targeting {target.short_desc}.\n")
             else:
-                send_to_player(player, f"The spell '{spell.name}' requires a target.\n")
+                send_to_player(player, f"The spell '{spell.name}' requires a target, but no combat opponent found.\n")
                 return
-        
-        # Check if spell doesn't require target but one was provided
-        if not spell.requires_target and target:
-            send_to_player(player, f"The spell '{spell.name}' doesn't require a target.\n")
-            return
-        
-        # Cast the spell
-        player.mana -= spell.mana_cost
-        send_to_player(player, f"You cast {spell.name}!\n")
-        
-        # Apply spell effects based on spell type
-        if spell.spell_type == 'offensive':
-            if target:
-                damage = random.randint(spell.base_damage[0], spell.base_damage[1])
-                damage = int(damage * spell.damage_multiplier)
-                
-                if hasattr(target, 'hp'):
-                    target.hp -= damage
-                elif hasattr(target, 'current_hp'):
-                    target.current_hp -= damage
-                
-                send_to_player(player, f"Your {spell.name} hits {get_target_name(target)} for {damage} damage!\n")
-                
-                # Notify target if it's a player
-                if isinstance(target, Player):
-                    send_to_player(target, f"{player.name}'s {spell.name} hits you for {damage} damage!\n")
-                
-                # Start combat if target is still alive
-                target_hp = getattr(target, 'hp', getattr(target, 'current_hp', 0))
-                if target_hp > 0:
-                    # Start combat between player and target
-                    start_combat(player, target)
-                    
-                    # If target is a mob and still alive, it should retaliate
-                    if isinstance(target, Mobile) and not target.is_npc:
-                        player_attack(target, player)
-                else:
-                    # Target died from the spell
-                    send_to_player(player, f"Your spell defeats {get_target_name(target)}!\n")
-                    
-                    # Give experience and handle death
-                    if hasattr(player, 'experience') and hasattr(target, 'level'):
-                        base_xp = target.level * 20
-                        player.experience += base_xp
-                        send_to_player(player, f"You gain {base_xp} experience points.\n")
-                        check_level_up(player)
-                    
-                    # Remove dead mob from room
-                    if hasattr(target, 'is_npc') or not hasattr(target, 'name'):
-                        if hasattr(player, 'current_room') and player.current_room and hasattr(player.current_room, 'mobs'):
-                            if target in player.current_room.mobs:
-                                player.current_room.mobs.remove(target)
-        
-        elif spell.spell_type == 'area_offensive':
-            # Area of effect spell like Chain Lightning
-            targets = []
-            for mob in player.current_room.mobs:
-                if not getattr(mob, 'is_npc', False):  # Only target combat mobs, not NPCs
-                    targets.append(mob)
-            
-            if not targets:
-                send_to_player(player, f"Your {spell.name} crackles through the air but finds no targets!\n")
-            else:
-                damage = random.randint(spell.base_damage[0], spell.base_damage[1])
-                damage = int(damage * spell.damage_multiplier)
-                
-                send_to_player(player, f"Your {spell.name} arcs through the room!\n")
-                
-                surviving_targets = []
-                for target in targets:
-                    if hasattr(target, 'hp'):
-                        target.hp -= damage
-                    elif hasattr(target, 'current_hp'):
-                        target.current_hp -= damage
-                    
-                    send_to_player(player, f"Lightning strikes {get_target_name(target)} for {damage} damage!\n")
-                    
-                    # Check if target died
-                    target_hp = getattr(target, 'hp', getattr(target, 'current_hp', 0))
-                    if target_hp <= 0:
-                        send_to_player(player, f"Your spell defeats {get_target_name(target)}!\n")
-                        
-                        # Give experience and handle death
-                        if hasattr(player, 'experience') and hasattr(target, 'level'):
-                            base_xp = target.level * 20
-                            player.experience += base_xp
-                        
-                        # Remove dead mob from room
-                        if hasattr(target, 'is_npc') or not hasattr(target, 'name'):
-                            if hasattr(player, 'current_room') and player.current_room and hasattr(player.current_room, 'mobs'):
-                                if target in player.current_room.mobs:
-                                    player.current_room.mobs.remove(target)
-                    else:
-                        # Target survived, add to combat
-                        surviving_targets.append(target)
-                
-                # Start combat with all surviving targets
-                for target in surviving_targets:
-                    start_combat(player, target)
-                
-                # Have surviving mobs retaliate
-                if surviving_targets:
-                    # Pick one random surviving target to attack back immediately
-                    retaliating_target = random.choice(surviving_targets)
-                    if isinstance(retaliating_target, Mobile) and not retaliating_target.is_npc:
-                        player_attack(retaliating_target, player)
-        
-        elif spell.spell_type == 'healing':
-            # Use base_heal if available, otherwise fall back to base_damage
-            heal_range = getattr(spell, 'base_heal', spell.base_damage)
-            heal_multiplier = getattr(spell, 'heal_multiplier', spell.damage_multiplier)
-            
-            heal_amount = random.randint(heal_range[0], heal_range[1])
-            heal_amount = int(heal_amount * heal_multiplier)
-            
-            old_hp = player.hp
-            player.hp = min(player.max_hp, player.hp + heal_amount)
-            actual_heal = player.hp - old_hp
-            
-            send_to_player(player, f"Your {spell.name} restores {actual_heal} hit points!\n")
-            send_to_player(player, f"You now have {player.hp}/{player.max_hp} hit points.\n")
-    
-    elif command == 'spells':
-        send_to_player(player, "Your Spellbook:\n")
-        if player.spellbook:
-            for spell_name, spell in player.spellbook.items():
-                mana_cost = spell.mana_cost
-                description = spell.description
-                send_to_player(player, f"  {spell.name} (Cost: {mana_cost} mana) - {description}\n")
         else:
-            send_to_player(player, "You don't know any spells yet.\n")
-    
-    elif command.startswith('learn '):
-        parts = command.split()
-        if len(parts) < 2:
-            send_to_player(player, "Learn what spell?\n")
+            send_to_player(player, f"The spell '{spell.name}' requires a target.\n")
             return
-        
-        spell_name = parts[1].lower()
-        if spell_name in spells:
-            if spell_name in player.spellbook:
-                send_to_player(player, f"You already know {spells[spell_name].name}.\n")
-            else:
-                player.spellbook[spell_name] = spells[spell_name]
-                send_to_player(player, f"You learn {spells[spell_name].name}!\n")
+
+    # Check if spell doesn't require target but one was provided
+    if not spell.requires_target and target:
+        send_to_player(player, f"The spell '{spell.name}' doesn't require a target.\n")
+        return
+
+    # Cast the spell
+    player.mana -= spell.mana_cost
+    send_to_player(player, f"You cast {spell.name}!\n")
+
+    handler = spell_type_handlers.get(spell.spell_type)
+    if handler is not None:
+        handler(player, spell, target)
+
+def _cast_offensive(player, spell, target):
+    """Single-target damage spell"""
+    if target:
+        damage = _randint(spell.damage_lo, spell.damage_hi)
+        damage = int(damage * spell.damage_multiplier)
+
+        target.hp -= damage
+
+        send_to_player(player, f"Your {spell.name} hits {get_target_name(target)} for {damage} damage!\n")
+
+        # Notify target if it's a player
+        if target._kind == 'player':
+            send_to_player(target, f"{player.name}'s {spell.name} hits you for {damage} damage!\n")
+
+        # Start combat if target is still alive
+        if target.hp > 0:
+            # Start combat between player and target
+            start_combat(player, target)
+
+            # If target is a mob and still alive, it should retaliate
+            if target._kind == 'mob' and not target.is_npc:
+                player_attack(target, player)
         else:
-            send_to_player(player, f"There is no spell called '{spell_name}'.\n")
-    
-    elif command.startswith('get '):
-        item_name = command[4:]
-        found = False
-        for obj in player.current_room.objects:
-            if any(item_name in kw for kw in obj.keywords):
-                player.pick_up(obj)
-                player.current_room.objects.remove(obj)
-                found = True
-                break
-        if not found:
-            send_to_player(player, "There is no such item here.\n")
-    elif command == 'inventory':
-        player.show_inventory()
-    elif command == 'stats':
-        player.show_stats()
-    elif command == 'skills':
-        player.show_skills()
-    elif command.startswith('allocate '):
-        parts = command.split()
-        if len(parts) == 3 and parts[1] in ['strength', 'agility', 'intelligence', 'vitality']:
-            try:
-                points = int(parts[2])
-                player.allocate_skill_points(parts[1], points)
-            except ValueError:
-                send_to_player(player, "Please specify a valid number of points.\n")
+            # Target died from the spell
+            send_to_player(player, f"Your spell defeats {get_target_name(target)}!\n")
+
+            # Give experience and handle death
+            level = getattr(target, 'level', None)
+            if level is not None:
+                base_xp = level * 20
+                player.experience += base_xp
+                send_to_player(player, f"You gain {base_xp} experience points.\n")
+                check_level_up(player)
+
+            # Remove dead mob from room
+            if target._kind == 'mob':
+                room = player.current_room
+                if room and room.remove_mob(target):
+                    unindex_mob(target)
+
+def _cast_area_offensive(player, spell, target):
+    """Damage every combat mob in the room, like Chain Lightning"""
+    room = player.current_room
+    targets = [mob for mob in tuple(room.mobs) if not mob.is_npc]  # Only target combat mobs, not NPCs
+
+    if not targets:
+        send_to_player(player, f"Your {spell.name} crackles through the air but finds no targets!\n")
+    else:
+        damage = _randint(spell.damage_lo, spell.damage_hi)
+        damage = int(damage * spell.damage_multiplier)
+
+        send_to_player(player, f"Your {spell.name} arcs through the room!\n")
+
+        # Bind the per-target helper once for the loop below
+        send = send_to_player
+        # Every target takes the same damage, so the per-target work is one subtraction and a check
+        surviving_targets = []
+        defeated_targets = []
+        # One write for all the per-target hit lines
+        batching = player.begin_batch()
+        try:
+            for target in targets:
+                target.hp -= damage
+
+                name = target.display_name
+                send(player, f"Lightning strikes {name} for {damage} damage!\n")
+
+                # Check if target died
+                if target.hp <= 0:
+                    send(player, f"Your spell defeats {name}!\n")
+
+                    # Give experience and handle death
+                    player.experience += target.level * 20
+
+                    defeated_targets.append(target)
+                else:
+                    # Target survived, add to combat
+                    surviving_targets.append(target)
+        finally:
+            if batching:
+                player.end_batch()
+
+        # Remove dead mobs from the room
+        for target in defeated_targets:
+            if room.remove_mob(target):
+                unindex_mob(target)
+
+        # Start combat with all surviving targets
+        for target in surviving_targets:
+            start_combat(player, target)
+
+        # Have surviving mobs retaliate
+        if surviving_targets:
+            # Pick one random surviving target to attack back immediately
+            retaliating_target = _choice(surviving_targets)
+            if retaliating_target._kind == 'mob' and not retaliating_target.is_npc:
+                player_attack(retaliating_target, player)
+
+def _cast_healing(player, spell, target):
+    """Heal the caster"""
+    # Heal range comes from base_heal, unpacked when the spell was loaded
+    heal_amount = _randint(spell.heal_lo, spell.heal_hi)
+    heal_amount = int(heal_amount * spell.heal_multiplier)
+
+    old_hp = player.hp
+    player.hp = min(player.max_hp, player.hp + heal_amount)
+    actual_heal = player.hp - old_hp
+
+    send_to_player(player, f"Your {spell.name} restores {actual_heal} hit points!\n")
+    send_to_player(player, f"You now have {player.hp}/{player.max_hp} hit points.\n")
+
+# Effects by the spell_type field in spells.json; a new spell only needs a new
+# entry there unless it introduces a new type
+spell_type_handlers = {
+    'offensive': _cast_offensive,
+    'area_offensive': _cast_area_offensive,
+    'healing': _cast_healing,
+}
+
+def _cmd_spells(player, verb, rest):
+    send_to_player(player, "Your Spellbook:\n")
+    if player.spellbook:
+        for spell_name, spell in player.spellbook.items():
+            mana_cost = spell.mana_cost
+            description = spell.description
+            send_to_player(player, f"  {spell.name} (Cost: {mana_cost} mana) - {description}\n")
+    else:
+        send_to_player(player, "You don't know any spells yet.\n")
+
+def _cmd_learn(player, verb, rest):
+    args = rest.split()
+    if not args:
+        send_to_player(player, "Learn what spell?\n")
+        return
+
+    spell_name = args[0].lower()
+    if spell_name in spells:
+        if spell_name in player.spellbook:
+            send_to_player(player, f"You already know {spells[spell_name].name}.\n")
         else:
-            send_to_player(player, "Usage: allocate <skill> <points>\n")
-    elif command == 'rest':
-        player.rest()
-    elif command == 'stand':
-        player.stand()
-    elif command.startswith('teleport '):
-        room_identifier = command[9:]
-        player.teleport(room_identifier)
-    elif command == 'map':
-        player.show_map()
-    elif command == 'save':
-        save_game()
+            player.spellbook[spell_name] = spells[spell_name]
+            send_to_player(player, f"You learn {spells[spell_name].name}!\n")
+    else:
+        send_to_player(player, f"There is no spell called '{spell_name}'.\n")
+
+def _cmd_get(player, verb, rest):
+    item_name = rest
+    room = player.current_room
+    # Whole keywords hit the index; partial names fall back to the substring scan
+    needle = item_name.lower()
+    obj = room.object_index().get(needle)
+    if obj is None:
+        obj = next((o for o in room.objects if contains_any(needle, o.keywords_lower)), None)
+    if obj is None:
+        send_to_player(player, "There is no such item here.\n")
+        return
+    player.pick_up(obj)
+    room.objects.remove(obj)
+    room.keyword_index = None
+
+ALLOCATABLE_SKILLS = frozenset({'strength', 'agility', 'intelligence', 'vitality'})
+
+def _cmd_allocate(player, verb, rest):
+    args = rest.split()
+    skill = args[0].lower() if args else None
+    if len(args) == 2 and skill in ALLOCATABLE_SKILLS:
+        try:
+            points = int(args[1])
+            player.allocate_skill_points(skill, points)
+        except ValueError:
+            send_to_player(player, "Please specify a valid number of points.\n")
+    else:
+        send_to_player(player, "Usage: allocate <skill> <points>\n")
+
+def _cmd_teleport(player, verb, rest):
+    player.teleport(rest)
+
+def _cmd_save(player, verb, rest):
+    save_game()
+    if save_player_profile(player):
         send_to_player(player, "Game saved successfully.\n")
-    elif command == 'load':
-        load_game(player)
-    elif command == 'help':
-        show_help(player)
-    elif command.startswith('craft '):
-        parts = command.split()
-        if len(parts) == 3:
-            player.craft_item(parts[1], parts[2])
-        else:
-            send_to_player(player, "Usage: craft <item1> <item2>\n")
-    elif command == 'quests':
-        show_quests(player)
-    elif command == 'achievements':
-        player.view_achievements()
-    elif command.startswith('talk '):
-        if len(parts) >= 2:
-            npc_name = ' '.join(parts[1:])
-            talk_to_npc(player, npc_name)
-        else:
-            send_to_player(player, "Talk to whom?\n")
-    elif command == 'stop':
-        # End chat session in current room
-        room_vnum = player.current_room.vnum
-        if room_vnum in chat_sessions:
-            del chat_sessions[room_vnum]
-            send_to_player(player, f"{Colors.YELLOW}You end the conversation. NPCs return to their normal activities.{Colors.RESET}\n")
-            broadcast_room(player.current_room, f"{Colors.YELLOW}{player.name} ends the conversation.{Colors.RESET}\n", exclude=player)
-        else:
-            send_to_player(player, "There is no active conversation to stop.\n")
-    elif command.startswith('chat '):
-        message = ' '.join(parts[1:]) if len(parts) > 1 else ''
-        if message:
-            chat_message = f"[CHAT] {player.name}: {message}"
-            with players_lock:
-                for other_player in players.values():
-                    send_to_player(other_player, chat_message)
-        else:
-            send_to_player(player, "Usage: chat <message>\n")
-    
-    elif command.startswith('say '):
-        message = command[4:].strip()
-        if not message:
-            send_to_player(player, "What do you want to say?\n")
-            return False
-        
-        room_vnum = player.current_room.vnum
-        
-        # Check if there's an ongoing chat session in this room
-        if room_vnum not in chat_sessions:
-            # No active chat session, just broadcast normally
-            broadcast_room(player.current_room, f"{Colors.GREEN}{player.name}: {message}{Colors.RESET}\n")
-            return False
-        
-        # There's an active chat session, use LLM for NPC responses
-        chat_data = chat_sessions[room_vnum]
-        room_npcs = chat_data.get('npcs', [])
-        npc = room_npcs[0] if room_npcs else None
-        
-        if not npc:
-            # No NPCs to respond, just broadcast
-            broadcast_room(player.current_room, f"{Colors.GREEN}{player.name}: {message}{Colors.RESET}\n")
-            return False
-        
-        # Broadcast the player's message
-        broadcast_room(player.current_room, f"{Colors.GREEN}{player.name}: {message}{Colors.RESET}\n")
-        conversation_history = chat_data.get('conversation', [])
-        
-        # Add the player's message to the conversation history
-        conversation_history.append({"role": "user", "content": message})
-        
-        # Limit conversation history to the last 6 exchanges
-        if len(conversation_history) > 6:
-            conversation_history = [conversation_history[0]] + conversation_history[-5:]
-        
-        # Generate responses from all NPCs in the room
-        if len(room_npcs) == 1:
-            # Single NPC response
-            ai_reply = llm_chat(conversation_history)
-            broadcast_room(player.current_room, f"{Colors.BLUE}{npc.short_desc}: {ai_reply}{Colors.RESET}\n", exclude=None)
-            conversation_history.append({"role": "assistant", "content": ai_reply})
-        else:
-            # Multiple NPCs respond
-            # Randomly select 1-3 NPCs to respond (not all at once to avoid spam)
-            responding_npcs = random.sample(room_npcs, min(random.randint(1, 3), len(room_npcs)))
-            
-            for responding_npc in responding_npcs:
-                # Create a modified prompt for this specific NPC
-                npc_specific_history = conversation_history[:]
-                if len(npc_specific_history) > 0:
-                    # Modify the system prompt to focus on this NPC
-                    original_system = npc_specific_history[0]['content']
-                    npc_context = responding_npc.personality if responding_npc.personality else responding_npc.description
-                    npc_specific_history[0] = {
-                        "role": "system", 
-                        "content": f"You are {responding_npc.short_desc} in a group conversation. Background: {npc_context[:200]}. Respond naturally as this character would in first person, keeping responses brief since others may also respond. Do not include your character name in the response."
-                    }
-                
-                ai_reply = llm_chat(npc_specific_history)
-                broadcast_room(player.current_room, f"{Colors.BLUE}{responding_npc.short_desc}: {ai_reply}{Colors.RESET}\n", exclude=None)
-                conversation_history.append({"role": "assistant", "content": f"[{responding_npc.short_desc}] {ai_reply}"})
-        
-        # Update conversation history  
-        chat_data['conversation'] = conversation_history
-        
-        # Remind player how to continue the conversation
-        send_to_player(player, f"{Colors.YELLOW}[Use 'say <message>' to continue talking]{Colors.RESET}\n")
+    else:
+        send_to_player(player, "Your character could not be saved.\n")
+
+def _cmd_craft(player, verb, rest):
+    args = rest.split()
+    if len(args) == 2:
+        player.craft_item(args[0], args[1])
+    else:
+        send_to_player(player, "Usage: craft <item1> <item2>\n")
+
+def _cmd_talk(player, verb, rest):
+    npc_name = rest.strip()
+    if npc_name:
+        talk_to_npc(player, npc_name)
+    else:
+        send_to_player(player, "Talk to whom?\n")
+
+def _cmd_stop(player, verb, rest):
+    """End the chat session in the current room"""
+    # End chat session in current room
+    room_vnum = player.current_room.vnum
+    if chat_sessions.pop(room_vnum, None) is not None:
+        send_to_player(player, CHAT_END_MESSAGE)
+        broadcast_room(player.current_room, CHAT_LEFT_FORMAT.format(player.name), exclude=player)
+    else:
+        send_to_player(player, "There is no active conversation to stop.\n")
+
+def _cmd_chat(player, verb, rest):
+    message = rest.strip()
+    if message:
+        broadcast_all(f"[CHAT] {player.name}: {message}")
+    else:
+        send_to_player(player, "Usage: chat <message>\n")
+
+def _cmd_say(player, verb, rest):
+    """Speak in the room, letting NPCs in an active chat session reply"""
+    message = rest.strip()
+    if not message:
+        send_to_player(player, "What do you want to say?\n")
         return False
-    
-    elif command == 'list':
+
+    room_vnum = player.current_room.vnum
+
+    # Everyone in the room hears the player exactly once
+    broadcast_room(player.current_room, SAY_FORMAT.format(player.name, message))
+
+    # NPCs only answer when there's an ongoing chat session with NPCs in this room
+    chat_data = chat_sessions.get(room_vnum)
+    room_npcs = chat_data.get('npcs', []) if chat_data else []
+    if not room_npcs:
+        return False
+    npc = room_npcs[0]
+
+    # Add the player's message to the conversation history (the oldest turns drop off)
+    with chat_data['lock']:
+        add_chat_turn(chat_data, "user", message)
+
+    # Generate responses from all NPCs in the room; replies are broadcast as they arrive
+    if len(room_npcs) == 1:
+        # Single NPC response
+        request_npc_reply(room_vnum, chat_data, npc, chat_messages(chat_data))
+    else:
+        # Multiple NPCs respond
+        # Randomly select 1-3 NPCs to respond (not all at once to avoid spam)
+        responding_npcs = _sample(room_npcs, min(_randint(1, 3), len(room_npcs)))
+
+        # All requests go out together, so the NPCs answer in parallel
+        for responding_npc in responding_npcs:
+            # Create a modified prompt for this specific NPC
+            npc_specific_history = chat_messages(chat_data)
+            # Replace the system prompt to focus on this NPC
+            npc_context = responding_npc.personality if responding_npc.personality else responding_npc.description
+            npc_specific_history[0] = {
+                "role": "system", 
+                "content": f"You are {responding_npc.short_desc} in a group conversation. Background: {npc_context[:200]}. Respond naturally as this character would in first person, keeping responses brief since others may also respond. Do not include your character name in the response."
+            }
+
+            request_npc_reply(room_vnum, chat_data, responding_npc, npc_specific_history, tag_speaker=True)
+
+    # Remind player how to continue the conversation
+    send_to_player(player, CHAT_HINT)
+    return False
+
+def _cmd_list(player, verb, rest):
+    if DEBUG:
         debug_print(f" Player {player.name} using 'list' command in room {player.current_room.vnum}")
-        list_vendor_items(player)
-    elif command.startswith('buy '):
-        item_name = ' '.join(parts[1:])
-        buy_from_vendor(player, item_name)
-    elif command.startswith('sell '):
-        item_name = ' '.join(parts[1:])
-        sell_to_vendor(player, item_name)
-    elif command.startswith('open '):
-        direction = command[5:]
-        open_door(player, direction)
-    elif command.startswith('close '):
-        direction = command[6:]
-        close_door(player, direction)
-    elif command.startswith('unlock '):
-        parts = command.split()
-        if len(parts) >= 3:
-            direction = parts[1]
-            code = parts[2]
-            unlock_door(player, direction, code)
-        elif len(parts) == 2:
-            direction = parts[1]
-            unlock_door(player, direction)
+    list_vendor_items(player)
+
+def _cmd_buy(player, verb, rest):
+    buy_from_vendor(player, rest.strip())
+
+def _cmd_sell(player, verb, rest):
+    sell_to_vendor(player, rest.strip())
+
+def _cmd_open(player, verb, rest):
+    open_door(player, rest)
+
+def _cmd_close(player, verb, rest):
+    close_door(player, rest)
+
+def _cmd_unlock(player, verb, rest):
+    args = rest.split()
+    if len(args) >= 2:
+        direction = args[0]
+        code = args[1]
+        unlock_door(player, direction, code)
+    elif len(args) == 1:
+        direction = args[0]
+        unlock_door(player, direction)
+    else:
+        send_to_player(player, "Usage: unlock <direction> [code]\n")
+
+def _cmd_equip(player, verb, rest):
+    equip_command(player, rest.strip())
+
+def _cmd_unequip(player, verb, rest):
+    unequip_command(player, rest.strip())
+
+def _cmd_summon(player, verb, rest):
+    summon_command(player, rest.strip())
+
+def _cmd_enter(player, verb, rest):
+    target = rest.strip()
+    if not target:
+        # Check if there's a portal here
+        room_vnum = player.current_room.vnum
+        if room_vnum in active_events and active_events[room_vnum]['type'] == 'portal':
+            enter_portal(player)
         else:
-            send_to_player(player, "Usage: unlock <direction> [code]\n")
-    elif command.startswith('equip '):
-        item_name = ' '.join(parts[1:])
-        equip_command(player, item_name)
-    elif command.startswith('unequip '):
-        item_name = ' '.join(parts[1:])
-        unequip_command(player, item_name)
-    elif command.startswith('summon '):
-        mob_name = ' '.join(parts[1:])
-        summon_command(player, mob_name)
-    elif command.startswith('enter ') or command == 'enter':
-        if command == 'enter':
-            # Check if there's a portal here
-            room_vnum = player.current_room.vnum
-            if room_vnum in active_events and active_events[room_vnum]['type'] == 'portal':
-                enter_portal(player)
-            else:
-                send_to_player(player, "Enter what? There's nothing here to enter.\n")
+            send_to_player(player, "Enter what? There's nothing here to enter.\n")
+    else:
+        if 'portal' in target.lower():
+            enter_portal(player)
         else:
-            target = ' '.join(parts[1:])
-            if 'portal' in target.lower():
-                enter_portal(player)
-            else:
-                send_to_player(player, f"You can't enter {target}.\n")
-    elif command == 'who':
-        who_command(player)
-    elif command == 'merchant' and player.name.lower() == 'admin':  # Debug command
-        spawn_merchant_event(player.current_room.vnum)
-        send_to_player(player, "Merchant event spawned!\n")
-    elif command == 'invasion' and player.name.lower() == 'admin':  # Debug command
-        create_monster_invasion()
-        send_to_player(player, "Monster invasion triggered!\n")
-    elif command in ['flee', 'escape']:
-        if in_combat(player):
-            # Find combat partner
-            opponent = find_combat_opponent(player)
-            if opponent:
-                stop_combat(player, opponent)
-                send_to_player(player, "You flee from combat!\n")
-                broadcast_room(player.current_room, f"{player.name} flees from combat!\n", exclude=[player])
-            else:
-                send_to_player(player, "You are no longer in combat.\n")
+            send_to_player(player, f"You can't enter {target}.\n")
+
+def _cmd_merchant(player, verb, rest):
+    """Debug command: spawn a merchant event here"""
+    if player.name_lower != 'admin':
+        return _cmd_unknown(player, verb, rest)
+    spawn_merchant_event(player.current_room.vnum)
+    send_to_player(player, "Merchant event spawned!\n")
+
+def _cmd_reload(player, verb, rest):
+    """Debug command: re-read config.json"""
+    if player.name_lower != 'admin':
+        return _cmd_unknown(player, verb, rest)
+    if reload_config(force=True):
+        send_to_player(player, "Configuration reloaded.\n")
+    else:
+        send_to_player(player, "Could not read config.json; the current configuration is unchanged.\n")
+
+def _cmd_invasion(player, verb, rest):
+    """Debug command: trigger a monster invasion"""
+    if player.name_lower != 'admin':
+        return _cmd_unknown(player, verb, rest)
+    create_monster_invasion()
+    send_to_player(player, "Monster invasion triggered!\n")
+
+def _cmd_flee(player, verb, rest):
+    if in_combat(player):
+        # Find combat partner
+        opponent = find_combat_opponent(player)
+        if opponent:
+            stop_combat(player, opponent)
+            send_to_player(player, "You flee from combat!\n")
+            broadcast_room(player.current_room, f"{player.name} flees from combat!\n", exclude=[player])
         else:
-            send_to_player(player, "You are not in combat.\n")
-    elif command == 'help':
-        show_help(player)
-    elif command in ['bonus', 'surprises', 'lucky']:
-        show_surprise_status(player)
-    elif command.startswith('use '):
-        item_name = ' '.join(parts[1:])
-        use_item(player, item_name)
-    elif command == 'quit':
-        send_to_player(player, "Goodbye!\n")
-        player.connection_handler.close_connection()
-        if player.name in players:
-            del players[player.name]
+            send_to_player(player, "You are no longer in combat.\n")
     else:
-        send_to_player(player, "Unknown command. Type 'help' to see a list of available commands.\n")
+        send_to_player(player, "You are not in combat.\n")
+
+def _cmd_use(player, verb, rest):
+    use_item(player, rest.strip())
+
+def _cmd_quit(player, verb, rest):
+    send_to_player(player, "Goodbye!\n")
+    player.connection_handler.close_connection()
+    player.leave_room()
+    player.stop_resting()
+    with players_lock:
+        remove_online_player(player.name)
+
+def _cmd_unknown(player, verb, rest):
+    send_to_player(player, "Unknown command. Type 'help' to see a list of available commands.\n")
+
+# Commands typed on their own, without arguments
+EXACT_COMMANDS = {
+    'north': lambda player, verb, rest: player.move(verb),
+    'south': lambda player, verb, rest: player.move(verb),
+    'east': lambda player, verb, rest: player.move(verb),
+    'west': lambda player, verb, rest: player.move(verb),
+    'up': lambda player, verb, rest: player.move(verb),
+    'down': lambda player, verb, rest: player.move(verb),
+    'attack': _cmd_attack,
+    'special': _cmd_special,
+    'look': _cmd_look,
+    'spells': _cmd_spells,
+    'inventory': lambda player, verb, rest: player.show_inventory(),
+    'stats': lambda player, verb, rest: player.show_stats(),
+    'skills': lambda player, verb, rest: player.show_skills(),
+    'rest': lambda player, verb, rest: player.rest(),
+    'stand': lambda player, verb, rest: player.stand(),
+    'map': lambda player, verb, rest: player.show_map(),
+    'save': _cmd_save,
+    'load': lambda player, verb, rest: load_game(player),
+    'help': lambda player, verb, rest: show_help(player),
+    'quests': lambda player, verb, rest: show_quests(player),
+    'achievements': lambda player, verb, rest: player.view_achievements(),
+    'stop': _cmd_stop,
+    'list': _cmd_list,
+    'enter': _cmd_enter,
+    'who': lambda player, verb, rest: who_command(player),
+    'merchant': _cmd_merchant,
+    'invasion': _cmd_invasion,
+    'reload': _cmd_reload,
+    'flee': _cmd_flee,
+    'escape': _cmd_flee,
+    'bonus': lambda player, verb, rest: show_surprise_status(player),
+    'surprises': lambda player, verb, rest: show_surprise_status(player),
+    'lucky': lambda player, verb, rest: show_surprise_status(player),
+    'quit': _cmd_quit,
+}
+
+# Commands matched on their first word, when followed by arguments
+VERB_COMMANDS = {
+    'attack': _cmd_attack,
+    'cast': _cmd_cast,
+    'learn': _cmd_learn,
+    'get': _cmd_get,
+    'allocate': _cmd_allocate,
+    'teleport': _cmd_teleport,
+    'craft': _cmd_craft,
+    'talk': _cmd_talk,
+    'chat': _cmd_chat,
+    'say': _cmd_say,
+    'buy': _cmd_buy,
+    'sell': _cmd_sell,
+    'open': _cmd_open,
+    'close': _cmd_close,
+    'unlock': _cmd_unlock,
+    'equip': _cmd_equip,
+    'unequip': _cmd_unequip,
+    'summon': _cmd_summon,
+    'enter': _cmd_enter,
+    'use': _cmd_use,
+}
+
+# Commands that change the world or the session must be typed in full
+FULL_NAME_COMMANDS = frozenset({'save', 'load', 'merchant', 'invasion', 'reload', 'quit'})
+
+def build_command_prefixes(table, command_names):
+    """Map each prefix (two letters or more) of the table's commands to the command it starts.
+
+    A prefix that starts more than one of command_names ("spe" for spells and special) is
+    left out, so it reads as an unknown command rather than running whichever came first.
+    Commands that must be typed in full take no part, so "inv" still means inventory.
+    """
+    command_names = [name for name in command_names if name not in FULL_NAME_COMMANDS]
+    starts = Counter(name[:end] for name in command_names for end in range(2, len(name)))
+    prefixes = {}
+    for name in table:
+        if name in FULL_NAME_COMMANDS:
+            continue
+        for end in range(2, len(name)):
+            prefix = name[:end]
+            if starts[prefix] == 1:
+                prefixes[prefix] = name
+    return prefixes
+
+# Built once, so resolving "inv" to inventory is a dict lookup rather than a scan of the tables.
+# Ambiguity is judged over both tables, so "spe" with or without arguments means the same thing
+_command_names = EXACT_COMMANDS.keys() | VERB_COMMANDS.keys()
+EXACT_PREFIXES = build_command_prefixes(EXACT_COMMANDS, _command_names)
+VERB_PREFIXES = build_command_prefixes(VERB_COMMANDS, _command_names)
+del _command_names
+
+@batched_output
+def process_player_command(player, command):
+    # Everything a command sends back to its own player goes out as one write
+    # Tokenize once: handlers get the verb and the unparsed rest of the line
+    # Only the verb is lowercased; arguments keep their case for say/chat, and the
+    # handlers that match names lowercase their own argument
+    verb, sep, rest = command.partition(' ')
+    verb = verb.lower()
+    verb = command_abbreviations.get(verb, verb)
+    # No command name has a space in it, so a line is either a bare command or a verb with arguments
+    table = VERB_COMMANDS if sep else EXACT_COMMANDS
+    handler = table.get(verb)
+    if handler is None:
+        # Only a miss pays for the prefix lookup; full names and abbreviations win over prefixes
+        verb = (VERB_PREFIXES if sep else EXACT_PREFIXES).get(verb, verb)
+        handler = table.get(verb, _cmd_unknown)
+    return handler(player, verb, rest)
+
+# The help screen never changes, so it is joined once and sent as a single write
+HELP_TEXT = (
+    "Available Commands:\n"
+    "Movement: north, south, east, west, up, down\n"
+    "Combat: attack <target>, flee/escape, special, rest, stand\n"
+    "Character: inventory, stats, skills, allocate <skill> <points>, achievements\n"
+    "Items: get <item>, equip <item>, unequip <item>, use <item>\n"
+    "Magic: cast <spell> [target], spells, learn <spell>\n"
+    "World: look, map, teleport <room>, craft <item1> <item2>, quests\n"
+    "Social: chat <message>, talk <npc>, say <message>, who\n"
+    "Trading: list (vendor items), buy <item>, sell <item>\n"
+    "Doors: open <direction>, close <direction>, unlock <direction> [code]\n"
+    "Special: enter portal, summon <mob>, bonus/surprises, stop (end conversation)\n"
+    "System: help, quit\n"
+)
 
 def show_help(player):
-    send_to_player(player, "Available Commands:\n")
-    send_to_player(player, "Movement: north, south, east, west, up, down\n")
-    send_to_player(player, "Combat: attack <target>, flee/escape, special, rest, stand\n")
-    send_to_player(player, "Character: inventory, stats, skills, allocate <skill> <points>, achievements\n")
-    send_to_player(player, "Items: get <item>, equip <item>, unequip <item>, use <item>\n")
-    send_to_player(player, "Magic: cast <spell> [target], spells, learn <spell>\n")
-    send_to_player(player, "World: look, map, teleport <room>, craft <item1> <item2>, quests\n")
-    send_to_player(player, "Social: chat <message>, talk <npc>, say <message>, who\n")
-    send_to_player(player, "Trading: list (vendor items), buy <item>, sell <item>\n")
-    send_to_player(player, "Doors: open <direction>, close <direction>, unlock <direction> [code]\n")
-    send_to_player(player, "Special: enter portal, summon <mob>, bonus/surprises, stop (end conversation)\n")
-    send_to_player(player, "System: help, quit\n")
+    send_to_player(player, HELP_TEXT)
 
+@batched_output
 def show_surprise_status(player):
     """Show player their surprise events and bonus status"""
-    config = load_config()
+    game_config = config.get('game', {})
 
     send_to_player(player, f"\n{Colors.YELLOW}=== SURPRISE REWARDS STATUS ==={Colors.RESET}\n")
 
     # Lucky Find System Status
-    if config.get('game', {}).get('surprise_events_enabled', True):
-        chance = config.get('game', {}).get('lucky_find_chance', 0.05) * 100
+    if game_config.get('surprise_events_enabled', True):
+        chance = game_config.get('lucky_find_chance', 0.05) * 100
         send_to_player(player, f"🎁 Lucky Find System: {Colors.GREEN}ACTIVE{Colors.RESET}\n")
         send_to_player(player, f"   Chance per exploration: {chance}%\n")
         send_to_player(player, f"   Rewards: Magical treasures while looking around and moving\n")
@@ -2612,7 +3174,7 @@ def show_surprise_status(player):
         send_to_player(player, f"🎁 Lucky Find System: {Colors.RED}DISABLED{Colors.RESET}\n")
 
     # Daily Bonus Status
-    if config.get('game', {}).get('daily_bonus_enabled', True):
+    if game_config.get('daily_bonus_enabled', True):
         send_to_player(player, f"🌅 Daily Login Bonus: {Colors.GREEN}ACTIVE{Colors.RESET}\n")
         if hasattr(player, 'last_login_date'):
             import datetime
@@ -2630,7 +3192,7 @@ def show_surprise_status(player):
         send_to_player(player, f"🌅 Daily Login Bonus: {Colors.RED}DISABLED{Colors.RESET}\n")
 
     # Combat Speed
-    combat_speed = config.get('game', {}).get('combat_round_interval', 2)
+    combat_speed = game_config.get('combat_round_interval', 2)
     send_to_player(player, f"⚔️  Combat Round Speed: {combat_speed} second(s) per round\n")
 
     # Achievement Status
@@ -2647,6 +3209,7 @@ def show_surprise_status(player):
 
     send_to_player(player, f"\n{Colors.CYAN}Keep exploring to discover hidden treasures!{Colors.RESET}\n")
 
+@batched_output
 def show_quests(player):
     send_to_player(player, "Active Quests:\n")
     if player.quests:
@@ -2663,31 +3226,35 @@ def show_quests(player):
         send_to_player(player, "You have no active quests.\n")
 
 def save_game():
-    door_states = {}
-    for room in rooms.values():
-        for dir_num, exit_data in room.exits.items():
-            if exit_data['door_flags'] in (1, 3):
-                door_id = f"{room.vnum}-{dir_num}"
-                door_states[door_id] = {
-                    'is_open': exit_data['is_open'],
-                    'is_locked': exit_data['is_locked']
-                }
+    """Save world state. Players are persisted separately through their own profiles."""
+    door_states = {
+        door_id: {'is_open': exit_data.is_open, 'is_locked': exit_data.is_locked}
+        for door_id, exit_data in world_doors
+    }
 
-    with open('savegame.pkl', 'wb') as f:
-        pickle.dump({'players': players, 'all_npcs': all_npcs, 'door_states': door_states}, f)
+    # load_game only restores doors, so the live players and NPCs (which hold
+    # sockets and locks and can't be serialized anyway) are not written here.
+    # Door state is plain strings and booleans, so JSON holds it and loading runs no code.
+    # Write beside the old save and swap it in, so a failed write never leaves a torn file
+    with save_lock:
+        with open('savegame.json.tmp', 'w') as f:
+            json.dump({'door_states': door_states}, f)
+        os.replace('savegame.json.tmp', 'savegame.json')
 
 def load_game(player):
     try:
-        with open('savegame.pkl', 'rb') as f:
-            data = pickle.load(f)
+        with open('savegame.json', 'r') as f:
+            data = json.load(f)
             # This would replace global players and npcs, which might not be desired
             # For a real MUD, handle carefully. Here we skip loading players from save to avoid conflicts.
             door_states = data.get('door_states', {})
             for door_id, state in door_states.items():
                 room_vnum, dir_num = map(int, door_id.split('-'))
-                if room_vnum in rooms and dir_num in rooms[room_vnum].exits:
-                    rooms[room_vnum].exits[dir_num]['is_open'] = state['is_open']
-                    rooms[room_vnum].exits[dir_num]['is_locked'] = state['is_locked']
+                room = rooms.get(room_vnum)
+                exit_data = room.exits.get(dir_num) if room else None
+                if exit_data is not None:
+                    room.set_door_open(exit_data, state['is_open'])
+                    exit_data.is_locked = state['is_locked']
         send_to_player(player, "Game loaded successfully.\n")
         player.describe_current_room()
     except FileNotFoundError:
@@ -2703,56 +3270,51 @@ def player_login(client_socket):
     if not name:
         name = "Player" + str(random.randint(1000,9999))
     
-    if name in players:
-        p = players[name]
-        # Update connection handler for returning player
-        p.connection_handler = connection_handler
-        p.client_socket = client_socket  # Backward compatibility
-
-        # CRITICAL FIX: Ensure returning player has valid HP
-        if p.hp <= 0:
-            print(f"WARNING: Returning player {p.name} had {p.hp} HP, setting to full health")
-            p.hp = p.max_hp
-
-        send_to_player(p, f"Welcome back, {p.name}!\n")
-
-        # Check for daily bonus (surprise feature)
-        give_daily_bonus(p)
+    # As in the web login, a name that is online (in any case) or being logged in is refused,
+    # rather than handing the new connection someone else's live session
+    while not reserve_login_name(name):
+        connection_handler.send_message("Name already in use. Enter your character name: ")
+        name = connection_handler.receive_line()
+        if not name:
+            name = "Player" + str(random.randint(1000,9999))
 
-        p.describe_current_room()
-    else:
-        # Create a new player
-        start_room = 2201
+    # Create a new player
+    start_room = 2201
+    try:
         p = Player(name, start_room, connection_handler)
-        players[name] = p
-        
         # Load player profile if it exists
         load_player_profile(p)
-        
-        # Load some default spells
-        default_spells = ['fireball', 'magic missile', 'heal', 'chain lightning']
-        for spell_name in default_spells:
-            if spell_name in spells:
-                p.spellbook[spell_name] = spells[spell_name]
-        
-        send_to_player(p, f"Welcome, {p.name}! You appear in {p.current_room.name}.\n")
-        p.describe_current_room()
+    except Exception:
+        release_login_name(name)
+        raise
+    complete_login(p)
+
+    # Left open: handle_client adds the help hint and first prompt, then flushes it all at once
+    p.begin_batch()
+
+    # Load some default spells
+    p.spellbook.update(starter_spellbook)
+
+    send_to_player(p, f"Welcome, {p.name}! You appear in {p.current_room.name}.\n")
+    p.describe_current_room()
     
     return p
 
+@batched_output
 def list_vendor_items(player):
     """Show items available for purchase from vendors in current room"""
     room = player.current_room
-    vendors = [npc for npc in room.mobs if hasattr(npc, 'inventory') and npc.inventory and hasattr(npc, 'is_npc') and npc.is_npc]
+    vendors = room.vendors()
     
     # Check for active merchant events
     has_merchant_event = (room.vnum in active_events and 
                          active_events[room.vnum].get('type') == 'merchant')
     
     # Debug output
-    print(f"DEBUG LIST: Room {room.vnum}, Vendors: {len(vendors)}, Merchant event: {has_merchant_event}")
-    print(f"DEBUG LIST: Active events: {list(active_events.keys())}")
-    print(f"DEBUG LIST: Room Mobs: {len(room.mobs)}")
+    if DEBUG:
+        print(f"DEBUG LIST: Room {room.vnum}, Vendors: {len(vendors)}, Merchant event: {has_merchant_event}")
+        print(f"DEBUG LIST: Active events: {list(active_events.keys())}")
+        print(f"DEBUG LIST: Room Mobs: {len(room.mobs)}")
     
     if not vendors and not has_merchant_event:
         send_to_player(player, "There are no vendors here.\n")
@@ -2765,7 +3327,7 @@ def list_vendor_items(player):
         send_to_player(player, f"\nFrom {vendor.short_desc}:\n")
         for i, item in enumerate(vendor.inventory, 1):
             price = calculate_item_price(item)
-            send_to_player(player, f"{i}. {getattr(item, 'short_desc', 'unknown item')} - {price} gold\n")
+            send_to_player(player, f"{i}. {item.short_desc} - {price} gold\n")
     
     # Show traveling merchant items
     if has_merchant_event:
@@ -2774,12 +3336,12 @@ def list_vendor_items(player):
         send_to_player(player, f"\nFrom {merchant_name}:\n")
         for i, item in enumerate(merchant_items, 1):
             price = calculate_item_price(item)
-            send_to_player(player, f"{i}. {item.get('short_desc', 'unknown item')} - {price} gold\n")
+            send_to_player(player, f"{i}. {item.short_desc} - {price} gold\n")
 
 def calculate_item_price(item):
     """Calculate the price of an item based on its properties"""
     base_price = 10
-    item_type = item.get('item_type', 'misc')
+    item_type = item.item_type
     
     # Price modifiers by item type
     type_modifiers = {
@@ -2797,7 +3359,7 @@ def calculate_item_price(item):
 def buy_from_vendor(player, item_name):
     """Buy an item from a vendor in the current room"""
     room = player.current_room
-    vendors = [npc for npc in room.mobs if hasattr(npc, 'inventory') and npc.inventory and hasattr(npc, 'is_npc') and npc.is_npc]
+    vendors = room.vendors()
     
     # Check for active merchant events
     has_merchant_event = (room.vnum in active_events and 
@@ -2807,74 +3369,62 @@ def buy_from_vendor(player, item_name):
         send_to_player(player, "There are no vendors here.\n")
         return
     
-    # Initialize gold if needed
-    if not hasattr(player, 'gold'):
-        player.gold = 100  # Start with some gold
+    item_name_lower = item_name.lower()
     
     # First try merchant event items
     if has_merchant_event:
-        for item in merchant_items:
-            item_keywords = item.get('keywords', [])
-            item_short = item.get('short_desc', '').lower()
+        item = match_item(merchant_keyword_index, merchant_items, item_name_lower)
+        if item is not None:
+            price = calculate_item_price(item)
             
-            if (item_name.lower() in [kw.lower() for kw in item_keywords] or 
-                item_name.lower() in item_short):
-                
-                price = calculate_item_price(item)
-                
-                if player.gold < price:
-                    send_to_player(player, f"You don't have enough gold! You need {price} gold but only have {player.gold}.\n")
-                    return
-                
-                # Complete the transaction - create a copy of the item
-                player.gold -= price
-                item_copy = item.copy() if hasattr(item, 'copy') else dict(item)
-                player.inventory.append(item_copy)
-                
-                send_to_player(player, f"You buy {item.get('short_desc', 'an item')} for {price} gold from the traveling merchant.\n")
-                send_to_player(player, f"You have {player.gold} gold remaining.\n")
+            if player.gold < price:
+                send_to_player(player, f"You don't have enough gold! You need {price} gold but only have {player.gold}.\n")
                 return
+            
+            # Complete the transaction - items are never modified once owned,
+            # so the shared template goes straight into the inventory
+            player.gold -= price
+            player.inventory.append(item)
+            
+            send_to_player(player, f"You buy {item.short_desc} for {price} gold from the traveling merchant.\n")
+            send_to_player(player, f"You have {player.gold} gold remaining.\n")
+            return
     
     # Then try regular vendor items
     for vendor in vendors:
-        for item in vendor.inventory[:]:  # Use slice to avoid modification during iteration
-            item_keywords = item.get('keywords', [])
-            item_short = item.get('short_desc', '').lower()
+        item = match_item(vendor.inventory_index(), vendor.inventory, item_name_lower)
+        if item is not None:
+            price = calculate_item_price(item)
             
-            if (item_name.lower() in [kw.lower() for kw in item_keywords] or 
-                item_name.lower() in item_short):
-                
-                price = calculate_item_price(item)
-                
-                if player.gold < price:
-                    send_to_player(player, f"You don't have enough gold! You need {price} gold but only have {player.gold}.\n")
-                    return
-                
-                # Complete the transaction
-                player.gold -= price
-                player.inventory.append(item)
-                vendor.inventory.remove(item)
-                
-                send_to_player(player, f"You buy {item.get('short_desc', 'an item')} for {price} gold.\n")
-                send_to_player(player, f"You have {player.gold} gold remaining.\n")
+            if player.gold < price:
+                send_to_player(player, f"You don't have enough gold! You need {price} gold but only have {player.gold}.\n")
                 return
+            
+            # Complete the transaction
+            player.gold -= price
+            player.inventory.append(item)
+            vendor.inventory.remove(item)
+            vendor.keyword_index = None
+            
+            send_to_player(player, f"You buy {item.short_desc} for {price} gold.\n")
+            send_to_player(player, f"You have {player.gold} gold remaining.\n")
+            return
     
     send_to_player(player, f"No vendor here sells '{item_name}'.\n")
 
 def open_door(player, direction):
     """Open a door in the specified direction"""
-    dir_num = reverse_direction_map.get(direction)
-    if dir_num is not None and dir_num in player.current_room.exits:
-        exit_data = player.current_room.exits[dir_num]
-        if exit_data['door_flags'] in (1, 3):
-            if exit_data.get('is_open', False):
+    exit_data = player.current_room.exits.get(parse_direction(direction))
+    if exit_data is not None:
+        if exit_data.is_door:
+            if exit_data.is_open:
                 send_to_player(player, "The door is already open.\n")
             else:
-                if exit_data.get('is_locked', False):
+                if exit_data.is_locked:
                     send_to_player(player, "The door is locked. You need to unlock it first.\n")
                 else:
                     send_to_player(player, "You open the door.\n")
-                    exit_data['is_open'] = True
+                    player.current_room.set_door_open(exit_data, True)
         else:
             send_to_player(player, "There is no door in that direction.\n")
     else:
@@ -2882,15 +3432,14 @@ def open_door(player, direction):
 
 def close_door(player, direction):
     """Close a door in the specified direction"""
-    dir_num = reverse_direction_map.get(direction)
-    if dir_num is not None and dir_num in player.current_room.exits:
-        exit_data = player.current_room.exits[dir_num]
-        if exit_data['door_flags'] in (1, 3):
-            if not exit_data.get('is_open', False):
+    exit_data = player.current_room.exits.get(parse_direction(direction))
+    if exit_data is not None:
+        if exit_data.is_door:
+            if not exit_data.is_open:
                 send_to_player(player, "The door is already closed.\n")
             else:
                 send_to_player(player, "You close the door.\n")
-                exit_data['is_open'] = False
+                player.current_room.set_door_open(exit_data, False)
         else:
             send_to_player(player, "There is no door in that direction.\n")
     else:
@@ -2898,19 +3447,18 @@ def close_door(player, direction):
 
 def unlock_door(player, direction, code=None):
     """Unlock a door in the specified direction"""
-    dir_num = reverse_direction_map.get(direction)
-    if dir_num is not None and dir_num in player.current_room.exits:
-        exit_data = player.current_room.exits[dir_num]
-        if exit_data.get('is_locked', False):
-            if 'secret_code' in exit_data and exit_data['secret_code']:
-                if code == exit_data['secret_code']:
-                    exit_data['is_locked'] = False
+    exit_data = player.current_room.exits.get(parse_direction(direction))
+    if exit_data is not None:
+        if exit_data.is_locked:
+            if exit_data.secret_code:
+                if code is not None and code.lower() == exit_data.secret_code.lower():
+                    exit_data.is_locked = False
                     send_to_player(player, "You have unlocked the door.\n")
                 else:
                     send_to_player(player, "Incorrect code. The door remains locked.\n")
             else:
                 # No code required, just unlock
-                exit_data['is_locked'] = False
+                exit_data.is_locked = False
                 send_to_player(player, "You unlock the door.\n")
         else:
             send_to_player(player, "The door is not locked.\n")
@@ -2919,79 +3467,105 @@ def unlock_door(player, direction, code=None):
 
 def who_command(player):
     """Show list of players currently online"""
-    send_to_player(player, "Players Online:\n")
-    with players_lock:
-        for p_name, p in players.items():
-            send_to_player(player, f"- {p_name}\n")
+    lines = ["Players Online:\n"]
+    lines.extend(f"- {p.name}\n" for p in players_snapshot)
+    send_to_player(player, ''.join(lines))
+
+# Key: (speaking NPC's vnum, sorted vnums of the NPCs present), Value: system message dict
+# (shared, never mutated). Vnums rather than the Mobiles themselves, so the order NPCs arrived in
+# doesn't matter and reset NPCs aren't kept alive; emptied when it reaches NPC_PROMPT_CACHE_MAX.
+NPC_PROMPT_CACHE_MAX = 256
+npc_prompt_cache = {}
+
+def npc_system_message(npc, room_npcs):
+    """Return the system message for npc speaking with room_npcs present, building it once per NPC set"""
+    room_npcs = sorted(room_npcs, key=lambda n: n.vnum)
+    key = (npc.vnum, tuple(n.vnum for n in room_npcs))
+    message = npc_prompt_cache.get(key)
+    if message is not None:
+        return message
+
+    npc_context = npc.personality if npc.personality else npc.description
+    npc_context = npc_context[:500]  # Limit context length
+
+    # Set up conversation with system prompt that acknowledges multiple NPCs
+    if len(room_npcs) == 1:
+        system_prompt = f"You are {npc.short_desc}, an NPC in a text-based RPG. Background: {npc_context}. Always respond in first person without including your character name in responses."
+    else:
+        npc_names = [n.short_desc for n in room_npcs]
+        system_prompt = f"You are {npc.short_desc}, an NPC in a text-based RPG with other NPCs present ({', '.join(npc_names)}). Background: {npc_context}. You may respond for yourself or facilitate group conversation. Always respond in first person without including your character name in responses."
+
+    if npc.background:
+        system_prompt += f" Additional background: {npc.background[:200]}"
+    if npc.secrets:
+        system_prompt += f" Secret knowledge: {npc.secrets[:200]}"
+
+    if len(npc_prompt_cache) >= NPC_PROMPT_CACHE_MAX:
+        npc_prompt_cache.clear()
+    message = npc_prompt_cache[key] = {"role": "system", "content": system_prompt}
+    return message
 
 def talk_to_npc(player, npc_name):
     """Start or join a conversation with NPCs in the current room"""
-    print(f"DEBUG CHAT: Player {player.name} attempting to talk to '{npc_name}'")
+    if DEBUG:
+        print(f"DEBUG CHAT: Player {player.name} attempting to talk to '{npc_name}'")
     room_vnum = player.current_room.vnum
-    print(f"DEBUG CHAT: Player is in room {room_vnum}")
+    if DEBUG:
+        print(f"DEBUG CHAT: Player is in room {room_vnum}")
     
     # Find the specific NPC to start conversation with
     target_npc = None
-    print(f"DEBUG CHAT: Searching for target NPC '{npc_name}' among {len(player.current_room.mobs)} mobs in room")
-    
-    for mob in player.current_room.mobs:
-        print(f"DEBUG CHAT: Checking mob: {mob.short_desc}, is_npc: {getattr(mob, 'is_npc', False)}")
-        if hasattr(mob, 'is_npc') and mob.is_npc:
-            mob_keywords = getattr(mob, 'keywords', [])
-            print(f"DEBUG CHAT: NPC {mob.short_desc} has keywords: {mob_keywords}")
-            if npc_name.lower() in [k.lower() for k in mob_keywords] or npc_name.lower() in mob.short_desc.lower():
-                target_npc = mob
+    npc_name_lower = npc_name.lower()
+    room_npcs = list(player.current_room.npcs)
+    if DEBUG:
+        print(f"DEBUG CHAT: Searching for target NPC '{npc_name}' among {len(room_npcs)} NPCs in room")
+    
+    for mob in room_npcs:
+        if DEBUG:
+            print(f"DEBUG CHAT: NPC {mob.short_desc} has keywords: {mob.keywords}")
+        if npc_name_lower in mob.keywords_lower or npc_name_lower in mob.short_desc_lower:
+            target_npc = mob
+            if DEBUG:
                 print(f"DEBUG CHAT: Found target NPC: {mob.short_desc}")
-                break
+            break
     
     if not target_npc:
-        print(f"DEBUG CHAT: No target NPC found for '{npc_name}'")
+        if DEBUG:
+            print(f"DEBUG CHAT: No target NPC found for '{npc_name}'")
         send_to_player(player, f"There is no '{npc_name}' here to talk to.\n")
         return
     
-    # Get ALL NPCs in the room for the conversation
-    room_npcs = []
-    for mob in player.current_room.mobs:
-        if hasattr(mob, 'is_npc') and mob.is_npc:
-            room_npcs.append(mob)
-    
-    print(f"DEBUG CHAT: Found {len(room_npcs)} NPCs in room for conversation: {[npc.short_desc for npc in room_npcs]}")
+    # ALL NPCs in the room take part in the conversation (room_npcs, copied above)
+    if DEBUG:
+        print(f"DEBUG CHAT: Found {len(room_npcs)} NPCs in room for conversation: {[npc.short_desc for npc in room_npcs]}")
     
     # Initialize or update the chat session for this room
     if room_vnum not in chat_sessions:
-        print(f"DEBUG CHAT: Creating new chat session for room {room_vnum}")
+        if DEBUG:
+            print(f"DEBUG CHAT: Creating new chat session for room {room_vnum}")
         
         # Create new chat session
         npc = target_npc  # Use the targeted NPC as primary speaker
-        npc_context = npc.personality if npc.personality else npc.description
-        npc_context = npc_context[:500]  # Limit context length
-        
-        print(f"DEBUG CHAT: Using primary NPC: {npc.short_desc}")
-        print(f"DEBUG CHAT: NPC context (first 100 chars): {npc_context[:100]}...")
         
-        # Set up conversation with system prompt that acknowledges multiple NPCs
-        if len(room_npcs) == 1:
-            system_prompt = f"You are {npc.short_desc}, an NPC in a text-based RPG. Background: {npc_context}. Always respond in first person without including your character name in responses."
-        else:
-            npc_names = [n.short_desc for n in room_npcs]
-            system_prompt = f"You are {npc.short_desc}, an NPC in a text-based RPG with other NPCs present ({', '.join(npc_names)}). Background: {npc_context}. You may respond for yourself or facilitate group conversation. Always respond in first person without including your character name in responses."
-        
-        if hasattr(npc, 'background') and npc.background:
-            system_prompt += f" Additional background: {npc.background[:200]}"
-        if hasattr(npc, 'secrets') and npc.secrets:
-            system_prompt += f" Secret knowledge: {npc.secrets[:200]}"
+        if DEBUG:
+            print(f"DEBUG CHAT: Using primary NPC: {npc.short_desc}")
         
-        print(f"DEBUG CHAT: System prompt: {system_prompt}")
+        system_message = npc_system_message(npc, room_npcs)
         
-        conversation_history = [{"role": "system", "content": system_prompt}]
+        if DEBUG:
+            print(f"DEBUG CHAT: System prompt: {system_message['content']}")
         
         chat_sessions[room_vnum] = {
             'npcs': room_npcs,
             'players': [player],
-            'conversation': conversation_history
+            'system': system_message,
+            'conversation': new_conversation(),
+            'lock': threading.Lock(),
+            'next_speaker': 0  # npc_chat_loop cycles through the NPCs in turn
         }
         
-        print(f"DEBUG CHAT: Chat session created with {len(room_npcs)} NPCs and 1 player")
+        if DEBUG:
+            print(f"DEBUG CHAT: Chat session created with {len(room_npcs)} NPCs and 1 player")
         
         # Get NPCs to greet the player
         npc_names = [npc.short_desc for npc in room_npcs]
@@ -3001,151 +3575,153 @@ def talk_to_npc(player, npc_name):
             send_to_player(player, f"You start a group conversation with {', '.join(npc_names[:-1])} and {npc_names[-1]}.\n")
         
         # Have the primary NPC greet the player with AI
-        print(f"DEBUG CHAT: Preparing AI greeting request for {npc.short_desc}")
+        if DEBUG:
+            print(f"DEBUG CHAT: Preparing AI greeting request for {npc.short_desc}")
         greeting_prompt = "A player approaches you to start a conversation. Greet them naturally and ask how you can help."
-        greeting_request = conversation_history + [{"role": "user", "content": greeting_prompt}]
-        print(f"DEBUG CHAT: Greeting request has {len(greeting_request)} messages")
-        
-        ai_reply = llm_chat(greeting_request)
-        print(f"DEBUG CHAT: AI greeting reply received: '{ai_reply[:100]}...'")
+        greeting_request = [system_message, {"role": "user", "content": greeting_prompt}]
+        if DEBUG:
+            print(f"DEBUG CHAT: Greeting request has {len(greeting_request)} messages")
         
-        if ai_reply:
-            # Broadcast NPC's initial response
-            print(f"DEBUG CHAT: Broadcasting greeting to room: {npc.short_desc}: {ai_reply}")
-            broadcast_room(player.current_room, f"{Colors.BLUE}{npc.short_desc}: {ai_reply}{Colors.RESET}\n", exclude=None)
-            
-            # Add the greeting exchange to history
-            print(f"DEBUG CHAT: Adding greeting exchange to conversation history")
-            chat_sessions[room_vnum]['conversation'].append({"role": "user", "content": "Hello"})
-            chat_sessions[room_vnum]['conversation'].append({"role": "assistant", "content": ai_reply})
-            print(f"DEBUG CHAT: Conversation history now has {len(chat_sessions[room_vnum]['conversation'])} messages")
-        else:
-            print(f"DEBUG CHAT: AI greeting failed, sending fallback message")
-            broadcast_room(player.current_room, f"{Colors.BLUE}{npc.short_desc}: Hello there! How can I help you?{Colors.RESET}\n", exclude=None)
+        # The greeting is broadcast and recorded as the reply to "Hello" once
+        # the LLM answers; llm_chat supplies its own fallback text on failure
+        chat_data = chat_sessions[room_vnum]
+        with chat_data['lock']:
+            add_chat_turn(chat_data, "user", "Hello")
+        request_npc_reply(room_vnum, chat_data, npc, greeting_request)
     else:
-        print(f"DEBUG CHAT: Joining existing chat session in room {room_vnum}")
+        if DEBUG:
+            print(f"DEBUG CHAT: Joining existing chat session in room {room_vnum}")
         chat_data = chat_sessions[room_vnum]
-        print(f"DEBUG CHAT: Current session has {len(chat_data.get('players', []))} players and {len(chat_data.get('npcs', []))} NPCs")
+        if DEBUG:
+            print(f"DEBUG CHAT: Current session has {len(chat_data.get('players', []))} players and {len(chat_data.get('npcs', []))} NPCs")
         
         if player not in chat_data['players']:
             chat_data['players'].append(player)
-            print(f"DEBUG CHAT: Added player {player.name} to existing session")
+            if DEBUG:
+                print(f"DEBUG CHAT: Added player {player.name} to existing session")
         
         if 'conversation' not in chat_data:
-            print(f"DEBUG CHAT: No conversation history found, creating new system prompt")
-            npc = target_npc
-            npc_context = npc.personality if npc.personality else npc.description
-            npc_context = npc_context[:500]
-            print(f"DEBUG CHAT: Using NPC context for system prompt: {npc_context[:50]}...")
-            
-            if len(room_npcs) == 1:
-                system_prompt = f"You are {npc.short_desc}, an NPC in a text-based RPG. Background: {npc_context}. Always respond in first person without including your character name in responses."
-            else:
-                npc_names = [n.short_desc for n in room_npcs]
-                system_prompt = f"You are {npc.short_desc}, an NPC in a text-based RPG with other NPCs present ({', '.join(npc_names)}). Background: {npc_context}. You may respond for yourself or facilitate group conversation. Always respond in first person without including your character name in responses."
-            
-            print(f"DEBUG CHAT: Created system prompt for existing session: {system_prompt[:100]}...")
-            conversation_history = [{"role": "system", "content": system_prompt}]
-            chat_data['conversation'] = conversation_history
-            print(f"DEBUG CHAT: Initialized conversation history with system prompt")
+            if DEBUG:
+                print(f"DEBUG CHAT: No conversation history found, creating new system prompt")
+            chat_data['system'] = npc_system_message(target_npc, room_npcs)
+            if DEBUG:
+                print(f"DEBUG CHAT: Created system prompt for existing session: {chat_data['system']['content'][:100]}...")
+            chat_data['conversation'] = new_conversation()
+            if DEBUG:
+                print(f"DEBUG CHAT: Initialized conversation history with system prompt")
         else:
-            print(f"DEBUG CHAT: Using existing conversation history with {len(chat_data['conversation'])} messages")
+            if DEBUG:
+                print(f"DEBUG CHAT: Using existing conversation history with {len(chat_data['conversation'])} messages")
         
         # Update NPCs list to include all room NPCs
         chat_data['npcs'] = room_npcs
-        print(f"DEBUG CHAT: Updated NPCs list to {len(room_npcs)} NPCs")
+        if DEBUG:
+            print(f"DEBUG CHAT: Updated NPCs list to {len(room_npcs)} NPCs")
         send_to_player(player, f"You join the ongoing conversation.\n")
         broadcast_room(player.current_room, f"{player.name} joins the conversation.\n", exclude=player)
     
     # Inform how to continue
-    send_to_player(player, f"{Colors.YELLOW}[Use 'say <message>' to continue talking]{Colors.RESET}\n")
+    send_to_player(player, CHAT_HINT)
 
 def get_target_name(entity):
     """Get the name identifier for combat tracking"""
-    if hasattr(entity, 'name') and not getattr(entity, 'is_npc', False):
-        return entity.name
-    else:
-        return entity.short_desc
+    return entity.display_name
 
 def start_combat(attacker, defender):
     """Start combat between two entities"""
     attacker_name = get_target_name(attacker)
     defender_name = get_target_name(defender)
 
-    # Debug HP values when combat starts
-    attacker_hp = getattr(attacker, 'hp', getattr(attacker, 'current_hp', 'UNKNOWN'))
-    defender_hp = getattr(defender, 'hp', getattr(defender, 'current_hp', 'UNKNOWN'))
-    attacker_level = getattr(attacker, 'level', 'UNKNOWN')
-    defender_level = getattr(defender, 'level', 'UNKNOWN')
-
-    print(f"DEBUG COMBAT: Starting combat - {attacker_name} (lvl {attacker_level}, {attacker_hp} HP) vs {defender_name} (lvl {defender_level}, {defender_hp} HP)")
+    if DEBUG:
+        # Debug HP values when combat starts
+        print(f"DEBUG COMBAT: Starting combat - {attacker_name} (lvl {getattr(attacker, 'level', 'UNKNOWN')}, {attacker.hp} HP) vs {defender_name} (lvl {getattr(defender, 'level', 'UNKNOWN')}, {defender.hp} HP)")
 
-    pair = tuple(sorted([attacker_name, defender_name]))
+    pair = combat_pair(attacker_name, defender_name)
+    if pair in combatants:
+        return  # Already fighting; the opponent lists are up to date
     combatants[pair] = True
+    opponents.setdefault(attacker_name, {})[defender_name] = None
+    opponents.setdefault(defender_name, {})[attacker_name] = None
+
+def combat_pair(name1, name2):
+    """Key for the combatants dict: the two names in sorted order"""
+    return (name1, name2) if name1 <= name2 else (name2, name1)
+
+def end_combat_pair(pair):
+    """Drop a pair from combatants and from both sides' opponent lists"""
+    if combatants.pop(pair, None) is None:
+        return
+    name1, name2 = pair
+    for name, other in ((name1, name2), (name2, name1)):
+        others = opponents.get(name)
+        if others is not None:
+            others.pop(other, None)
+            if not others:
+                del opponents[name]
 
 def stop_combat(attacker, defender):
     """Stop combat between two entities"""
-    pair = tuple(sorted([get_target_name(attacker), get_target_name(defender)]))
-    if pair in combatants:
-        del combatants[pair]
+    end_combat_pair(combat_pair(get_target_name(attacker), get_target_name(defender)))
 
 def in_combat(entity):
     """Check if entity is in combat"""
-    n = entity.name if hasattr(entity, 'name') and not getattr(entity, 'is_npc', False) else entity.short_desc
-    for pair in combatants:
-        if n in pair:
-            return True
-    return False
+    return get_target_name(entity) in opponents
 
 def find_combat_opponent(entity):
     """Find the current combat opponent of an entity"""
-    n = entity.name if hasattr(entity, 'name') and not getattr(entity, 'is_npc', False) else entity.short_desc
-    for pair in combatants:
-        if n in pair:
-            names = list(pair)
-            if names[0] == n:
-                return find_any_entity_by_name(names[1], entity.current_room)
-            else:
-                return find_any_entity_by_name(names[0], entity.current_room)
-    return None
+    others = opponents.get(get_target_name(entity))
+    if not others:
+        return None
+    # Oldest fight first, matching the order pairs were started in
+    return find_any_entity_by_name(next(iter(others)), entity.current_room)
 
 def find_any_entity_by_name(name, room):
     """Find any entity (player or mob) by name in a room"""
     name_lower = name.lower()
     
     # Check players
-    for p_name, p in players.items():
-        if p.current_room == room and p.name.lower() == name_lower:
+    for p in tuple(room.players):
+        if p.name_lower == name_lower:
             return p
-    
+
     # Check mobs
-    for mob in room.mobs:
-        if mob.short_desc.lower() == name_lower:
+    for mob in tuple(room.mobs):
+        if mob.short_desc_lower == name_lower:
             return mob
     
     return None
 
 def perform_special_attack(attacker, defender):
     """Perform a special attack with enhanced damage"""
-    base_damage = random.randint(attacker.attack_power, attacker.attack_power * 2)
+    base_damage = _randint(attacker.attack_power, attacker.attack_power * 2)
     special_multiplier = 2
     damage = max(1, base_damage * special_multiplier - defender.defense)
     
-    defender.current_hp -= damage
+    defender.hp -= damage
     
     send_to_player(attacker, f"You perform a devastating special attack on {get_target_name(defender)} for {damage} damage!\n")
     
     # Only send message to defender if it's a player
-    if isinstance(defender, Player):
+    if defender._kind == 'player':
         send_to_player(defender, f"{get_target_name(attacker)} unleashes a powerful special attack on you for {damage} damage!\n")
     
     # Notify others in room
-    for p in players.values():
-        if p.current_room == attacker.current_room and p != attacker and p != defender:
-            send_to_player(p, f"{get_target_name(attacker)} performs a special attack on {get_target_name(defender)}!\n")
+    room = attacker.current_room
+    participants = tuple(x for x in (attacker, defender) if x._kind == 'player')
+    if has_onlookers(room, participants):
+        broadcast_room(room, f"{get_target_name(attacker)} performs a special attack on {get_target_name(defender)}!", exclude=participants)
     
     return damage
 
+# Equipment slot each equippable item_type goes into
+EQUIP_SLOT_FOR_TYPE = {
+    'weapon': 'weapon',
+    'armor': 'armor',
+    'shield': 'shield',
+    'ring': 'ring',
+    'amulet': 'amulet',
+}
+
 def equip_command(player, item_name):
     """Equip an item from inventory"""
     if not item_name:
@@ -3154,19 +3730,11 @@ def equip_command(player, item_name):
     
     # Find item in inventory
     item = None
+    needle = item_name.lower()
     for it in player.inventory:
         try:
             # Handle both dict and object items
-            if hasattr(it, 'keywords') and it.keywords and any(item_name.lower() in kw.lower() for kw in it.keywords):
-                item = it
-                break
-            elif isinstance(it, dict) and 'keywords' in it and it['keywords'] and any(item_name.lower() in kw.lower() for kw in it['keywords']):
-                item = it
-                break
-            elif hasattr(it, 'short_desc') and it.short_desc and item_name.lower() in it.short_desc.lower():
-                item = it
-                break
-            elif isinstance(it, dict) and 'short_desc' in it and it['short_desc'] and item_name.lower() in it['short_desc'].lower():
+            if item_name_matches(it, needle):
                 item = it
                 break
         except (AttributeError, KeyError, TypeError) as e:
@@ -3179,45 +3747,24 @@ def equip_command(player, item_name):
         return
 
     # Determine appropriate slot based on item_type
-    slot = None
-    item_type = None
-    if hasattr(item, 'item_type'):
-        item_type = item.item_type
-    elif isinstance(item, dict) and 'item_type' in item:
-        item_type = item['item_type']
-    
-    if item_type:
-        if item_type == 'weapon':
-            slot = 'weapon'
-        elif item_type == 'armor':
-            slot = 'armor'
-        elif item_type == 'shield':
-            slot = 'shield'
-        elif item_type == 'ring':
-            slot = 'ring'
-        elif item_type == 'amulet':
-            slot = 'amulet'
-    
+    slot = EQUIP_SLOT_FOR_TYPE.get(item.item_type)
     if not slot:
         send_to_player(player, "You cannot equip that item.\n")
         return
 
     # If slot is occupied, unequip first
-    if player.equipment[slot]:
-        unequipped_item = player.equipment[slot]
+    unequipped_item = player.equipment.get(slot)
+    if unequipped_item:
         player.equipment[slot] = None
         player.inventory.append(unequipped_item)
-        unequipped_name = unequipped_item.get('short_desc', 'the item') if isinstance(unequipped_item, dict) else getattr(unequipped_item, 'short_desc', 'the item')
-        send_to_player(player, f"You remove {unequipped_name}.\n")
+        send_to_player(player, f"You remove {unequipped_item.short_desc}.\n")
 
     player.inventory.remove(item)
     player.equipment[slot] = item
-    item_name = item.get('short_desc', 'the item') if isinstance(item, dict) else getattr(item, 'short_desc', 'the item')
-    send_to_player(player, f"You equip {item_name}.\n")
+    send_to_player(player, f"You equip {item.short_desc}.\n")
     
     # Recalculate stats after equipment change
-    player.attack_power = player.calculate_attack_power()
-    player.defense = player.calculate_defense()
+    player.refresh_combat_stats()
 
 def unequip_command(player, item_name):
     """Unequip an item and put it in inventory"""
@@ -3229,13 +3776,9 @@ def unequip_command(player, item_name):
     item_to_unequip = None
     slot_to_clear = None
     
+    needle = item_name.lower()
     for slot, item in player.equipment.items():
-        if item and (
-            (hasattr(item, 'keywords') and any(item_name.lower() in kw.lower() for kw in item.keywords)) or
-            (isinstance(item, dict) and 'keywords' in item and any(item_name.lower() in kw.lower() for kw in item['keywords'])) or
-            (hasattr(item, 'short_desc') and item_name.lower() in item.short_desc.lower()) or
-            (isinstance(item, dict) and 'short_desc' in item and item_name.lower() in item['short_desc'].lower())
-        ):
+        if item and item_name_matches(item, needle):
             item_to_unequip = item
             slot_to_clear = slot
             break
@@ -3247,12 +3790,11 @@ def unequip_command(player, item_name):
     # Unequip the item
     player.equipment[slot_to_clear] = None
     player.inventory.append(item_to_unequip)
-    item_name = item_to_unequip.get('short_desc', 'the item') if isinstance(item_to_unequip, dict) else getattr(item_to_unequip, 'short_desc', 'the item')
+    item_name = item_to_unequip.short_desc
     send_to_player(player, f"You unequip {item_name}.\n")
     
     # Recalculate stats after equipment change
-    player.attack_power = player.calculate_attack_power()
-    player.defense = player.calculate_defense()
+    player.refresh_combat_stats()
 
 def use_item(player, item_name):
     """Use a consumable item from inventory"""
@@ -3264,23 +3806,10 @@ def use_item(player, item_name):
     item_to_use = None
     item_index = None
 
+    needle = item_name.lower()
     for i, item in enumerate(player.inventory):
-        # Check if item matches (support for both Object instances and dictionaries)
-        item_matches = False
-
-        if hasattr(item, 'keywords'):  # Object instance
-            item_matches = any(item_name.lower() in kw.lower() for kw in item.keywords)
-        elif isinstance(item, dict) and 'keywords' in item:  # Dictionary
-            item_matches = any(item_name.lower() in kw.lower() for kw in item['keywords'])
-
-        if not item_matches:
-            # Also check short_desc
-            if hasattr(item, 'short_desc'):  # Object instance
-                item_matches = item_name.lower() in item.short_desc.lower()
-            elif isinstance(item, dict) and 'short_desc' in item:  # Dictionary
-                item_matches = item_name.lower() in item['short_desc'].lower()
-
-        if item_matches:
+        # Keywords first, then short_desc (works for Object instances and dictionaries)
+        if item_name_matches(item, needle):
             item_to_use = item
             item_index = i
             break
@@ -3290,18 +3819,9 @@ def use_item(player, item_name):
         return
 
     # Check if item is consumable (has effects)
-    effects = None
-    item_type = None
-
-    if isinstance(item_to_use, dict):
-        effects = item_to_use.get('effects')
-        item_type = item_to_use.get('item_type')
-        item_desc = item_to_use.get('short_desc', 'the item')
-    else:
-        # Object instance - check for effects attribute
-        effects = getattr(item_to_use, 'effects', None)
-        item_type = getattr(item_to_use, 'item_type', None)
-        item_desc = getattr(item_to_use, 'short_desc', 'the item')
+    effects = item_to_use.effects
+    item_type = item_to_use.item_type
+    item_desc = item_to_use.short_desc
 
     if not effects:
         send_to_player(player, f"You cannot use {item_desc}.\n")
@@ -3351,277 +3871,376 @@ def use_item(player, item_name):
         send_to_player(player, f"You don't know how to use {item_desc}.\n")
 
 def broadcast_room(room, message, exclude=None):
-    """Send a message to all players in a room except excluded player"""
-    with players_lock:
-        players_list = list(players.items())
-    for p_name, p in players_list:
-        if p.current_room == room and p is not exclude:
-            send_to_player(p, message + "\n")
+    """Send a message to all players in a room except excluded player(s)"""
+    if exclude is None:
+        exclude = ()
+    elif not isinstance(exclude, (list, tuple, set)):
+        exclude = (exclude,)
+    message += "\n"
+    # Snapshot the occupants: other threads may move players while we send
+    for p in tuple(room.players):
+        if p not in exclude:
+            send_to_player(p, message)
+
+def begin_tick_output():
+    """Open an output batch for every online player; returns the players whose batch this opened"""
+    return [p for p in players_snapshot if p.begin_batch()]
+
+def flush_player_buffers(batched):
+    """Send each player's collected tick output as a single write"""
+    for p in batched:
+        p.end_batch()
+
+def has_onlookers(room, participants):
+    """True if room holds players besides participants (players who are in the room), so a broadcast would reach someone"""
+    return len(room.players) > len(participants)
 
 def broadcast_all(message):
-    """Send a message to all players"""
+    """Send a message to all players (the server-wide channel; rooms are the local ones)"""
+    message += "\n"
+    # The snapshot is replaced, never mutated, so it can be read without the lock
+    for p in players_snapshot:
+        send_to_player(p, message)
+
+def add_online_player(player):
+    """Add a player to the online table; the caller must hold players_lock"""
+    global players_snapshot
+    players[player.name] = player
+    players_by_name_lower[player.name_lower] = player
+    players_snapshot = tuple(players.values())
+
+def remove_online_player(name):
+    """Remove a player from the online table; the caller must hold players_lock"""
+    global players_snapshot
+    player = players.pop(name, None)
+    if player is not None:
+        if players_by_name_lower.get(player.name_lower) is player:
+            del players_by_name_lower[player.name_lower]
+        players_snapshot = tuple(players.values())
+
+def reserve_login_name(name):
+    """Claim a name for a login (telnet or web); returns False if it is online or being logged in"""
+    name_lower = name.lower()
+    with players_lock:
+        if name_lower in players_by_name_lower or name_lower in pending_logins:
+            return False
+        # Held until complete_login or release_login_name, so the player can be built without the lock
+        pending_logins.add(name_lower)
+        return True
+
+def release_login_name(name):
+    """Give up a reservation from reserve_login_name after a failed login"""
     with players_lock:
-        players_list = list(players.items())
-    for p_name, p in players_list:
-        send_to_player(p, message + "\n")
+        pending_logins.discard(name.lower())
+
+def complete_login(player):
+    """Swap the player's reservation for its entry in the online table in one step"""
+    with players_lock:
+        pending_logins.discard(player.name_lower)
+        add_online_player(player)
+
+def index_mob(mob):
+    """Register a mob that was just placed in the world with the global name indexes"""
+    mob_index.setdefault(mob.short_desc_lower, []).append(mob)
+    for kw in mob.keywords_lower:
+        mob_keyword_index.setdefault(kw, []).append(mob)
+
+def unindex_mob(mob):
+    """Drop a mob that has left the world (killed, tamed, despawned) from the name indexes"""
+    keys = [(mob_index, mob.short_desc_lower)]
+    keys.extend((mob_keyword_index, kw) for kw in mob.keywords_lower)
+    for index, key in keys:
+        bucket = index.get(key)
+        if bucket is None:
+            continue
+        bucket[:] = [m for m in bucket if m is not mob]
+        if not bucket:
+            del index[key]
 
 def find_entity_globally(name):
     """Find a player or mob anywhere in the world by name"""
+    # Combat tracks players by their exact name, so try that before anything else
+    p = players.get(name)
+    if p is not None:
+        return p
+
     name_lower = name.lower()
-    
-    # Check all players
-    for p_name, p in players.items():
-        if p.name.lower() == name_lower:
-            return p
-    
-    # Check all rooms for a matching mob
-    for room in rooms.values():
-        for mob in room.mobs:
-            if hasattr(mob, 'short_desc') and mob.short_desc.lower() == name_lower:
-                return mob
-            if hasattr(mob, 'keywords') and any(name_lower in kw.lower() for kw in mob.keywords):
-                return mob
-    
+    p = players_by_name_lower.get(name_lower)
+    if p is not None:
+        return p
+
+    # Mobs moving between rooms keep their entries; only spawns and deaths touch the indexes
+    bucket = mob_index.get(name_lower) or mob_keyword_index.get(name_lower)
+    if bucket:
+        return bucket[0]
+
+    # Partial keyword, e.g. "gob" for "goblin"
+    for kw, bucket in mob_keyword_index.items():
+        if name_lower in kw:
+            return bucket[0]
+
     return None
 
+# Miss lines for a player attacker; only the chosen one gets formatted
+MISS_TEMPLATES = (
+    "You swing wildly but miss {}!\n",
+    "Your attack goes wide of {}!\n",
+    "{} dodges your attack!\n",
+    "You lose your footing and miss {}!\n",
+)
+
 def player_attack(attacker, defender):
     """Execute an attack between two entities"""
-    # Calculate base stats
-    attack_power = getattr(attacker, 'attack_power', 10)
-    defense = getattr(defender, 'defense', 5)
-    attacker_level = getattr(attacker, 'level', 1)
-    defender_level = getattr(defender, 'level', 1)
+    # Players and mobs carry the same combat attributes, so read them directly
+    attack_power = attacker.attack_power
+    defense = defender.defense
+    attacker_level = attacker.level
+    defender_level = defender.level
     
     # Roll for hit/miss (based on level difference and stats)
     hit_chance = 85 + (attacker_level - defender_level) * 5
     hit_chance = max(10, min(95, hit_chance))  # Clamp between 10-95%
 
-    print(f"DEBUG HIT: {get_target_name(attacker)} (lvl {attacker_level}) vs {get_target_name(defender)} (lvl {defender_level}) - hit chance: {hit_chance}%")
+    # Names and player-ness are fixed for the whole swing, so work them out once
+    attacker_name = attacker.display_name
+    defender_name = defender.display_name
+    attacker_is_player = attacker._kind == 'player'
+    defender_is_player = defender._kind == 'player'
+    # Players involved get personal messages and are left out of the room broadcast
+    participants = tuple(x for x, is_player in ((attacker, attacker_is_player), (defender, defender_is_player)) if is_player)
+
+    if DEBUG:
+        print(f"DEBUG HIT: {attacker_name} (lvl {attacker_level}) vs {defender_name} (lvl {defender_level}) - hit chance: {hit_chance}%")
     
-    if random.randint(1, 100) > hit_chance:
+    # Same odds as randint(1, 100) > hit_chance, from a single float draw
+    if _random() * 100 >= hit_chance:
         # Miss
-        print(f"DEBUG MISS: {get_target_name(attacker)} missed {get_target_name(defender)} (hit chance was {hit_chance}%)")
+        if DEBUG:
+            print(f"DEBUG MISS: {attacker_name} missed {defender_name} (hit chance was {hit_chance}%)")
 
-        miss_messages = [
-            f"You swing wildly but miss {get_target_name(defender)}!",
-            f"Your attack goes wide of {get_target_name(defender)}!",
-            f"{get_target_name(defender)} dodges your attack!",
-            f"You lose your footing and miss {get_target_name(defender)}!"
-        ]
         # Send personalized miss message to player attacker
-        if hasattr(attacker, 'name') and not getattr(attacker, 'is_npc', False):
-            attacker_msg = random.choice(miss_messages)
-            send_to_player(attacker, f"{attacker_msg}\n")
+        if attacker_is_player:
+            send_to_player(attacker, _choice(MISS_TEMPLATES).format(defender_name))
 
         # Send personalized message to player defender
-        if hasattr(defender, 'name') and not getattr(defender, 'is_npc', False):
-            send_to_player(defender, f"{get_target_name(attacker)}'s attack misses you!\n")
-
-        # Broadcast to everyone else in the room (excluding attacker and defender if they're players)
-        exclude_list = []
-        if hasattr(attacker, 'name') and not getattr(attacker, 'is_npc', False):
-            exclude_list.append(attacker)
-        if hasattr(defender, 'name') and not getattr(defender, 'is_npc', False):
-            exclude_list.append(defender)
+        if defender_is_player:
+            send_to_player(defender, f"{attacker_name}'s attack misses you!\n")
 
-        broadcast_room(attacker.current_room, f"{get_target_name(attacker)} misses {get_target_name(defender)}!\n", exclude=exclude_list)
+        # Broadcast to everyone else in the room
+        if has_onlookers(attacker.current_room, participants):
+            broadcast_room(attacker.current_room, f"{attacker_name} misses {defender_name}!\n", exclude=participants)
         return
 
     # Calculate damage
-    base_damage = random.randint(1, attack_power)
+    base_damage = _randint(1, attack_power)
     damage = max(1, base_damage - defense)
     
     # Apply damage
-    defender_hp_before = getattr(defender, 'hp', getattr(defender, 'current_hp', 0))
-    if hasattr(defender, 'hp'):
-        defender.hp -= damage
-    elif hasattr(defender, 'current_hp'):
-        defender.current_hp -= damage
+    defender_hp_before = defender.hp
+    defender.hp -= damage
 
-    defender_hp_after = getattr(defender, 'hp', getattr(defender, 'current_hp', 0))
-    print(f"DEBUG DAMAGE: {get_target_name(defender)} HP: {defender_hp_before} -> {defender_hp_after} (damage: {damage})")
+    defender_hp_after = defender.hp
+    if DEBUG:
+        print(f"DEBUG DAMAGE: {defender_name} HP: {defender_hp_before} -> {defender_hp_after} (damage: {damage})")
     
     # Send messages
-    if hasattr(attacker, 'name') and not getattr(attacker, 'is_npc', False):
+    if attacker_is_player:
         # Player attacker gets personal message
-        send_to_player(attacker, f"You hit {get_target_name(defender)} for {damage} damage!\n")
+        send_to_player(attacker, f"You hit {defender_name} for {damage} damage!\n")
     
-    if hasattr(defender, 'name') and not getattr(defender, 'is_npc', False):
+    if defender_is_player:
         # Player defender gets personal message
-        send_to_player(defender, f"{get_target_name(attacker)} hits you for {damage} damage!\n")
-    
-    # Broadcast to everyone else in the room (excluding attacker and defender if they're players)
-    exclude_list = []
-    if hasattr(attacker, 'name') and not getattr(attacker, 'is_npc', False):
-        exclude_list.append(attacker)
-    if hasattr(defender, 'name') and not getattr(defender, 'is_npc', False):
-        exclude_list.append(defender)
+        send_to_player(defender, f"{attacker_name} hits you for {damage} damage!\n")
     
-    broadcast_room(attacker.current_room, f"{get_target_name(attacker)} hits {get_target_name(defender)} for {damage} damage!\n", exclude=exclude_list)
+    # Broadcast to everyone else in the room
+    if has_onlookers(attacker.current_room, participants):
+        broadcast_room(attacker.current_room, f"{attacker_name} hits {defender_name} for {damage} damage!\n", exclude=participants)
     
     # Check for death
-    defender_hp = getattr(defender, 'hp', getattr(defender, 'current_hp', 0))
+    defender_hp = defender.hp
     if defender_hp <= 0:
-        send_to_player(attacker, f"You have defeated {get_target_name(defender)}!\n")
-        broadcast_room(attacker.current_room, f"{get_target_name(defender)} has been defeated!\n", exclude=[attacker])
+        send_to_player(attacker, f"You have defeated {defender_name}!\n")
+        if has_onlookers(attacker.current_room, participants[:1] if attacker_is_player else ()):
+            broadcast_room(attacker.current_room, f"{defender_name} has been defeated!\n", exclude=attacker)
 
         # CRITICAL FIX: Stop combat immediately when defender dies
         stop_combat(attacker, defender)
 
-        # Remove dead mob from room
-        if hasattr(defender, 'is_npc') or not hasattr(defender, 'name'):
-            # Find the room where this mob is located (use attacker's current room)
-            if hasattr(attacker, 'current_room') and attacker.current_room and hasattr(attacker.current_room, 'mobs'):
-                if defender in attacker.current_room.mobs:
-                    attacker.current_room.mobs.remove(defender)
+        # Remove dead mob from room (the attacker's room, where the fight happened)
+        if not defender_is_player:
+            room = attacker.current_room
+            if room and room.remove_mob(defender):
+                unindex_mob(defender)
 
 def combat_round():
     """Process one round of combat for all active combatants"""
-    to_remove = []
-    if combatants:  # Only print if there are active combats
+    # Collect each player's hits, misses and room broadcasts for the round and
+    # send them as one write per player instead of one per line
+    batched = begin_tick_output()
+    try:
+        run_combat_pairs()
+    finally:
+        flush_player_buffers(batched)
+
+finished_pairs = []  # Scratch list for run_combat_pairs, reused every round
+
+def run_combat_pairs():
+    """Resolve one exchange of attacks for every combat pair"""
+    to_remove = finished_pairs
+    debug = DEBUG  # Looked up once per round rather than at every check below
+    if debug and combatants:  # Only print if there are active combats
         print(f"DEBUG COMBAT: Processing {len(combatants)} active combats: {list(combatants.keys())}")
 
-    for pair in list(combatants.keys()):
+    for pair in list(combatants):
         name1, name2 = pair
         ent1 = find_entity_globally(name1)
         ent2 = find_entity_globally(name2)
 
         if ent1 is None or ent2 is None:
-            print(f"DEBUG COMBAT: Removing combat pair {pair} - entity not found")
+            if debug:
+                print(f"DEBUG COMBAT: Removing combat pair {pair} - entity not found")
             to_remove.append(pair)
             continue
 
-        # Check if entities are in the same room (improved room checking)
-        if hasattr(ent1, 'current_room') and hasattr(ent2, 'current_room'):
-            ent1_room = getattr(ent1, 'current_room', None)
-            ent2_room = getattr(ent2, 'current_room', None)
-            ent1_room_vnum = ent1_room.vnum if ent1_room and hasattr(ent1_room, 'vnum') else None
-            ent2_room_vnum = ent2_room.vnum if ent2_room and hasattr(ent2_room, 'vnum') else None
-
-            # Only remove combat if we can confirm they're actually in different rooms
-            # If either room is None or invalid, let combat continue (they might be valid entities without proper room setup)
-            if (ent1_room_vnum is not None and ent2_room_vnum is not None and
-                ent1_room_vnum != ent2_room_vnum):
-                print(f"DEBUG COMBAT: Removing combat pair {pair} - entities in different rooms ({ent1_room_vnum} vs {ent2_room_vnum})")
-                to_remove.append(pair)
-                continue
+        # Check if entities are in the same room. Only remove combat if we can
+        # confirm they're in different rooms: reset mobs may have no current_room
+        ent1_room = ent1.current_room
+        ent2_room = ent2.current_room
+        if ent1_room is not None and ent2_room is not None and ent1_room is not ent2_room:
+            if debug:
+                print(f"DEBUG COMBAT: Removing combat pair {pair} - entities in different rooms ({ent1_room.vnum} vs {ent2_room.vnum})")
+            to_remove.append(pair)
+            continue
 
         # Check HP for both entities
-        ent1_hp = getattr(ent1, 'hp', getattr(ent1, 'current_hp', 0))
-        ent2_hp = getattr(ent2, 'hp', getattr(ent2, 'current_hp', 0))
-
-        print(f"DEBUG COMBAT: HP Check - {name1}: {ent1_hp}, {name2}: {ent2_hp}")
+        if debug:
+            print(f"DEBUG COMBAT: HP Check - {name1}: {ent1.hp}, {name2}: {ent2.hp}")
 
-        if ent1_hp <= 0 or ent2_hp <= 0:
-            print(f"DEBUG COMBAT: Entity has 0 HP - removing from combat ({name1}: {ent1_hp}, {name2}: {ent2_hp})")
+        if ent1.hp <= 0 or ent2.hp <= 0:
+            if debug:
+                print(f"DEBUG COMBAT: Entity has 0 HP - removing from combat ({name1}: {ent1.hp}, {name2}: {ent2.hp})")
             to_remove.append(pair)
             continue
 
         # Execute attacks
-        print(f"DEBUG COMBAT: {name1} attacks {name2}")
+        if debug:
+            print(f"DEBUG COMBAT: {name1} attacks {name2}")
         player_attack(ent1, ent2)
         
         # Check if defender died
-        ent2_hp = getattr(ent2, 'hp', getattr(ent2, 'current_hp', 0))
-        if ent2_hp <= 0:
-            print(f"DEBUG COMBAT: {name2} defeated, removing from combat")
+        if ent2.hp <= 0:
+            if debug:
+                print(f"DEBUG COMBAT: {name2} defeated, removing from combat")
             to_remove.append(pair)
             continue
 
         # Retaliation attack
-        print(f"DEBUG COMBAT: {name2} attacks {name1}")
+        if debug:
+            print(f"DEBUG COMBAT: {name2} attacks {name1}")
         player_attack(ent2, ent1)
         
         # Check if original attacker died
-        ent1_hp = getattr(ent1, 'hp', getattr(ent1, 'current_hp', 0))
-        if ent1_hp <= 0:
-            print(f"DEBUG COMBAT: {name1} defeated, removing from combat")
+        if ent1.hp <= 0:
+            if debug:
+                print(f"DEBUG COMBAT: {name1} defeated, removing from combat")
             to_remove.append(pair)
 
     # Remove finished combats
     for pair in to_remove:
-        if pair in combatants:
-            del combatants[pair]
+        end_combat_pair(pair)
+    to_remove.clear()
+
+def rest_loop():
+    """Heal every resting player once a second from a single thread"""
+    while not shutdown_event.is_set():
+        # Nobody resting: sleep until Player.rest (or shutdown) wakes us instead of ticking idle
+        rest_wakeup.clear()
+        if not resting_players:
+            rest_wakeup.wait()
+            continue
+        if shutdown_event.wait(1):
+            break
+        for player in tuple(resting_players):
+            try:
+                player.heal_over_time()
+            except Exception as e:
+                print(f"Rest loop error for {player.name}: {e}")
+                player.stop_resting()
 
-def combat_loop():
-    """Main combat processing loop"""
-    config = load_config()
+def combat_round_interval():
+    """Seconds between combat rounds, from config so a reload takes effect on the next round"""
     combat_interval = config.get('game', {}).get('combat_round_interval', 2)
-
     # Ensure minimum interval to prevent infinite loops
-    if combat_interval <= 0:
-        combat_interval = 1
-        print(f"WARNING: combat_round_interval was {config.get('game', {}).get('combat_round_interval')}, using minimum of 1 second")
+    return combat_interval if combat_interval > 0 else 1
+
+def combat_loop():
+    """Main combat processing loop"""
+    configured = config.get('game', {}).get('combat_round_interval', 2)
+    if configured <= 0:
+        print(f"WARNING: combat_round_interval was {configured}, using minimum of 1 second")
 
-    while True:
+    while not shutdown_event.is_set():
         try:
             if combatants:
                 combat_round()
-            time.sleep(combat_interval)
+            shutdown_event.wait(combat_round_interval())
         except Exception as e:
             print(f"Combat loop error: {e}")
-            import traceback
             traceback.print_exc()
-            time.sleep(5)
+            shutdown_event.wait(5)
+
+# Ambient chat prompts keep the per-NPC part in the final message so everything before it
+# is byte-identical between calls and can be reused by the LLM server's prompt cache
+NPC_OPENER_SYSTEM = {"role": "system", "content": "You are an NPC in a text-based RPG. Start a casual conversation or ask the players something interesting. Keep it brief (1-2 sentences). Respond in first person without including your character name."}
+NPC_OPENER_TURN = "Speak as {}. Continue the conversation naturally"
+NPC_TURN_FORMAT = "Speak as {}. Continue the conversation naturally. Keep response brief and in first person without including your character name."
 
 def npc_chat_loop():
     """Continuous NPC chat processing loop"""
-    while True:
+    while not shutdown_event.is_set():
         try:
             if chat_sessions:
                 for room_vnum, session_data in list(chat_sessions.items()):
                     # Check if session is still active and has NPCs
                     if 'npcs' in session_data and session_data['npcs']:
                         npcs = session_data['npcs']
-                        conversation = session_data.get('conversation', [])
+                        conversation = session_data.get('conversation', ())
                         
                         # Only have NPCs chat if there are players in the room
-                        active_players = []
-                        for player_name, player in players.items():
-                            if player.current_room.vnum == room_vnum:
-                                active_players.append(player)
+                        active_players = list(rooms[room_vnum].players) if room_vnum in rooms else []
                         
                         if active_players and len(npcs) >= 1:
                             # NPCs will always respond when players are present (100% chance every cycle)
-                            # Pick a random NPC to initiate conversation
-                            speaking_npc = random.choice(npcs)
+                            # NPCs take turns starting the conversation
+                            turn = session_data['next_speaker'] % len(npcs)
+                            speaking_npc = npcs[turn]
+                            session_data['next_speaker'] = turn + 1
                             
                             # Create context-appropriate prompt
-                            if len(conversation) < 3:
+                            if len(conversation) < 2:
                                 # Early in conversation - introduce yourself or ask questions
-                                npc_prompt = [
-                                    {"role": "system", "content": f"You are {speaking_npc.short_desc}. Start a casual conversation or ask the players something interesting. Keep it brief (1-2 sentences). Respond in first person without including your character name."},
-                                    {"role": "user", "content": "Continue the conversation naturally"}
-                                ]
+                                opener = cached_opener(speaking_npc)
+                                if opener:
+                                    deliver_npc_reply(room_vnum, session_data, speaking_npc, opener, tag_speaker=True)
+                                    continue
+                                on_reply = functools.partial(remember_opener, speaking_npc)
+                                npc_prompt = [NPC_OPENER_SYSTEM, {"role": "user", "content": NPC_OPENER_TURN.format(speaking_npc.short_desc)}]
                             else:
-                                # Ongoing conversation - be more contextual
-                                recent_conversation = conversation[-4:] if len(conversation) > 4 else conversation[1:]  # Skip system message
-                                npc_prompt = recent_conversation + [
-                                    {"role": "user", "content": f"You are {speaking_npc.short_desc}. Continue the conversation naturally. Keep response brief and in first person without including your character name."}
-                                ]
-                            
-                            # Generate AI response
-                            ai_reply = llm_chat(npc_prompt)
+                                # Ongoing conversation - be more contextual. The session's system prompt and
+                                # history come first and unchanged, so only the last message differs per speaker
+                                on_reply = None
+                                npc_prompt = chat_messages(session_data)
+                                npc_prompt.append({"role": "user", "content": NPC_TURN_FORMAT.format(speaking_npc.short_desc)})
                             
-                            # Broadcast NPC message to room
-                            room = rooms.get(room_vnum)
-                            if room:
-                                broadcast_room(room, f"{Colors.BLUE}{speaking_npc.short_desc}: {ai_reply}{Colors.RESET}\n")
-                                
-                                # Add to conversation history
-                                session_data['conversation'].append({"role": "assistant", "content": f"[{speaking_npc.short_desc}] {ai_reply}"})
-                                
-                                # Limit conversation history
-                                if len(session_data['conversation']) > 12:
-                                    session_data['conversation'] = [session_data['conversation'][0]] + session_data['conversation'][-8:]
+                            # Submit rather than wait, so every room's request is in flight at once
+                            request_npc_reply(room_vnum, session_data, speaking_npc, npc_prompt, tag_speaker=True, on_reply=on_reply)
             
-            time.sleep(random.randint(15, 45))  # NPCs chat every 15-45 seconds
+            shutdown_event.wait(random.randint(15, 45))  # NPCs chat every 15-45 seconds
             
         except Exception as e:
             print(f"NPC chat loop error: {e}")
-            import traceback
             traceback.print_exc()
-            time.sleep(10)
+            shutdown_event.wait(10)
 
 def enter_portal(player):
     """Enter a portal to travel to another room"""
@@ -3642,16 +4261,8 @@ def enter_portal(player):
     old_room = player.current_room
     new_room = rooms[destination_vnum]
     
-    # Remove from old room's player list (if it exists)
-    if hasattr(old_room, 'players') and player in old_room.players:
-        old_room.players.remove(player)
-    
     # Move player
-    player.current_room = new_room
-    
-    # Add to new room's player list (if it exists)
-    if hasattr(new_room, 'players'):
-        new_room.players.append(player)
+    player.move_to(new_room)
     
     # Messages
     broadcast_room(old_room, f"⚡ {player.name} steps into the portal and vanishes! ⚡", exclude=player)
@@ -3670,28 +4281,34 @@ def summon_command(player, mob_name):
     
     target = find_entity_globally(mob_name)
     
-    if target and hasattr(target, 'is_npc'):
+    if target and target._kind == 'mob':
         # Mob found in the world, move it
-        if hasattr(target, 'current_room') and target.current_room and target in target.current_room.mobs:
-            target.current_room.mobs.remove(target)
+        if target.current_room:
+            target.current_room.remove_mob(target)
         target.current_room = player.current_room
-        player.current_room.mobs.append(target)
+        player.current_room.add_mob(target)
         send_to_player(player, f"You chant ancient words, and {target.short_desc} appears before you!\n")
         broadcast_room(player.current_room, f"{player.name} summons {target.short_desc}!", exclude=player)
     else:
         # Try to find a mob template to create a new one
         mob_name_lower = mob_name.lower()
         found_template = None
-        for vnum, mob_template in mobiles.items():
-            if (hasattr(mob_template, 'short_desc') and mob_name_lower in mob_template.short_desc.lower()) or \
-               (hasattr(mob_template, 'keywords') and any(mob_name_lower in kw.lower() for kw in mob_template.keywords)):
-                found_template = mob_template
-                break
+        candidates = mob_template_index.get(mob_name_lower)
+        if candidates:
+            found_template = mobiles[candidates[0]]
+        else:
+            # Fall back to partial names
+            for vnum, mob_template in mobiles.items():
+                if (mob_name_lower in mob_template.short_desc_lower or
+                        contains_any(mob_name_lower, mob_template.keywords_lower)):
+                    found_template = mob_template
+                    break
 
         if found_template:
-            new_mob = copy.deepcopy(found_template)
+            new_mob = found_template.clone()
             new_mob.current_room = player.current_room
-            player.current_room.mobs.append(new_mob)
+            player.current_room.add_mob(new_mob)
+            index_mob(new_mob)
             send_to_player(player, f"You chant ancient words, and {new_mob.short_desc} appears before you!\n")
             broadcast_room(player.current_room, f"{player.name} summons {new_mob.short_desc}!", exclude=player)
         else:
@@ -3700,7 +4317,7 @@ def summon_command(player, mob_name):
 def sell_to_vendor(player, item_name):
     """Sell an item to a vendor in the current room"""
     room = player.current_room
-    vendors = [npc for npc in room.mobs if hasattr(npc, 'inventory') and hasattr(npc, 'is_npc') and npc.is_npc]
+    vendors = room.npcs
     
     if not vendors:
         send_to_player(player, "There are no vendors here to sell to.\n")
@@ -3708,12 +4325,9 @@ def sell_to_vendor(player, item_name):
     
     # Find item in player's inventory
     item_to_sell = None
+    needle = item_name.lower()
     for item in player.inventory:
-        item_keywords = item.get('keywords', [])
-        item_short = item.get('short_desc', '').lower()
-        
-        if (item_name.lower() in [kw.lower() for kw in item_keywords] or 
-            item_name.lower() in item_short):
+        if needle in item.keywords_lower or needle in item.short_desc_lower:
             item_to_sell = item
             break
     
@@ -3725,16 +4339,15 @@ def sell_to_vendor(player, item_name):
     sell_price = calculate_item_price(item_to_sell) // 2
     
     # Complete the transaction
-    if not hasattr(player, 'gold'):
-        player.gold = 0
-    
     player.gold += sell_price
     player.inventory.remove(item_to_sell)
     
     # Add to first vendor's inventory
-    vendors[0].inventory.append(item_to_sell)
+    vendor = next(iter(vendors))
+    vendor.inventory.append(item_to_sell)
+    vendor.keyword_index = None
     
-    send_to_player(player, f"You sell {item_to_sell.get('short_desc', 'an item')} for {sell_price} gold.\n")
+    send_to_player(player, f"You sell {item_to_sell.short_desc} for {sell_price} gold.\n")
     send_to_player(player, f"You now have {player.gold} gold.\n")
 
 def handle_client(client_socket):
@@ -3746,18 +4359,21 @@ def handle_client(client_socket):
         send_to_player(player, "Type 'help' for commands.\n")
         
         while player.connection_handler.is_connected():
+            # The prompt rides along with the last command's output: one write per command
             send_to_player(player, "> ")
+            player.end_batch()
             command = player.connection_handler.receive_line()
             
             if command is None:  # Connection lost
                 break
             
-            command = command.strip().lower()
+            player.begin_batch()
+            command = command.strip()
             if not command:
                 continue
                 
             # Check for quit command
-            if command in ['quit', 'exit', 'bye']:
+            if command.lower() in ('quit', 'exit', 'bye'):
                 send_to_player(player, "Goodbye!\n")
                 break
                 
@@ -3774,52 +4390,62 @@ def handle_client(client_socket):
         print(f"Error in handle_client for {player.name if player else 'unknown'}: {e}")
     
     finally:
+        player.end_batch()
         # Client disconnected - cleanup
         if player and player.name in players:
             print(f"Player {player.name} disconnected")
             # Save player profile before removing
             save_player_profile(player)
             # Remove from room players list
-            if hasattr(player, 'current_room') and hasattr(player.current_room, 'players'):
-                if player in player.current_room.players:
-                    player.current_room.players.remove(player)
+            player.leave_room()
+            player.stop_resting()
             # Clean up chat sessions if player was the only participant
-            if hasattr(player, 'current_room'):
-                room_vnum = player.current_room.vnum
-                if room_vnum in chat_sessions:
-                    session = chat_sessions[room_vnum]
-                    if 'players' in session and player in session['players']:
-                        session['players'].remove(player)
-                    # If no players left, remove the session
-                    if not session.get('players'):
-                        del chat_sessions[room_vnum]
+            room_vnum = player.current_room.vnum
+            session = chat_sessions.get(room_vnum)
+            if session is not None:
+                if player in session.get('players', ()):
+                    session['players'].remove(player)
+                # If no players left, remove the session
+                if not session.get('players'):
+                    chat_sessions.pop(room_vnum, None)
             
             # Remove from players dict
-            if player.name in players:
-                del players[player.name]
+            with players_lock:
+                remove_online_player(player.name)
             # Close connection
             player.connection_handler.close_connection()
 
+# Client threads only shuffle short lines of text, so the default 8MB stack is mostly waste
+CLIENT_THREAD_STACK_SIZE = 512 * 1024
+
+def start_client_thread(client_socket):
+    """Start a handle_client thread with the smaller CLIENT_THREAD_STACK_SIZE stack"""
+    # threading.stack_size() is process-wide and read when a thread starts, so set it only
+    # around this start: LLM pool workers, web emitters and Flask threads keep the default
+    t = threading.Thread(target=handle_client, args=(client_socket,), daemon=True)
+    previous = threading.stack_size(CLIENT_THREAD_STACK_SIZE)
+    try:
+        t.start()
+    finally:
+        threading.stack_size(previous)
+    return t
+
 def run_server(host='0.0.0.0', port=9000):
     global server_socket
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
     try:
         server_socket.bind((host, port))
-        server_socket.listen(5)
+        server_socket.listen(64)
         print(f"Server running on {host}:{port}...")
         
+        # accept() blocks without a timeout; signal_handler shuts the socket down to wake it
         while not shutdown_event.is_set():
             try:
-                server_socket.settimeout(1.0)  # Allow periodic shutdown checks
                 client_socket, addr = server_socket.accept()
                 print(f"Connection from {addr}")
-                t = threading.Thread(target=handle_client, args=(client_socket,))
-                t.start()
-            except socket.timeout:
-                continue  # Check shutdown event
-            except socket.error:
+                start_client_thread(client_socket)
+            except OSError:
                 if shutdown_event.is_set():
                     break
                 raise
@@ -3835,19 +4461,28 @@ player_spells = ['fireball', 'magic missile', 'heal']
 server_socket = None
 web_thread = None
 shutdown_event = threading.Event()
+background_threads = []  # Game loops, joined on shutdown
 
 def signal_handler(signum, frame):
     """Handle SIGINT and SIGTERM for clean shutdown"""
     print("\nShutting down server...")
     shutdown_event.set()
+    world_events_wakeup.set()
+    rest_wakeup.set()
+    for thread in background_threads:
+        thread.join(timeout=2)
     
     # Save all players
     with players_lock:
         for player in players.values():
             save_player_profile(player)
     
-    # Close server socket
+    # Close server socket, waking a blocked accept()
     if server_socket:
+        try:
+            server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Not connected on some platforms; close() still stops accept()
         server_socket.close()
     
     print("Server shutdown complete.")
@@ -3865,6 +4500,9 @@ if __name__ == "__main__":
     # Setup signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    if hasattr(signal, 'SIGHUP'):
+        # kill -HUP re-reads config.json without a restart
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload_config())
     
     # Initialize game data
     parse_area_file('area.txt')
@@ -3886,21 +4524,25 @@ if __name__ == "__main__":
     except ImportError:
         print("Web interface not available - integrated_web.py not found")
 
-    # Start NPC movement
-    npc_thread = threading.Thread(target=npc_movement_loop, daemon=True)
-    npc_thread.start()
-    
     # Start combat loop
     combat_thread = threading.Thread(target=combat_loop, daemon=True)
     combat_thread.start()
+    background_threads.append(combat_thread)
+    
+    # Start the rest ticker
+    rest_thread = threading.Thread(target=rest_loop, daemon=True)
+    rest_thread.start()
+    background_threads.append(rest_thread)
     
-    # Start world events loop
+    # Start world events loop (also drives the hourly NPC schedules)
     events_thread = threading.Thread(target=world_events_loop, daemon=True)
     events_thread.start()
+    background_threads.append(events_thread)
     
     # Start NPC chat loop
     npc_chat_thread = threading.Thread(target=npc_chat_loop, daemon=True)
     npc_chat_thread.start()
+    background_threads.append(npc_chat_thread)
     
     print("Dynamic world events system started!")
     print("Combat system started!")
@@ -4,9 +4,13 @@ Simple working web interface for PyMUD3
 Based on the successful test page approach
 """
 
+import gzip
+import hashlib
+import re
 import threading
 import secrets
-from flask import Flask, render_template_string
+import traceback
+from flask import Flask, Response, request
 from flask_socketio import SocketIO, emit, join_room
 
 # This will be set by mud-multi.py when it imports this module
@@ -22,28 +26,11 @@ web_app = None
 web_socketio = None
 web_player_sessions = {}  # session_id -> player_name
 
-def create_web_interface():
-    """Create the simplified working web interface"""
-    global web_app, web_socketio, web_player_sessions
+# A letter then up to 19 letters, digits or underscores; names become profile file names too
+_valid_name = re.compile(r'[A-Za-z][A-Za-z0-9_]{0,19}').fullmatch
 
-    if mud_multi is None:
-        raise RuntimeError("mud_multi module not set. Call set_mud_module() first.")
-
-    # Make sure rooms are loaded
-    if not hasattr(mud_multi, 'rooms') or not mud_multi.rooms:
-        print("Rooms not loaded yet, initializing...")
-        mud_multi.parse_area_file('area.txt')
-        mud_multi.load_objects_from_file('objects.json')
-        mud_multi.process_resets()
-        mud_multi.load_spells_from_file('spells.json')
-        mud_multi.load_npcs_from_file('npcs.json')
-
-    web_app = Flask(__name__)
-    web_app.secret_key = secrets.token_hex(16)
-    web_socketio = SocketIO(web_app, cors_allowed_origins="*")
-
-    # Simple HTML template based on working test page
-    HTML_TEMPLATE = '''
+# Simple HTML template based on working test page
+HTML_TEMPLATE = '''
 <!DOCTYPE html>
 <html>
 <head>
@@ -112,9 +99,9 @@ def create_web_interface():
             <div class="info-section">
                 <h3>Game Info</h3>
                 <div id="gameInfo" class="info-content">
-                    Weather: Loading...<br>
-                    Time: Loading...<br>
-                    Location: Unknown
+                    <span id="infoWeather">Weather: Loading...</span><br>
+                    <span id="infoTime">Time: Loading...</span><br>
+                    <span id="infoLocation">Location: Unknown</span>
                 </div>
             </div>
         </div>
@@ -125,10 +112,19 @@ def create_web_interface():
         let connected = false;
         let socket;
 
+        // Looked up once: these elements and patterns are used for every incoming message
+        const gameOutput = document.getElementById('gameOutput');
+        const infoWeather = document.getElementById('infoWeather');
+        const infoTime = document.getElementById('infoTime');
+        const infoLocation = document.getElementById('infoLocation');
+        const WEATHER_RE = /Weather: (\\w+)/;
+        const TIME_RE = /Time: (\\w+)/;
+        const MAX_OUTPUT_NODES = 500;  // Older messages are dropped so the log stays bounded
+
         // Initialize Socket.IO
         if (typeof io === 'undefined') {
             console.error('Socket.IO not loaded!');
-            document.getElementById('gameOutput').textContent = 'ERROR: Socket.IO not loaded!';
+            gameOutput.textContent = 'ERROR: Socket.IO not loaded!';
         } else {
             console.log('Socket.IO loaded, connecting...');
             socket = io('http://localhost:8080');
@@ -157,10 +153,17 @@ def create_web_interface():
 
             socket.on('message', function(data) {
                 console.log('Received message:', data);
-                const output = document.getElementById('gameOutput');
-                if (output) {
-                    output.textContent += data.content + '\\n';
-                    output.scrollTop = output.scrollHeight;
+                if (gameOutput) {
+                    // Append a text node rather than rewriting the whole log, and only
+                    // follow new output if the player hasn't scrolled back to read
+                    const atBottom = gameOutput.scrollTop + gameOutput.clientHeight >= gameOutput.scrollHeight - 5;
+                    gameOutput.appendChild(document.createTextNode(data.content + '\\n'));
+                    while (gameOutput.childNodes.length > MAX_OUTPUT_NODES) {
+                        gameOutput.removeChild(gameOutput.firstChild);
+                    }
+                    if (atBottom) {
+                        gameOutput.scrollTop = gameOutput.scrollHeight;
+                    }
 
                     // Update stats and info panels
                     updateGameInfo(data.content);
@@ -170,23 +173,25 @@ def create_web_interface():
 
         // Function to update stats and game info from game messages
         function updateGameInfo(message) {
-            // Update weather and time info
-            if (message.includes('Weather:')) {
-                const weatherMatch = message.match(/Weather: (\\w+)/);
+            // Update weather and time info; each marker is searched for once
+            const hasWeather = message.indexOf('Weather:') >= 0;
+            const hasTime = message.indexOf('Time:') >= 0;
+            if (hasWeather) {
+                const weatherMatch = WEATHER_RE.exec(message);
                 if (weatherMatch) {
                     updateGameInfoText('Weather: ' + weatherMatch[1]);
                 }
             }
 
-            if (message.includes('Time:')) {
-                const timeMatch = message.match(/Time: (\\w+)/);
+            if (hasTime) {
+                const timeMatch = TIME_RE.exec(message);
                 if (timeMatch) {
                     updateGameInfoText('Time: ' + timeMatch[1]);
                 }
             }
 
             // Update location when room name appears
-            if (message.includes('\\n') && !message.includes('Weather:') && !message.includes('Time:')) {
+            if (!hasWeather && !hasTime && message.indexOf('\\n') >= 0) {
                 const lines = message.split('\\n');
                 for (let line of lines) {
                     if (line.trim() && !line.includes('You') && !line.includes('Welcome') && line.length > 3) {
@@ -199,20 +204,13 @@ def create_web_interface():
         }
 
         function updateGameInfoText(newInfo) {
-            const gameInfo = document.getElementById('gameInfo');
-            if (gameInfo) {
-                let content = gameInfo.innerHTML;
-                const lines = content.split('<br>');
-
-                if (newInfo.startsWith('Weather:')) {
-                    lines[0] = newInfo;
-                } else if (newInfo.startsWith('Time:')) {
-                    lines[1] = newInfo;
-                } else if (newInfo.startsWith('Location:')) {
-                    lines[2] = newInfo;
-                }
-
-                gameInfo.innerHTML = lines.join('<br>');
+            // Each line has its own span, so only that text changes and no HTML is parsed
+            if (newInfo.startsWith('Weather:')) {
+                infoWeather.textContent = newInfo;
+            } else if (newInfo.startsWith('Time:')) {
+                infoTime.textContent = newInfo;
+            } else if (newInfo.startsWith('Location:')) {
+                infoLocation.textContent = newInfo;
             }
         }
 
@@ -250,52 +248,98 @@ def create_web_interface():
             }
         }
 
-        // Enter key handling
-        document.addEventListener('keypress', function(e) {
+        // Enter key handling, on the two inputs only rather than every key on the page
+        document.getElementById('playerName').addEventListener('keydown', function(e) {
             if (e.key === 'Enter') {
-                if (!document.getElementById('loginOverlay').classList.contains('hidden')) {
-                    login();
-                } else {
-                    sendCommand();
-                }
+                login();
             }
-        });
+        }, {passive: true});
+
+        document.getElementById('commandInput').addEventListener('keydown', function(e) {
+            if (e.key === 'Enter') {
+                sendCommand();
+            }
+        }, {passive: true});
     </script>
 </body>
 </html>
     '''
 
+# The page has no template variables, so it is served as these bytes without Jinja;
+# the gzip copy and the ETag are computed once here, not per request or per app
+INDEX_BODY = HTML_TEMPLATE.encode('utf-8')
+INDEX_ETAG = hashlib.sha1(INDEX_BODY).hexdigest()
+INDEX_BODY_GZIP = gzip.compress(INDEX_BODY, 9)
+
+def create_web_interface():
+    """Create the simplified working web interface"""
+    global web_app, web_socketio, web_player_sessions
+
+    if mud_multi is None:
+        raise RuntimeError("mud_multi module not set. Call set_mud_module() first.")
+
+    # Build the app only once; calling again hands back the existing one
+    if web_app is not None:
+        return web_app, web_socketio
+
+    # Make sure rooms are loaded
+    if not hasattr(mud_multi, 'rooms') or not mud_multi.rooms:
+        print("Rooms not loaded yet, initializing...")
+        mud_multi.parse_area_file('area.txt')
+        mud_multi.load_objects_from_file('objects.json')
+        mud_multi.process_resets()
+        mud_multi.load_spells_from_file('spells.json')
+        mud_multi.load_npcs_from_file('npcs.json')
+
+    web_app = Flask(__name__)
+    web_app.secret_key = secrets.token_hex(16)
+    # The game emits from its own OS threads (combat, events, per-connection handlers),
+    # which only the threading mode supports; pin it so an installed eventlet or gevent
+    # isn't picked up automatically without the monkey patching it would need
+    # Game output frames are small and already coalesced per session, so compressing each
+    # polling response separately for every client would cost more CPU than it saves bandwidth
+    web_socketio = SocketIO(web_app, cors_allowed_origins="*", async_mode='threading',
+                            http_compression=False)
+
+    # Returning browsers revalidate with the ETag and get a 304 instead of the page again
     @web_app.route('/')
     def index():
-        return render_template_string(HTML_TEMPLATE)
+        if 'gzip' in request.accept_encodings:
+            response = Response(INDEX_BODY_GZIP, mimetype='text/html')
+            response.headers['Content-Encoding'] = 'gzip'
+            # Each encoding is a different representation, so it needs its own ETag
+            response.set_etag(INDEX_ETAG + '-gzip')
+        else:
+            response = Response(INDEX_BODY, mimetype='text/html')
+            response.set_etag(INDEX_ETAG)
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response.make_conditional(request)
 
     @web_socketio.on('connect')
     def handle_connect(auth):
-        from flask import request
         print(f"WEB: Client connected with session ID: {request.sid}")
 
     @web_socketio.on('login')
     def handle_login(data):
-        from flask import request
         print(f"WEB: Login attempt from session {request.sid} with data: {data}")
         player_name = data.get('name', '').strip()
         print(f"WEB: Player name extracted: '{player_name}'")
 
-        if not player_name or len(player_name) > 20:
+        if not _valid_name(player_name):
             print(f"DEBUG WEB: Invalid name, emitting error")
             emit('error', {'message': 'Invalid name'})
             return
 
         # Check name availability and create player atomically - thread-safe
-        player_name_lower = player_name.lower()
         try:
-            with mud_multi.players_lock:
-                existing_players_lower = [name.lower() for name in mud_multi.players.keys()]
-                if player_name_lower in existing_players_lower:
-                    emit('error', {'message': 'Name already in use'})
-                    return
+            # Shared with telnet logins: the name stays reserved until complete_login
+            if not mud_multi.reserve_login_name(player_name):
+                emit('error', {'message': 'Name already in use'})
+                return
 
-                # Create web connection handler and player while holding the lock
+            try:
+                # Create web connection handler
                 session_id = request.sid
                 web_handler = mud_multi.WebConnectionHandler(session_id, web_socketio)
 
@@ -303,35 +347,39 @@ def create_web_interface():
                 start_room = 2201
                 new_player = mud_multi.Player(player_name, start_room, web_handler)
                 mud_multi.load_player_profile(new_player)
+            except Exception:
+                mud_multi.release_login_name(player_name)
+                raise
 
-                # Add to players dictionary (already holding lock)
-                mud_multi.players[player_name] = new_player
+            mud_multi.complete_login(new_player)
 
             # Operations that don't need the lock
             web_player_sessions[session_id] = player_name
 
             # Add default spells
-            for spell_name in ['fireball', 'magic missile', 'heal', 'chain lightning']:
-                if spell_name in mud_multi.spells and spell_name not in new_player.spellbook:
-                    new_player.spellbook[spell_name] = mud_multi.spells[spell_name]
+            new_player.spellbook.update(mud_multi.starter_spellbook)
 
             # Join socket room
             join_room(session_id)
 
             # Send welcome message
             emit('login_success', {'name': player_name})
-            mud_multi.send_to_player(new_player, f"Welcome, {new_player.name}! You appear in {new_player.current_room.name}.")
-            new_player.describe_current_room()
+            # Welcome line and room description go out as one frame
+            batching = new_player.begin_batch()
+            try:
+                mud_multi.send_to_player(new_player, f"Welcome, {new_player.name}! You appear in {new_player.current_room.name}.")
+                new_player.describe_current_room()
+            finally:
+                if batching:
+                    new_player.end_batch()
 
         except Exception as e:
             print(f"Error creating web player {player_name}: {e}")
-            import traceback
             traceback.print_exc()
             emit('error', {'message': 'Failed to create player'})
 
     @web_socketio.on('command')
     def handle_command(data):
-        from flask import request
         print(f"DEBUG WEB: Command received from session {request.sid}")
 
         if request.sid not in web_player_sessions:
@@ -345,7 +393,7 @@ def create_web_interface():
             return
 
         player = mud_multi.players[player_name]
-        command = data.get('command', '').strip().lower()
+        command = data.get('command', '').strip()
 
         if command:
             try:
@@ -359,19 +407,18 @@ def create_web_interface():
 
     @web_socketio.on('disconnect')
     def handle_web_disconnect():
-        from flask import request
         session_id = request.sid
         if session_id in web_player_sessions:
             player_name = web_player_sessions[session_id]
-            with mud_multi.players_lock:
-                if player_name in mud_multi.players:
-                    player = mud_multi.players[player_name]
-                    mud_multi.save_player_profile(player)
-                    # Remove from room players list
-                    if hasattr(player, 'current_room') and hasattr(player.current_room, 'players'):
-                        if player in player.current_room.players:
-                            player.current_room.players.remove(player)
-                    del mud_multi.players[player_name]
+            player = mud_multi.players.get(player_name)
+            if player is not None:
+                # Save while the name is still taken, so a quick re-login reads the new profile;
+                # neither the disk write nor leaving the room (a set discard) needs players_lock
+                mud_multi.save_player_profile(player)
+                player.leave_room()
+                player.stop_resting()
+                with mud_multi.players_lock:
+                    mud_multi.remove_online_player(player_name)
             del web_player_sessions[session_id]
 
     return web_app, web_socketio
@@ -395,6 +442,5 @@ def start_web_interface():
 
     except Exception as e:
         print(f"Failed to start web interface: {e}")
-        import traceback
         traceback.print_exc()
         return None
\ No newline at end of file